@@ -0,0 +1,151 @@
+# app/api/v1/admin.py
+
+import base64
+from typing import AsyncIterator, Optional, Sequence, Union
+
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from app.core.config import ADMIN_USERS_PAGE_SIZE, ADMIN_USERS_MAX_PAGE_SIZE
+from app.core.deps import get_admin_user
+from app.core.jsend import encode_json, jsend_fail, jsend_success
+from app.core.profiler import profiler
+from app.db.base import DbSession, get_read_db
+from app.schemas.responses import (
+    ProfileData,
+    ProfileListData,
+    ProfileListResponse,
+    ProfileResponse,
+    ProfileSummary,
+    UserData,
+    UserListResponse,
+)
+from app.services import users as user_service
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(get_admin_user)],
+)
+
+# Users encoded per streamed chunk
+STREAM_CHUNK_ROWS = 100
+
+
+def encode_cursor(kind: str, value) -> str:
+    """Opaque cursor for the last row of a page ("id" or "identifier" order)."""
+    raw = f"{kind}:{value}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, kind: str) -> Union[int, str]:
+    """
+    Value of a cursor of the given kind (an int for "id"); ValueError if it
+    isn't one. The messages are ours: safe to send back to the client.
+    """
+    try:
+        # binascii.Error, UnicodeDecodeError, non-ASCII input: all ValueErrors
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except ValueError:
+        raise ValueError("malformed cursor") from None
+    found, sep, value = raw.partition(":")
+    if not sep or found != kind:
+        raise ValueError("cursor is from a different listing")
+    if kind == "id":
+        try:
+            return user_service.parse_user_id(value)
+        except ValueError:
+            raise ValueError("malformed cursor") from None
+    return value
+
+
+async def _stream_page(rows: Sequence, next_cursor: Optional[str]) -> AsyncIterator[bytes]:
+    """JSend body of a page, encoded and sent a chunk of users at a time."""
+    yield b'{"status":"success","data":{"users":['
+    for start in range(0, len(rows), STREAM_CHUNK_ROWS):
+        users = b",".join(
+            encode_json(UserData.model_validate(row))
+            for row in rows[start:start + STREAM_CHUNK_ROWS]
+        )
+        yield (b"," if start else b"") + users
+    yield b'],"next_cursor":' + encode_json(next_cursor) + b"}}"
+
+
+@router.get(
+    "/users",
+    summary="List users",
+    description="Users page by page (admins only). Without `prefix` pages are in id order; "
+                "with `prefix` only users whose identifier starts with it (case-sensitive), "
+                "in identifier order. Pass `next_cursor` of a page as `cursor` to get the next "
+                "one; it is null on the last page.",
+    response_model=UserListResponse,
+)
+async def list_users(
+    prefix: Optional[str] = Query(default=None, min_length=1, max_length=255),
+    cursor: Optional[str] = Query(default=None, max_length=1024),
+    limit: int = Query(default=ADMIN_USERS_PAGE_SIZE, ge=1, le=ADMIN_USERS_MAX_PAGE_SIZE),
+    db: DbSession = Depends(get_read_db),
+):
+    kind = "identifier" if prefix is not None else "id"
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_cursor(cursor, kind)
+        except ValueError as e:
+            return jsend_fail({"cursor": str(e)}, http_status=status.HTTP_400_BAD_REQUEST)
+
+    # one extra row tells whether there is a next page
+    if prefix is not None:
+        rows = await user_service.search_users(db, prefix, limit + 1, after)
+    else:
+        rows = await user_service.list_users(db, limit + 1, after)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(kind, last.identifier if kind == "identifier" else last.id)
+
+    return StreamingResponse(
+        _stream_page(rows, next_cursor),
+        media_type="application/json",
+    )
+
+
+def _profile_summary(capture: dict) -> dict:
+    fields = {name: capture[name] for name in ProfileSummary.model_fields if name in capture}
+    fields["sql_count"] = len(capture["sql"]) + capture["sql_dropped"]
+    fields["sql_ms"] = round(sum(row["duration_ms"] for row in capture["sql"]), 3)
+    return fields
+
+
+@router.get(
+    "/profiles",
+    summary="Captured request profiles",
+    description="Requests captured by the profiler on this worker (PROFILE_SAMPLE_RATE / "
+                "PROFILE_SLOW_MS), newest first.",
+    response_model=ProfileListResponse,
+)
+async def list_profiles():
+    profiles = [ProfileSummary(**_profile_summary(capture)) for capture in reversed(profiler.captures)]
+    return jsend_success(ProfileListData(enabled=profiler.enabled, profiles=profiles))
+
+
+@router.get(
+    "/profiles/{capture_id}",
+    summary="Request profile",
+    description="Stack samples and SQL statements of one capture. `format=collapsed` returns "
+                "the stacks as plain text, one `stack count` line each (flamegraph.pl, speedscope).",
+    response_model=ProfileResponse,
+)
+async def get_profile(capture_id: int, format: str = Query(default="json", pattern="^(json|collapsed)$")):
+    capture = profiler.get(capture_id)
+    if capture is None:
+        return jsend_fail(
+            {"capture_id": "No such capture (never taken, or evicted)"},
+            http_status=status.HTTP_404_NOT_FOUND,
+        )
+    if format == "collapsed":
+        lines = "".join(f"{row['stack']} {row['count']}\n" for row in capture["stacks"])
+        return PlainTextResponse(lines)
+    return jsend_success(ProfileData(**{**capture, **_profile_summary(capture)}))
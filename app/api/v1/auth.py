@@ -2,25 +2,35 @@
 
 from fastapi import (
     APIRouter,
+    BackgroundTasks,
     Depends,
+    Request,
     status,
     UploadFile,
     File,
 )
-import os
-from datetime import datetime
-from sqlalchemy.orm import Session
 
 from app.core.jsend import jsend_success, jsend_fail
+from app.core.rate_limit import auth_limiter
 from app.core.security import create_access_token
-from app.core.deps import get_current_user
-from app.db.base import get_db
-from app.db.models import User
-from app.schemas.auth import RegisterRequest, LoginRequest, TokenResponse
-from app.schemas.user import UserBase
-from app.schemas.responses import AuthResponse, AvatarResponse, MessageResponse
+from app.core.deps import get_current_user, is_admin_identifier
+from app.core.user_cache import CachedUser
+from app.db.base import DbSession, get_db, get_read_db
+from app.schemas.auth import RegisterRequest, LoginRequest
+from app.schemas.responses import (
+    AuthData,
+    AuthResponse,
+    AvatarData,
+    AvatarResponse,
+    MessageData,
+    MessageResponse,
+    TokenData,
+    UserData,
+)
 from app.services import users as user_service
+from app.services import avatars as avatar_service
 from app.services.users import IdentifierAlreadyUsedError
+from app.services.avatars import InvalidImageError, AvatarTooLargeError
 from app.core.ws_manager import manager
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -30,13 +40,24 @@ router = APIRouter(prefix="/auth", tags=["auth"])
     "/register",
     summary="Register new user",
     description="Create account with identifier (nickname, email, or phone) and password. "
-                "No confirmation required. Returns user info and JWT access token.",
+                "No confirmation required. Returns user info and JWT access token. "
+                "Rate limited per client IP and identifier (429 with Retry-After).",
     response_model=AuthResponse,
     status_code=status.HTTP_201_CREATED,
 )
-def register(payload: RegisterRequest, db: Session = Depends(get_db)):
+async def register(
+    payload: RegisterRequest,
+    request: Request,
+    db: DbSession = Depends(get_db),
+):
+    await auth_limiter.check(request.client and request.client.host, payload.identifier)
+    if is_admin_identifier(payload.identifier):
+        return jsend_fail(
+            {"identifier": "Identifier is reserved"},
+            http_status=status.HTTP_400_BAD_REQUEST,
+        )
     try:
-        user = user_service.create_user(
+        user = await user_service.create_user(
             db, identifier=payload.identifier, password=payload.password
         )
     except IdentifierAlreadyUsedError as e:
@@ -47,10 +68,10 @@ def register(payload: RegisterRequest, db: Session = Depends(get_db)):
 
     access_token = create_access_token(subject=str(user.id))
 
-    data = {
-        "user": UserBase.model_validate(user).model_dump(),
-        "token": TokenResponse(access_token=access_token).model_dump(),
-    }
+    data = AuthData(
+        user=UserData.model_validate(user),
+        token=TokenData(access_token=access_token),
+    )
     return jsend_success(data, http_status=status.HTTP_201_CREATED)
 
 
@@ -58,11 +79,18 @@ def register(payload: RegisterRequest, db: Session = Depends(get_db)):
     "/login",
     summary="Login",
     description="Authenticate with identifier and password. "
-                "Returns user info and JWT access token on success.",
+                "Returns user info and JWT access token on success. "
+                "Rate limited per client IP and identifier (429 with Retry-After).",
     response_model=AuthResponse,
 )
-def login(payload: LoginRequest, db: Session = Depends(get_db)):
-    user = user_service.authenticate_user(
+async def login(
+    payload: LoginRequest,
+    request: Request,
+    db: DbSession = Depends(get_read_db),
+):
+    # before the lookup and the password hash: refusing is cheap
+    await auth_limiter.check(request.client and request.client.host, payload.identifier)
+    user = await user_service.authenticate_user(
         db, identifier=payload.identifier, password=payload.password
     )
     if not user:
@@ -72,10 +100,10 @@ def login(payload: LoginRequest, db: Session = Depends(get_db)):
         )
 
     access_token = create_access_token(subject=str(user.id))
-    data = {
-        "user": UserBase.model_validate(user).model_dump(),
-        "token": TokenResponse(access_token=access_token).model_dump(),
-    }
+    data = AuthData(
+        user=UserData.model_validate(user),
+        token=TokenData(access_token=access_token),
+    )
     return jsend_success(data)
 
 
@@ -86,66 +114,73 @@ def login(payload: LoginRequest, db: Session = Depends(get_db)):
     response_model=MessageResponse,
 )
 def ping():
-    return jsend_success({"message": "auth works"})
-
-
-AVATAR_DIR = "static/avatars"
+    return jsend_success(MessageData(message="auth works"))
 
 
 @router.post(
     "/avatar",
     summary="Upload avatar",
     description="Upload or replace current user's avatar image (PNG/JPEG). "
-                "Returns the uploaded image URL. Connected WebSocket clients "
-                "will receive an avatar_changed event.",
+                "Returns the uploaded image URL and the URLs of those resized "
+                "derivatives that exist already (those of an image stored before). "
+                "Connected WebSocket clients will receive an avatar_changed event "
+                "with all of them once they are ready.",
     response_model=AvatarResponse,
 )
 async def upload_avatar(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: CachedUser = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
 ):
-    # --- delete OLD avatar file if exists ---
-    if user.avatar_url:
-        old_filename = os.path.basename(user.avatar_url)
-        old_path = os.path.join(AVATAR_DIR, old_filename)
-        try:
-            if os.path.exists(old_path):
-                os.remove(old_path)
-        except OSError:
-            # don't break upload if cleanup fails
-            pass
-
-    # --- file validation ---
-    if file.content_type not in ("image/png", "image/jpeg", "image/jpg"):
+    # --- stream upload to disk (validated by magic bytes, size-limited) ---
+    try:
+        staged = await avatar_service.save_avatar(file)
+    except InvalidImageError as e:
         return jsend_fail(
-            {"file": "Only PNG and JPEG images are allowed"},
+            {"file": str(e)},
             http_status=status.HTTP_400_BAD_REQUEST,
         )
+    except AvatarTooLargeError as e:
+        return jsend_fail(
+            {"file": str(e)},
+            http_status=413,
+        )
 
-    os.makedirs(AVATAR_DIR, exist_ok=True)
-
-    _, ext = os.path.splitext(file.filename or "")
-    if ext.lower() not in (".png", ".jpg", ".jpeg"):
-        ext = ".png" if file.content_type == "image/png" else ".jpg"
-
-    timestamp = datetime.utcnow().strftime("%Y%m%d%H%M%S")
-    filename = f"user_{user.id}_{timestamp}{ext}"
-    file_path = os.path.join(AVATAR_DIR, filename)
-
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
-
-    avatar_url = f"/static/avatars/{filename}"
+    avatar_url = staged.url
+    try:
+        orphaned_url = await avatar_service.assign_avatar(db, user.id, avatar_url)
+    except Exception:
+        # don't leave an orphan file behind if the DB update failed
+        await avatar_service.abandon_avatar(db, staged)
+        raise
+    # referenced now: restore the file if a concurrent delete of the same
+    # image removed it before our reference was committed
+    await avatar_service.finish_avatar(staged)
+    await manager.invalidate_user(user.id)
+
+    # --- delete OLD avatar files once nobody references them ---
+    await avatar_service.delete_unreferenced_avatar(db, orphaned_url)
+
+    # --- render derivatives after the response, then notify sockets ---
+    background_tasks.add_task(publish_avatar_changed, user.id, avatar_url)
 
-    user.avatar_url = avatar_url
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    return jsend_success(
+        AvatarData(
+            avatar_url=avatar_url,
+            # rendered after the response: new images have none yet
+            avatars=await avatar_service.rendered_derivative_urls(avatar_url),
+        ),
+        http_status=status.HTTP_200_OK,
+    )
 
-    await manager.broadcast_avatar_changed(user_id=user.id, avatar_url=avatar_url)
 
-    return jsend_success({"avatar_url": avatar_url}, http_status=status.HTTP_200_OK)
+async def publish_avatar_changed(user_id: int, avatar_url: str) -> None:
+    """Generate avatar derivatives, then push avatar_changed with their URLs."""
+    avatars = await avatar_service.generate_derivatives(avatar_url)
+    await manager.broadcast_avatar_changed(
+        user_id=user_id, avatar_url=avatar_url, avatars=avatars
+    )
 
 
 @router.delete(
@@ -157,31 +192,22 @@ async def upload_avatar(
     response_model=MessageResponse,
 )
 async def delete_current_user_endpoint(
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: CachedUser = Depends(get_current_user),
+    db: DbSession = Depends(get_db),
 ):
     user_id = user.id
 
-    # ---- delete avatar file from disk ----
-    if user.avatar_url:
-        filename = os.path.basename(user.avatar_url)
-        avatar_path = os.path.join(AVATAR_DIR, filename)
-
-        try:
-            if os.path.exists(avatar_path):
-                os.remove(avatar_path)
-        except OSError:
-            # Don't crash delete if file is already gone
-            pass
+    # ---- delete user from DB (and its avatar reference) ----
+    orphaned_url = await user_service.delete_user(db, user_id)
+    await manager.invalidate_user(user_id)
 
-    # ---- delete user from DB ----
-    db.delete(user)
-    db.commit()
+    # ---- delete avatar files from disk if nobody else uses them ----
+    await avatar_service.delete_unreferenced_avatar(db, orphaned_url)
 
     # ---- close all WebSocket connections ----
     await manager.disconnect_user(user_id)
 
     return jsend_success(
-        {"message": "User and avatar deleted"},
+        MessageData(message="User and avatar deleted"),
         http_status=status.HTTP_200_OK,
     )
@@ -1,6 +1,8 @@
 from fastapi import APIRouter
 from app.core.jsend import jsend_success
-from app.schemas.responses import MessageResponse
+from app.core.token_cache import token_cache
+from app.core.user_cache import user_cache
+from app.schemas.responses import CachesData, CachesResponse, MessageData, MessageResponse
 
 router = APIRouter(prefix="/health", tags=["health"])
 
@@ -12,4 +14,16 @@ router = APIRouter(prefix="/health", tags=["health"])
     response_model=MessageResponse,
 )
 def health_check():
-    return jsend_success({"message": "OK"})
+    return jsend_success(MessageData(message="OK"))
+
+
+@router.get(
+    "/caches",
+    summary="Cache stats",
+    description="Hit/miss counters of in-process caches on this worker.",
+    response_model=CachesResponse,
+)
+def cache_stats():
+    return jsend_success(
+        CachesData(user_cache=user_cache.stats(), token_cache=token_cache.stats())
+    )
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.metrics import registry
+
+router = APIRouter(tags=["metrics"])
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get(
+    "/metrics",
+    summary="Metrics",
+    description="Counters and latency histograms of this worker, in the Prometheus text format.",
+    response_class=Response,
+)
+async def metrics():
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,75 @@
+# app/api/v1/users.py
+
+import hashlib
+from typing import List
+
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+
+from app.core.config import USERS_BATCH_MAX_IDS
+from app.core.deps import get_current_user
+from app.core.jsend import JSendResponse, encode_json, jsend_fail
+from app.core.static_files import etag_matches
+from app.db.base import DbSession, get_read_db
+from app.schemas.responses import UserBatchData, UserBatchResponse, UserData
+from app.services import users as user_service
+
+router = APIRouter(
+    prefix="/users",
+    tags=["users"],
+    dependencies=[Depends(get_current_user)],
+)
+
+
+def parse_ids(raw: str, limit: int) -> List[int]:
+    """
+    Distinct ids of "3,1,2" in the order given; ValueError if malformed or
+    more than `limit` items (repeats count). A long string is split into at
+    most limit + 1 pieces, so the rest of it is never parsed.
+    """
+    parts = raw.split(",", limit)
+    if len(parts) > limit:
+        raise ValueError(f"At most {limit} ids per request")
+    ids = {}
+    for part in parts:
+        try:
+            ids[user_service.parse_user_id(part)] = None
+        except ValueError:
+            raise ValueError("Comma-separated user ids expected") from None
+    return list(ids)
+
+
+@router.get(
+    "",
+    summary="Look up users",
+    description="Users by id, e.g. `?ids=3,1,2` (at most USERS_BATCH_MAX_IDS), in the order "
+                "asked for; ids with no user are listed in `missing`. The response has an "
+                "ETag: send it back in If-None-Match to get 304 while none of them changed.",
+    response_model=UserBatchResponse,
+    responses={304: {"description": "None of the users changed"}},
+)
+async def get_users(
+    request: Request,
+    ids: str = Query(..., min_length=1),
+    db: DbSession = Depends(get_read_db),
+):
+    try:
+        user_ids = parse_ids(ids, USERS_BATCH_MAX_IDS)
+    except ValueError as e:
+        return jsend_fail({"ids": str(e)}, http_status=status.HTTP_400_BAD_REQUEST)
+
+    rows = {row.id: row for row in await user_service.get_users_by_ids(db, user_ids)}
+    data = UserBatchData(
+        users=[UserData.model_validate(rows[user_id]) for user_id in user_ids if user_id in rows],
+        missing=[user_id for user_id in user_ids if user_id not in rows],
+    )
+    body = b'{"status":"success","data":' + encode_json(data) + b"}"
+
+    # the body is small: hashing it is cheaper than tracking user versions
+    headers = {
+        "ETag": f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+        "Cache-Control": "private, no-cache",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSendResponse(content=body, headers=headers)
@@ -1,55 +1,89 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query
+from typing import Optional
 
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, Query
+
+from app.core.deps import resolve_user
 from app.core.security import decode_access_token
-from app.core.ws_manager import manager
-from app.db.base import SessionLocal
-from app.db.models import User
+from app.core.user_cache import CachedUser
+from app.core.ws_encoding import negotiate
+from app.core.ws_manager import CLOSE_TRY_AGAIN, CLOSE_UNSUPPORTED_FORMAT, manager
+from app.db.base import DbSession, get_read_db, release_db
 
 router = APIRouter(tags=["ws"])
 
 
+async def _authenticate(token: Optional[str], db: DbSession) -> Optional[CachedUser]:
+    """User for a handshake token, or None."""
+    if not token:
+        return None
+    user_id = decode_access_token(token)
+    if not user_id:
+        return None
+    # cache, else DB; don't hold a connection while the socket is open
+    try:
+        return await resolve_user(db, int(user_id))
+    finally:
+        await release_db(db)
+
+
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, token: str | None = Query(default=None)):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    token: str | None = Query(default=None),
+    since: int | None = Query(default=None, ge=0),
+    format: str | None = Query(default=None),
+    db: DbSession = Depends(get_read_db),
+):
     """
     WebSocket endpoint.
 
     Client connects as:
-      ws://127.0.0.1:8000/ws?token=<JWT>
+      ws://127.0.0.1:8000/ws?token=<JWT>[&since=<seq>][&format=msgpack]
 
+    - Picks the message encoding: `format`, else an offered subprotocol
+      ("json", "msgpack"), else JSON; 1003 if `format` isn't available
+    - Refuses the socket (1013, jittered retry hint) while too many
+      handshakes are in flight
     - Validates token
-    - Resolves user
-    - Registers connection in manager
-    - Keeps connection open until disconnect
+    - Resolves user (cache, else async lookup)
+    - Registers connection in manager (1008 beyond the per-user cap)
+    - With `since` (the last "seq" the client saw), replays the events
+      it missed before live ones, or sends {"event":"resync"}
+    - Keeps connection open until disconnect; the manager pings silent
+      sockets and, with an idle timeout set, closes those that stay silent
     """
-    if not token:
-        await websocket.close(code=1008)  # policy violation
+    negotiated = negotiate(format, websocket.scope.get("subprotocols", []))
+    if negotiated is None:
+        await manager.refuse(websocket, CLOSE_UNSUPPORTED_FORMAT, "unsupported format")
         return
+    encoding, subprotocol = negotiated
 
-    user_id = decode_access_token(token)
-    if not user_id:
-        await websocket.close(code=1008)
+    # Admission: a reconnect storm must not pile up lookups on this worker
+    if not manager.begin_handshake():
+        await manager.refuse(websocket, CLOSE_TRY_AGAIN, manager.retry_hint())
         return
-
-    # Check user exists in DB
-    db = SessionLocal()
     try:
-        user = db.query(User).filter(User.id == int(user_id)).first()
+        user = await _authenticate(token, db)
     finally:
-        db.close()
+        manager.end_handshake()
 
     if not user:
-        await websocket.close(code=1008)
+        await websocket.close(code=1008)  # policy violation
         return
 
-    # Register connection
-    await manager.connect(user.id, websocket)
+    # Register connection (closed with 1008 if the user is at the socket cap)
+    conn = await manager.connect(user.id, websocket, since, encoding, subprotocol)
+    if conn is None:
+        return
 
     try:
-        # Simple receive loop: we don't expect client messages now,
-        # but we must keep the connection alive.
+        # Client messages are only heartbeat answers ({"event":"pong"}, as
+        # text or binary); any message proves the client is alive.
         while True:
-            # wait for any message or ping from client
-            await websocket.receive_text()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            conn.touch()
     except WebSocketDisconnect:
         await manager.disconnect(user.id, websocket)
     except Exception:
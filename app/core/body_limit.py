@@ -0,0 +1,56 @@
+"""
+Request body caps for upload routes.
+
+FastAPI reads a multipart body (Starlette spools file parts to disk) before
+the endpoint runs, so a size check in the endpoint comes after every byte
+was received. BodyLimitMiddleware rejects a request to a capped path with
+413 as soon as it is known to be too big: by its Content-Length before
+anything is read, or while it streams in (chunked uploads, lying clients).
+"""
+
+from typing import Dict
+
+from fastapi import HTTPException
+
+from app.core.jsend import jsend_fail
+
+# Multipart framing (boundaries, part headers) allowed on top of a file size cap
+MULTIPART_OVERHEAD = 16 * 1024
+
+
+def _too_large(limit: int) -> str:
+    return f"Request body is larger than {limit} bytes"
+
+
+class BodyLimitMiddleware:
+    """Pure ASGI middleware capping request bodies per path (path -> max bytes)."""
+
+    def __init__(self, app, limits: Dict[str, int]) -> None:
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send) -> None:
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > limit:
+                response = jsend_fail({"detail": _too_large(limit)}, http_status=413)
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # raised inside the body parser: FastAPI passes HTTPException on
+                    raise HTTPException(status_code=413, detail=_too_large(limit))
+            return message
+
+        await self.app(scope, receive_limited, send)
@@ -2,7 +2,158 @@ import os
 
 # SQLite database in data/ folder (works for both local and Docker)
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/dev.db")
+# Request-time DB access: "async" (AsyncSession + aiosqlite) or "sync" (Session in worker threads)
+DB_MODE = os.getenv("DB_MODE", "async")
+# Async driver URL; derived from DATABASE_URL when empty (sqlite -> sqlite+aiosqlite)
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", "")
+# Read-only lookups go to a separate pool; same database unless set (e.g. a replica)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "") or DATABASE_URL
+
+# Connection profile: "dev" (SQL echo), "test" or "prod" (WAL, tuned pragmas, quiet)
+DB_PROFILE = os.getenv("DB_PROFILE", "dev")
+# Server processes (uvicorn reads the same variable); every process has its own pools
+DB_WORKERS = int(os.getenv("WEB_CONCURRENCY", "1"))
+# Connections per process for writes / reads; 0 = derived from cores and DB_WORKERS
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0"))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "0"))
+# Seconds to wait for a free pooled connection
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Group commit of user mutations: max writes per transaction; 0 = each request commits alone
+DB_WRITE_BATCH_SIZE = int(os.getenv("DB_WRITE_BATCH_SIZE", "0"))
+# How long (ms) the first write of a batch waits for others to join
+DB_WRITE_BATCH_DELAY_MS = float(os.getenv("DB_WRITE_BATCH_DELAY_MS", "2"))
+# Create missing tables when the app starts (dev default); otherwise run
+# `python -m app.db.bootstrap` as a deploy step
+DB_BOOTSTRAP_ON_STARTUP = os.getenv(
+    "DB_BOOTSTRAP_ON_STARTUP", "1" if DB_PROFILE == "dev" else "0"
+) == "1"
 
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "dev-secret-change-me")
 JWT_ALGORITHM = "HS256"
 JWT_ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 1 hour
+
+# Users (identifiers, comma-separated) allowed to call /admin endpoints
+ADMIN_IDENTIFIERS = frozenset(
+    name.strip() for name in os.getenv("ADMIN_IDENTIFIERS", "").split(",") if name.strip()
+)
+# GET /admin/users page size: default and upper bound
+ADMIN_USERS_PAGE_SIZE = int(os.getenv("ADMIN_USERS_PAGE_SIZE", "100"))
+ADMIN_USERS_MAX_PAGE_SIZE = int(os.getenv("ADMIN_USERS_MAX_PAGE_SIZE", "1000"))
+# GET /users?ids= : most ids resolved in one request
+USERS_BATCH_MAX_IDS = int(os.getenv("USERS_BATCH_MAX_IDS", "100"))
+
+# Password hashing backend: "process" (dedicated process pool) or "thread"
+PASSWORD_HASH_BACKEND = os.getenv("PASSWORD_HASH_BACKEND", "process")
+# 0 = one worker per CPU core
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))
+# Max hash/verify jobs queued or running before new ones are rejected
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "64"))
+
+# Login/register rate limits, checked before any hashing: token bucket size
+# and refill per minute, per client IP and per identifier; 0 = no limit
+RATE_LIMIT_IP_BURST = int(os.getenv("RATE_LIMIT_IP_BURST", "30"))
+RATE_LIMIT_IP_PER_MINUTE = float(os.getenv("RATE_LIMIT_IP_PER_MINUTE", "30"))
+RATE_LIMIT_IDENTIFIER_BURST = int(os.getenv("RATE_LIMIT_IDENTIFIER_BURST", "5"))
+RATE_LIMIT_IDENTIFIER_PER_MINUTE = float(os.getenv("RATE_LIMIT_IDENTIFIER_PER_MINUTE", "5"))
+# Bucket store: "memory" (per worker), "sqlite" (shared by the workers of a host) or "off"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_SQLITE_PATH = os.getenv("RATE_LIMIT_SQLITE_PATH", "data/rate-limit.db")
+# Buckets kept by the memory store; the least recently charged go first
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+# Authenticated-user cache (get_current_user); 0 disables it
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+
+# Verified-JWT cache (decode_access_token); 0 disables it
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("TOKEN_CACHE_MAX_SIZE", "10000"))
+# Invalid tokens are remembered at most this long
+TOKEN_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("TOKEN_CACHE_NEGATIVE_TTL_SECONDS", "1"))
+
+# Avatar uploads
+AVATAR_DIR = os.getenv("AVATAR_DIR", "static/avatars")
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))  # 5 MB
+AVATAR_CHUNK_SIZE = 64 * 1024
+# Square derivative sizes (px) generated after upload; empty = none
+AVATAR_SIZES = tuple(
+    int(size) for size in os.getenv("AVATAR_SIZES", "48,96,256").split(",") if size.strip()
+)
+AVATAR_DERIVATIVE_FORMAT = os.getenv("AVATAR_DERIVATIVE_FORMAT", "webp")
+AVATAR_DERIVATIVE_WORKERS = int(os.getenv("AVATAR_DERIVATIVE_WORKERS", "2"))
+# Served avatar files whose metadata (size, mtime, ETag) is kept in memory
+AVATAR_INDEX_MAX_SIZE = int(os.getenv("AVATAR_INDEX_MAX_SIZE", "100000"))
+
+# WebSocket fan-out: per-connection outbound queue
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "32"))
+# What to do when a client's queue is full: "drop_oldest" or "disconnect"
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "drop_oldest")
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5"))
+# Heartbeat: sockets silent this long get {"event":"ping"}; 0 disables heartbeat and reaping
+WS_PING_INTERVAL_SECONDS = float(os.getenv("WS_PING_INTERVAL_SECONDS", "20"))
+# Sockets silent this long (no message or pong from the client) are closed; 0 = never.
+# Off by default: clients that don't answer {"event":"ping"} would be dropped. Sockets
+# whose ping can't be sent (send error or WS_SEND_TIMEOUT_SECONDS) are reaped either way
+WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("WS_IDLE_TIMEOUT_SECONDS", "0"))
+# Resolution of the heartbeat timer wheel
+WS_TIMER_TICK_SECONDS = float(os.getenv("WS_TIMER_TICK_SECONDS", "1"))
+# Admission control: handshakes validated at once per worker; beyond that new
+# sockets are closed with 1013 and a retry hint; 0 = no limit
+WS_MAX_HANDSHAKES = int(os.getenv("WS_MAX_HANDSHAKES", "64"))
+# Open sockets per user on one worker; beyond that new ones are closed with 1008; 0 = no limit
+WS_MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", "10"))
+# Retry hint sent with 1013: a random value between this and twice this (seconds),
+# so refused clients don't all come back at once
+WS_RETRY_AFTER_SECONDS = float(os.getenv("WS_RETRY_AFTER_SECONDS", "2"))
+# Per-user event log for /ws?since= resume: events kept per user; 0 disables it
+WS_EVENT_LOG_SIZE = int(os.getenv("WS_EVENT_LOG_SIZE", "32"))
+# Users whose events are kept in memory; the least recently active go first
+WS_EVENT_LOG_MAX_USERS = int(os.getenv("WS_EVENT_LOG_MAX_USERS", "10000"))
+# Event log store: "memory" (lost on restart) or "sqlite" (written in batches)
+WS_EVENT_LOG_BACKEND = os.getenv("WS_EVENT_LOG_BACKEND", "memory")
+WS_EVENT_LOG_SQLITE_PATH = os.getenv("WS_EVENT_LOG_SQLITE_PATH", "data/ws-events.db")
+# How long (ms) events wait to be written together
+WS_EVENT_LOG_FLUSH_MS = float(os.getenv("WS_EVENT_LOG_FLUSH_MS", "50"))
+
+# Cross-worker WebSocket event bus: "inprocess" (single worker) or "unix"
+WS_BUS_BACKEND = os.getenv("WS_BUS_BACKEND", "inprocess")
+WS_BUS_SOCKET_PATH = os.getenv("WS_BUS_SOCKET_PATH", "data/ws-bus.sock")
+
+# Static files other than avatars
+STATIC_DIR = os.getenv("STATIC_DIR", "static")
+# Allowed CORS origins, comma-separated
+CORS_ORIGINS = tuple(
+    origin.strip() for origin in os.getenv("CORS_ORIGINS", "*").split(",") if origin.strip()
+)
+
+# Prometheus-format metrics on GET /metrics, with request and SQL timing hooks
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Request profiler, off by default: fraction of requests captured (0..1)
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Also capture any request slower than this (ms); 0 = off
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+# Stack sampling interval (ms) and captures kept for GET /admin/profiles
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_CAPTURES = int(os.getenv("PROFILE_MAX_CAPTURES", "50"))
+
+
+class Settings:
+    """
+    Per-app settings for create_app(); defaults are the constants above.
+    The avatar directory isn't one of them: uploads, derivatives and deletes
+    all use AVATAR_DIR, so it is set for the whole process.
+    """
+
+    __slots__ = ("bootstrap_schema", "static_dir", "cors_origins", "metrics_enabled")
+
+    def __init__(
+        self,
+        bootstrap_schema: bool = DB_BOOTSTRAP_ON_STARTUP,
+        static_dir: str = STATIC_DIR,
+        cors_origins: tuple = CORS_ORIGINS,
+        metrics_enabled: bool = METRICS_ENABLED,
+    ) -> None:
+        self.bootstrap_schema = bootstrap_schema
+        self.static_dir = static_dir
+        self.cors_origins = cors_origins
+        self.metrics_enabled = metrics_enabled
@@ -1,21 +1,42 @@
+from typing import Optional
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
 
+from app.core.config import ADMIN_IDENTIFIERS
 from app.core.security import decode_access_token
-from app.db.base import get_db
-from app.db.models import User
+from app.core.user_cache import CachedUser, user_cache
+from app.db.base import DbSession, get_read_db
+from app.services import users as user_service
 
 # HTTPBearer scheme for Swagger UI "Authorize" button
 security = HTTPBearer()
 
 
-def get_current_user(
+async def resolve_user(db: DbSession, user_id: int) -> Optional[CachedUser]:
+    """User snapshot from the cache, else from the DB (and cached)."""
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    epoch = user_cache.epoch
+    row = await user_service.get_user_by_id(db, user_id)
+    if not row:
+        return None
+
+    user = CachedUser.from_row(row)
+    user_cache.put(user, epoch)
+    return user
+
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db),
-) -> User:
+    db: DbSession = Depends(get_read_db),
+) -> CachedUser:
     """
     Get current user from JWT token (Authorization: Bearer <token>).
+
+    Returns a detached snapshot; the DB is only queried on cache miss.
     """
     token = credentials.credentials
     user_id = decode_access_token(token)
@@ -25,11 +46,29 @@ def get_current_user(
             detail="Invalid or expired token",
         )
 
-    user = db.query(User).filter(User.id == int(user_id)).first()
-    if not user:
+    user = await resolve_user(db, int(user_id))
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found",
         )
+    return user
 
+
+def is_admin_identifier(identifier: str) -> bool:
+    """
+    Listed in ADMIN_IDENTIFIERS. Such identifiers can't be registered through
+    /auth/register (admin accounts are created with `python -m app.tools.users
+    import`), so nobody can claim admin access by signing up under one.
+    """
+    return identifier in ADMIN_IDENTIFIERS
+
+
+async def get_admin_user(user: CachedUser = Depends(get_current_user)) -> CachedUser:
+    """Current user, if listed in ADMIN_IDENTIFIERS."""
+    if not is_admin_identifier(user.identifier):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required",
+        )
     return user
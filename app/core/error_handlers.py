@@ -1,11 +1,19 @@
 # app/core/error_handlers.py
 
+import math
+
 from fastapi import FastAPI, Request
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from starlette.status import HTTP_500_INTERNAL_SERVER_ERROR
+from starlette.status import (
+    HTTP_429_TOO_MANY_REQUESTS,
+    HTTP_500_INTERNAL_SERVER_ERROR,
+    HTTP_503_SERVICE_UNAVAILABLE,
+)
 
+from app.core.hashing import HashingBusyError
 from app.core.jsend import jsend_fail, jsend_error
+from app.core.rate_limit import RateLimitedError
 
 
 def register_exception_handlers(app: FastAPI) -> None:
@@ -51,6 +59,34 @@ def register_exception_handlers(app: FastAPI) -> None:
             http_status=422,
         )
 
+    @app.exception_handler(HashingBusyError)
+    async def hashing_busy_handler(
+        request: Request,
+        exc: HashingBusyError,
+    ):
+        """
+        Hashing queue is full -> 503 JSend error, client should retry shortly.
+        """
+        return jsend_error(
+            message=str(exc),
+            http_status=HTTP_503_SERVICE_UNAVAILABLE,
+            headers={"Retry-After": "1"},
+        )
+
+    @app.exception_handler(RateLimitedError)
+    async def rate_limited_handler(
+        request: Request,
+        exc: RateLimitedError,
+    ):
+        """
+        Too many login/register attempts -> 429 JSend fail with Retry-After.
+        """
+        return jsend_fail(
+            data={"rate_limit": str(exc)},
+            http_status=HTTP_429_TOO_MANY_REQUESTS,
+            headers={"Retry-After": str(math.ceil(exc.retry_after))},
+        )
+
     @app.exception_handler(Exception)
     async def unhandled_exception_handler(
         request: Request,
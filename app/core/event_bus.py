@@ -0,0 +1,242 @@
+"""
+Pub/sub event bus behind ConnectionManager.
+
+Every uvicorn worker publishes WebSocket events to the bus and receives
+all events back, then fans them out to the sockets it holds locally.
+
+Backends:
+- "inprocess": delivers straight to the local handler (single worker).
+- "unix": a tiny broker on a Unix domain socket, no outside services.
+  The first worker that grabs the lock file runs the broker inside its
+  own event loop; all workers (the broker's too) connect to it as clients.
+  If the broker's worker dies its lock is released and another worker
+  takes over; clients reconnect automatically.
+
+Messages are JSON objects, one per line on the wire.
+
+Numbering: a message published with "seq": null gets a sequence number
+from the broker as it relays it (microseconds since the epoch, bumped
+past the previous one), increasing over everything it relays. Every
+worker receives the lines in the broker's order, so every worker sees
+numbered messages in seq order and with the same numbers. The
+"inprocess" bus (and a "unix" one between brokers) leaves "seq" null:
+the receiver numbers the message.
+"""
+
+import asyncio
+import json
+import os
+import time
+from typing import Callable, Optional, Set
+
+try:
+    import fcntl
+except ImportError:  # Windows: no Unix sockets either -> use "inprocess"
+    fcntl = None
+
+Handler = Callable[[dict], None]
+
+# Broker drops a client whose unsent backlog grows past this (it reconnects)
+MAX_CLIENT_BACKLOG = 4 * 1024 * 1024
+# Upper bound for one message line
+MAX_LINE_BYTES = 1024 * 1024
+
+
+class InProcessBus:
+    """Single-process bus: publish calls the handler directly."""
+
+    def __init__(self) -> None:
+        self._handler: Optional[Handler] = None
+
+    def set_handler(self, handler: Handler) -> None:
+        self._handler = handler
+
+    async def start(self) -> None:
+        pass
+
+    async def publish(self, message: dict) -> None:
+        if self._handler is not None:
+            self._handler(message)
+
+    async def stop(self) -> None:
+        pass
+
+
+class UnixSocketBus:
+    """Cross-worker bus over a Unix domain socket (see module docstring)."""
+
+    def __init__(self, path: str, reconnect_delay: float = 0.2) -> None:
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.reconnect_delay = reconnect_delay
+        self._handler: Optional[Handler] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._connected = asyncio.Event()
+        # broker side (only in the worker holding the lock)
+        self._lock_fd: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Set[asyncio.StreamWriter] = set()
+        self._last_seq = 0
+
+    def set_handler(self, handler: Handler) -> None:
+        self._handler = handler
+
+    @property
+    def is_broker(self) -> bool:
+        return self._server is not None
+
+    async def start(self, timeout: float = 5.0) -> None:
+        """Connect to (or become) the broker; waits until connected."""
+        if self._task is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connected = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        await asyncio.wait_for(self._connected.wait(), timeout)
+
+    async def publish(self, message: dict) -> None:
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            # broker failover in progress -> at least reach local sockets
+            self._deliver(message)
+            return
+        # the broker echoes the line back to us, so local delivery happens then
+        writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        await self._stop_broker()
+
+    def _deliver(self, message: dict) -> None:
+        if self._handler is not None:
+            self._handler(message)
+
+    # ---- client side ----
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(
+                    self.path, limit=MAX_LINE_BYTES
+                )
+            except OSError:
+                if not await self._try_become_broker():
+                    await asyncio.sleep(self.reconnect_delay)
+                continue
+
+            self._writer = writer
+            self._connected.set()
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._deliver(message)
+            except (OSError, asyncio.LimitOverrunError, ValueError):
+                pass
+            finally:
+                self._connected.clear()
+                self._writer = None
+                writer.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    # ---- broker side ----
+
+    async def _try_become_broker(self) -> bool:
+        """Run the broker if no other worker holds the lock."""
+        if self._server is not None:
+            return True
+
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            # another worker is (becoming) the broker
+            os.close(fd)
+            return False
+
+        self._lock_fd = fd
+        try:
+            # socket file left over by a dead broker
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        self._server = await asyncio.start_unix_server(
+            self._serve_client, self.path, limit=MAX_LINE_BYTES
+        )
+        os.chmod(self.path, 0o600)
+        return True
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if b'"seq":null' in line:
+                    line = self._number(line)
+                for client in list(self._clients):
+                    if client.transport.get_write_buffer_size() > MAX_CLIENT_BACKLOG:
+                        # a stuck worker must not block the others
+                        self._clients.discard(client)
+                        client.close()
+                        continue
+                    client.write(line)
+        except (OSError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    def _number(self, line: bytes) -> bytes:
+        """Give the message its "seq" (broker side)."""
+        try:
+            message = json.loads(line)
+        except ValueError:
+            return line
+        if not isinstance(message, dict) or message.get("seq", 0) is not None:
+            return line
+        self._last_seq = message["seq"] = max(time.time_ns() // 1000, self._last_seq + 1)
+        return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+    async def _stop_broker(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for client in list(self._clients):
+            client.close()
+        self._clients.clear()
+        await self._server.wait_closed()
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)  # releases the flock
+            self._lock_fd = None
+
+
+def create_bus(backend: str, socket_path: str):
+    """Build the bus for WS_BUS_BACKEND."""
+    if backend == "inprocess":
+        return InProcessBus()
+    if backend == "unix":
+        if fcntl is None:
+            raise RuntimeError("The 'unix' WebSocket bus needs a POSIX system")
+        return UnixSocketBus(socket_path)
+    raise ValueError(f"Unknown WebSocket bus backend: {backend!r}")
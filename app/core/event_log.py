@@ -0,0 +1,283 @@
+"""
+Per-user event log, so a WebSocket client that was briefly away can catch up.
+
+Every event sent with ConnectionManager.send_to_user() gets a sequence
+number, carried in the message as "seq". Each worker keeps the last
+`capacity` events of recently active users in memory: a ring buffer per
+user, users in least-recently-appended order bounded by `max_users`.
+A client reconnecting with /ws?since=<last seq it saw> is sent the
+events after that one before any live ones. If some of them are no
+longer kept it gets {"event":"resync","seq":N} instead: re-fetch, then
+resume from N next time.
+
+Sequence numbers are microseconds since the epoch, bumped past the
+previous event when the clock hasn't moved, so they still mean something
+after a restart. With several workers the bus broker gives them out as
+it relays events (app.core.event_bus): every worker receives every event
+in that order, with the same seq, so each has the same log and seqs
+increase in the order clients get the events. A worker numbering events
+itself (one worker, or no broker for a moment) uses next_seq.
+
+Stores (WS_EVENT_LOG_BACKEND):
+- "memory": nothing survives a restart; clients resuming from before it
+  get resync.
+- "sqlite": the publishing worker also appends its events to a SQLite
+  file, in batches written every WS_EVENT_LOG_FLUSH_MS and trimmed to
+  `capacity` per user. Replays memory can't cover (after a restart, or
+  users not recently active here) read from it. Events still waiting
+  for their batch when a worker dies are lost.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, List, Optional, Tuple
+
+from anyio import to_thread
+
+from app.core.config import (
+    WS_EVENT_LOG_SIZE,
+    WS_EVENT_LOG_MAX_USERS,
+    WS_EVENT_LOG_BACKEND,
+    WS_EVENT_LOG_SQLITE_PATH,
+    WS_EVENT_LOG_FLUSH_MS,
+)
+
+# (seq, serialized message)
+Event = Tuple[int, str]
+
+
+def _now_seq() -> int:
+    return time.time_ns() // 1000
+
+
+class _UserEvents:
+    """One user's ring buffer. Every event after `floor` is in it."""
+
+    __slots__ = ("events", "floor")
+
+    def __init__(self, capacity: int, floor: int) -> None:
+        self.events: Deque[Event] = deque(maxlen=capacity)
+        self.floor = floor
+
+    @property
+    def head(self) -> int:
+        """Seq a client is caught up to once it has seen everything here."""
+        return self.events[-1][0] if self.events else self.floor
+
+
+class SqliteEventStore:
+    """Events in a SQLite file, the last `capacity` per user."""
+
+    def __init__(self, path: str, capacity: int) -> None:
+        self.path = path
+        self.capacity = capacity
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def write(self, batch: List[Tuple[int, int, str]]) -> None:
+        """Append (user_id, seq, text) rows in one transaction, then trim those users."""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO events (user_id, seq, text) VALUES (?, ?, ?)", batch
+                )
+                for user_id in {row[0] for row in batch}:
+                    self._trim(conn, user_id)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _trim(self, conn: sqlite3.Connection, user_id: int) -> None:
+        row = conn.execute(
+            "SELECT seq FROM events WHERE user_id = ? ORDER BY seq DESC LIMIT 1 OFFSET ?",
+            (user_id, self.capacity),
+        ).fetchone()
+        if row is None:
+            return
+        conn.execute("DELETE FROM events WHERE user_id = ? AND seq <= ?", (user_id, row[0]))
+        conn.execute(
+            "INSERT INTO floors (user_id, seq) VALUES (?, ?) "
+            "ON CONFLICT (user_id) DO UPDATE SET seq = max(seq, excluded.seq)",
+            (user_id, row[0]),
+        )
+
+    def read(self, user_id: int, since: int) -> Optional[List[Event]]:
+        """A user's events after `since`, or None if some of them were trimmed."""
+        with self._lock:
+            conn = self._connect()
+            floor = conn.execute(
+                "SELECT seq FROM floors WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if floor is not None and since < floor[0]:
+                return None
+            return conn.execute(
+                "SELECT seq, text FROM events WHERE user_id = ? AND seq > ? ORDER BY seq",
+                (user_id, since),
+            ).fetchall()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=5.0, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS events (user_id INTEGER NOT NULL, "
+                "seq INTEGER NOT NULL, text TEXT NOT NULL, PRIMARY KEY (user_id, seq)) "
+                "WITHOUT ROWID"
+            )
+            # newest trimmed seq per user: a replay from before it has a gap
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS floors "
+                "(user_id INTEGER PRIMARY KEY, seq INTEGER NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class EventLog:
+    """In-memory per-user ring buffers, optionally written through to a store."""
+
+    def __init__(
+        self,
+        capacity: int = 32,
+        max_users: int = 10_000,
+        store: Optional[SqliteEventStore] = None,
+        flush_delay: float = 0.05,
+    ) -> None:
+        self.capacity = capacity
+        self.max_users = max_users
+        self.store = store
+        self.flush_delay = flush_delay
+        self.write_errors = 0
+        self._users: "OrderedDict[int, _UserEvents]" = OrderedDict()
+        # events of users not in _users are only known after this seq
+        # (this process started, or the user's buffer was evicted)
+        self._floor = _now_seq()
+        self._pending: List[Tuple[int, int, str]] = []
+        self._flusher: Optional[asyncio.Task] = None
+        self._write_lock: Optional[asyncio.Lock] = None
+
+    def next_seq(self, user_id: int) -> int:
+        """Seq for a new event of this user."""
+        user = self._users.get(user_id)
+        last = user.head if user is not None else self._floor
+        return max(_now_seq(), last + 1)
+
+    def append(self, user_id: int, seq: int, text: str) -> None:
+        """Keep an event (every worker does, as it arrives from the bus)."""
+        user = self._users.get(user_id)
+        if user is None:
+            user = self._users[user_id] = _UserEvents(self.capacity, self._floor)
+            while len(self._users) > self.max_users:
+                _, evicted = self._users.popitem(last=False)
+                self._floor = max(self._floor, evicted.head)
+        else:
+            self._users.move_to_end(user_id)
+        if len(user.events) == self.capacity:
+            user.floor = user.events[0][0]
+        user.events.append((seq, text))
+
+    def head(self, user_id: int) -> int:
+        user = self._users.get(user_id)
+        return user.head if user is not None else self._floor
+
+    def after(self, user_id: int, since: int) -> List[Event]:
+        """Events kept in memory with seq > since (possibly not all of them)."""
+        user = self._users.get(user_id)
+        if user is None:
+            return []
+        return [event for event in user.events if event[0] > since]
+
+    async def replay(self, user_id: int, since: int) -> Optional[List[Event]]:
+        """Every event of the user after `since`, or None if some are gone."""
+        user = self._users.get(user_id)
+        floor = user.floor if user is not None else self._floor
+        if since >= floor:
+            return self.after(user_id, since)
+        if self.store is None:
+            return None
+        events = await to_thread.run_sync(self.store.read, user_id, since)
+        if events is None:
+            return None
+        # the newest ones may still be waiting for their batch
+        last = events[-1][0] if events else since
+        return events + self.after(user_id, last)
+
+    # ---- write-behind to the store ----
+
+    def persist(self, user_id: int, seq: int, text: str) -> None:
+        """Queue an event for the store (publishing worker only)."""
+        if self.store is None:
+            return
+        self._pending.append((user_id, seq, text))
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self) -> None:
+        await asyncio.sleep(self.flush_delay)
+        self._flusher = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Write queued events now, in one transaction."""
+        if not self._pending:
+            return
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+        batch, self._pending = self._pending, []
+        # batches are written in order, one at a time
+        async with self._write_lock:
+            try:
+                await to_thread.run_sync(self.store.write, batch)
+            except Exception:
+                self.write_errors += 1
+
+    async def stop(self) -> None:
+        """Write what is queued and close the store (called on app shutdown)."""
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        if self.store is not None:
+            await self.flush()
+            self.store.close()
+
+
+def create_event_log(
+    capacity: int, max_users: int, backend: str, path: str, flush_ms: float
+) -> Optional[EventLog]:
+    """Build the log for WS_EVENT_LOG_* (None = no log, no resume)."""
+    if capacity <= 0:
+        return None
+    if backend == "memory":
+        store = None
+    elif backend == "sqlite":
+        store = SqliteEventStore(path, capacity)
+    else:
+        raise ValueError(f"Unknown event log backend: {backend!r}")
+    return EventLog(capacity, max_users, store, flush_delay=flush_ms / 1000)
+
+
+# Global event log (None when WS_EVENT_LOG_SIZE is 0)
+event_log = create_event_log(
+    WS_EVENT_LOG_SIZE,
+    WS_EVENT_LOG_MAX_USERS,
+    WS_EVENT_LOG_BACKEND,
+    WS_EVENT_LOG_SQLITE_PATH,
+    WS_EVENT_LOG_FLUSH_MS,
+)
@@ -0,0 +1,120 @@
+"""
+Password hashing service.
+
+PBKDF2 is CPU-bound and holds the GIL, so running it in the request
+threadpool stalls every other sync endpoint during a login spike.
+The "process" backend runs hash/verify jobs in a dedicated process pool;
+the "thread" backend keeps the old behaviour (AnyIO worker threads).
+
+Both backends share a queue-depth limit: once `max_queue` jobs are queued
+or running, new jobs are rejected with HashingBusyError instead of piling up.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional
+
+from anyio import to_thread
+
+from app.core.config import (
+    PASSWORD_HASH_BACKEND,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_QUEUE,
+)
+from app.core.metrics import Counter, Gauge, Histogram
+
+BACKENDS = ("process", "thread")
+
+
+class HashingBusyError(Exception):
+    """Raised when the hashing queue is full and the job is rejected."""
+    pass
+
+
+class PasswordHasher:
+    """
+    Runs password hashing jobs on the configured backend.
+    Jobs are plain module-level callables so they can be pickled to workers.
+    """
+
+    def __init__(self, backend: str = "process", workers: int = 0, max_queue: int = 64) -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown password hash backend: {backend!r}")
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.pending = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: never fork a process that already runs an event loop + threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            return self._executor
+
+    def _acquire(self) -> None:
+        with self._lock:
+            if self.pending >= self.max_queue:
+                self.rejected += 1
+                raise HashingBusyError("Password hashing queue is full")
+            self.pending += 1
+
+    def _release(self) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run `fn(*args)` off the event loop, respecting the queue limit."""
+        self._acquire()
+        try:
+            if self.backend == "thread":
+                return await to_thread.run_sync(fn, *args)
+
+            loop = asyncio.get_running_loop()
+            try:
+                return await loop.run_in_executor(self._get_executor(), fn, *args)
+            except BrokenProcessPool:
+                # a worker died (OOM kill etc.) -> rebuild the pool for next jobs
+                self.shutdown(wait=False)
+                raise
+        finally:
+            self._release()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop worker processes (called on app shutdown)."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+# Global hasher instance
+hasher = PasswordHasher(
+    backend=PASSWORD_HASH_BACKEND,
+    workers=PASSWORD_HASH_WORKERS,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+)
+
+# ---- metrics ----
+
+hash_duration = Histogram(
+    "password_hash_duration_seconds",
+    "Password hash/verify time seen by the request, including the wait for a worker.",
+    ("op",),
+)
+Gauge("password_hash_pending", "Hash jobs queued or running.", fn=lambda: hasher.pending)
+Counter(
+    "password_hash_rejected_total",
+    "Hash jobs rejected because the queue was full.",
+    fn=lambda: hasher.rejected,
+)
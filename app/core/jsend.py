@@ -1,34 +1,95 @@
-from fastapi.responses import JSONResponse
+"""
+JSend responses.
+
+JSendResponse encodes with orjson when it is installed, else with the
+stdlib encoder (same compact output as Starlette's JSONResponse).
+Pydantic models are serialized straight to bytes by their compiled
+serializer, no intermediate dict: pass a model as `data` and the
+envelope is spliced around it.
+"""
+
+import json
+from typing import Any, Optional
+
 from fastapi import status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    # a model nested in a plain dict/list
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def encode_json(content: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes (bytes pass through as is)."""
+    if isinstance(content, bytes):
+        return content
+    if isinstance(content, BaseModel):
+        return content.__pydantic_serializer__.to_json(content)
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+        default=_default,
+    ).encode("utf-8")
+
+
+class JSendResponse(JSONResponse):
+    """JSONResponse with the fast encoder; also accepts pre-encoded bytes."""
+
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
 
 
 def jsend_success(data=None, http_status: int = status.HTTP_200_OK):
     """
-    JSend 'success' response.
+    JSend 'success' response. `data` may be a dict or a pydantic model.
     """
     if data is None:
         data = {}
-    return JSONResponse(
-        status_code=http_status,
-        content={"status": "success", "data": data},
-    )
+    if isinstance(data, BaseModel):
+        content = b'{"status":"success","data":' + encode_json(data) + b"}"
+    else:
+        content = {"status": "success", "data": data}
+    return JSendResponse(status_code=http_status, content=content)
 
 
-def jsend_fail(data: dict, http_status: int = status.HTTP_400_BAD_REQUEST):
+def jsend_fail(
+    data: dict,
+    http_status: int = status.HTTP_400_BAD_REQUEST,
+    headers: Optional[dict] = None,
+):
     """
     JSend 'fail' response, for 4xx errors (validation, bad input, etc.).
     """
-    return JSONResponse(
+    return JSendResponse(
         status_code=http_status,
         content={"status": "fail", "data": data},
+        headers=headers,
     )
 
 
-def jsend_error(message: str, http_status: int = status.HTTP_500_INTERNAL_SERVER_ERROR):
+def jsend_error(
+    message: str,
+    http_status: int = status.HTTP_500_INTERNAL_SERVER_ERROR,
+    headers: Optional[dict] = None,
+):
     """
     JSend 'error' response, for unexpected server errors.
     """
-    return JSONResponse(
+    return JSendResponse(
         status_code=http_status,
         content={"status": "error", "message": message},
+        headers=headers,
     )
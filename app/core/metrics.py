@@ -0,0 +1,296 @@
+"""
+In-process metrics, exposed in the Prometheus text format on GET /metrics.
+
+No client library and no push gateway: counters, gauges and histograms
+live in this worker's memory. Recording is a dict lookup for the label
+values plus, for histograms, a bisect over the bucket bounds, so it is
+cheap enough for every request and every SQL statement. Gauges can
+instead read their value from a callback at scrape time (zero cost on
+the hot path).
+
+With several workers every process keeps and reports its own numbers;
+Prometheus scrapes each worker (or the numbers are summed per scrape).
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; request and hashing latency
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+# Seconds; single SQL statements and socket sends
+FAST_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0,
+)
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class MetricsRegistry:
+    """All metrics of this process, rendered together by render()."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, "_Metric"] = {}
+
+    def register(self, metric: "_Metric") -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name!r}")
+        self._metrics[metric.name] = metric
+
+    def get(self, name: str) -> Optional["_Metric"]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry instance
+registry = MetricsRegistry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        registry: Optional[MetricsRegistry] = registry,
+    ) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The child for these label values (created on first use)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _ValueChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _ValueMetric(_Metric):
+    """
+    One number per label set. With `fn`, the value is read from fn() at
+    scrape time (no labels then) instead of being recorded by the code.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 registry: Optional[MetricsRegistry] = registry,
+                 fn: Optional[Callable[[], float]] = None) -> None:
+        if fn is not None and labelnames:
+            raise ValueError("a callback metric has no labels")
+        super().__init__(name, help, labelnames, registry)
+        self.fn = fn
+
+    def _new_child(self) -> _ValueChild:
+        return _ValueChild()
+
+    def samples(self) -> List[str]:
+        if self.fn is not None:
+            return [f"{self.name} {_format_value(self.fn())}"]
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+            for values, child in list(self._children.items())
+        ]
+
+
+class Counter(_ValueMetric):
+    """Monotonic count, e.g. rejected jobs."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_ValueMetric):
+    """Current value, e.g. open connections."""
+
+    type = "gauge"
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]) -> None:
+        self.bounds = bounds
+        # counts[i]: observations in (bounds[i-1], bounds[i]]; the last one is +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> "_Timer":
+        """Context manager observing the elapsed seconds."""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child: _HistogramChild) -> None:
+        self.child = child
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (latencies in seconds) over fixed buckets."""
+
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 registry: Optional[MetricsRegistry] = registry,
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def samples(self) -> List[str]:
+        lines = []
+        names = self.labelnames + ("le",)
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(child.bounds + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(names, values + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# ---- HTTP ----
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status code.",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware timing every HTTP request.
+    The route label is the matched path template (/auth/users/{user_id}),
+    never the raw path, so label cardinality stays bounded. The request
+    ends with its last body message: background tasks run after it and
+    aren't counted.
+    """
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+        observed = False
+
+        def observe() -> None:
+            nonlocal observed
+            if observed:
+                return
+            observed = True
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            http_request_duration.labels(
+                scope["method"], template, str(status_code)
+            ).observe(time.perf_counter() - start)
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                observe()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # no complete response (the app raised): up to here
+            observe()
+
@@ -0,0 +1,264 @@
+"""
+Opt-in request profiler.
+
+A request is captured when it is picked by PROFILE_SAMPLE_RATE, or when it
+turns out slower than PROFILE_SLOW_MS. A capture holds:
+
+- a stack-sampling profile: while captured requests are in flight, a
+  background thread reads every thread's stack each PROFILE_INTERVAL_MS
+  and counts folded stacks ("thread;module:function;..."), so time spent
+  in the event loop or in worker threads (sync DB calls, file writes)
+  shows up where it happens. Parked threads are left out: a request with
+  many ticks but few stacks was waiting (e.g. on the hashing processes);
+- the SQL statements the request issued, with their durations.
+
+Samples are per process, not per request: requests running concurrently
+show up in each other's profiles. The SQL list is exact (a context
+variable follows the request into worker threads and greenlets).
+
+The last PROFILE_MAX_CAPTURES captures are kept in a ring buffer, read via
+GET /admin/profiles. With both settings at 0 (the default) the middleware
+and the SQL hook are not installed at all.
+
+A slow request can only be recognized at its end, so with PROFILE_SLOW_MS
+set every request is sampled while it runs and only slow ones are kept.
+"""
+
+import itertools
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+
+from app.core.config import (
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SLOW_MS,
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_CAPTURES,
+)
+
+# SQL statements kept per capture
+MAX_SQL_STATEMENTS = 200
+# Deeper stacks are cut at the root end
+MAX_STACK_DEPTH = 128
+# Leaf frames of parked threads (idle pool workers); not worth a sample
+IDLE_MODULES = ("threading", "queue", "concurrent.futures.thread", "selectors")
+
+_current: ContextVar[Optional["Recording"]] = ContextVar("profiler_recording", default=None)
+
+
+def fold_stack(frame, thread_name: str) -> Optional[str]:
+    """'thread;module:function;...' from the root frame down, or None if idle."""
+    if frame.f_globals.get("__name__") in IDLE_MODULES:
+        return None
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+
+class Recording:
+    """One request being captured."""
+
+    __slots__ = (
+        "id", "method", "path", "started_at", "start", "sampled",
+        "ticks", "samples", "sql", "sql_dropped", "done",
+    )
+
+    def __init__(self, capture_id: int, method: str, path: str, sampled: bool) -> None:
+        self.id = capture_id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.sampled = sampled
+        # sampler passes while in flight, and how often each stack was seen
+        self.ticks = 0
+        self.samples: Counter = Counter()
+        self.sql: List[dict] = []
+        self.sql_dropped = 0
+        self.done = False
+
+    def add_sql(self, statement: str, seconds: float) -> None:
+        if len(self.sql) >= MAX_SQL_STATEMENTS:
+            self.sql_dropped += 1
+            return
+        self.sql.append({"statement": statement, "duration_ms": round(seconds * 1000, 3)})
+
+
+class RequestProfiler:
+    """
+    Decides which requests to capture, runs the sampler thread and keeps
+    the finished captures (see module docstring).
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        slow_ms: float = 0.0,
+        interval: float = 0.005,
+        max_captures: int = 50,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval = interval
+        self.captures: Deque[dict] = deque(maxlen=max_captures)
+        self._ids = itertools.count(1)
+        self._active: Dict[int, Recording] = {}
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    # ---- requests ----
+
+    def start(self, method: str, path: str) -> Optional[Recording]:
+        """A recording if this request is (possibly) captured, else None."""
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled and self.slow_ms <= 0:
+            return None
+        recording = Recording(next(self._ids), method, path, sampled)
+        with self._lock:
+            self._active[recording.id] = recording
+            if self._sampler is None:
+                self._sampler = threading.Thread(
+                    target=self._sample_loop, name="request-profiler", daemon=True
+                )
+                self._sampler.start()
+        return recording
+
+    def finish(self, recording: Recording, status: int, route: Optional[str]) -> None:
+        """Keep the capture if it was sampled or slow."""
+        duration_ms = (time.perf_counter() - recording.start) * 1000
+        recording.done = True
+        with self._lock:
+            self._active.pop(recording.id, None)
+        if recording.sampled:
+            reason = "sampled"
+        elif duration_ms >= self.slow_ms:
+            reason = "slow"
+        else:
+            return
+        self.captures.append({
+            "id": recording.id,
+            "method": recording.method,
+            "path": recording.path,
+            "route": route,
+            "status": status,
+            "reason": reason,
+            "started_at": recording.started_at,
+            "duration_ms": round(duration_ms, 3),
+            "interval_ms": self.interval * 1000,
+            "ticks": recording.ticks,
+            "stacks": [
+                {"stack": stack, "count": count}
+                for stack, count in recording.samples.most_common()
+            ],
+            "sql": recording.sql,
+            "sql_dropped": recording.sql_dropped,
+        })
+
+    def record_sql(self, statement: str, seconds: float) -> None:
+        """Attach a statement to the current request's capture, if any."""
+        recording = _current.get()
+        # done: a long-lived task (e.g. the group-commit writer) that
+        # inherited the context of a request that has finished
+        if recording is not None and not recording.done:
+            recording.add_sql(statement, seconds)
+
+    # ---- captures ----
+
+    def get(self, capture_id: int) -> Optional[dict]:
+        for capture in self.captures:
+            if capture["id"] == capture_id:
+                return capture
+        return None
+
+    def clear(self) -> None:
+        self.captures.clear()
+
+    # ---- sampler thread ----
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._active:
+                    # restarted by the next captured request
+                    self._sampler = None
+                    return
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    stack = fold_stack(frame, names.get(ident, f"thread-{ident}"))
+                    if stack is not None:
+                        stacks.append(stack)
+            # under the lock: finish() reads a recording once it is removed
+            with self._lock:
+                for recording in self._active.values():
+                    recording.ticks += 1
+                    recording.samples.update(stacks)
+            time.sleep(self.interval)
+
+
+class ProfilerMiddleware:
+    """
+    Pure ASGI middleware: opens a recording for each HTTP request and closes
+    it with the last response body message, so background tasks running
+    after the response don't make the request look slow.
+    """
+
+    def __init__(self, app, profiler: "RequestProfiler") -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        recording = self.profiler.start(scope["method"], scope["path"])
+        if recording is None:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        def finish() -> None:
+            if not recording.done:
+                route = getattr(scope.get("route"), "path", None)
+                self.profiler.finish(recording, status_code, route)
+
+        async def send_wrapper(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        # followed into worker threads and greenlets, for record_sql()
+        # (done recordings take no more SQL: background tasks' isn't listed)
+        token = _current.set(recording)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            # no complete response (the app raised): up to here
+            finish()
+
+
+# Global profiler instance
+profiler = RequestProfiler(
+    sample_rate=PROFILE_SAMPLE_RATE,
+    slow_ms=PROFILE_SLOW_MS,
+    interval=PROFILE_INTERVAL_MS / 1000,
+    max_captures=PROFILE_MAX_CAPTURES,
+)
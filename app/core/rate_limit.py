@@ -0,0 +1,267 @@
+"""
+Rate limiting for the password endpoints (/auth/login, /auth/register).
+
+Every attempt takes a token from two buckets: one per client IP (IPv6
+clients per /64) and one per identifier. A bucket holds up to `burst`
+tokens and refills at `per_minute`. When either bucket is empty the
+attempt is refused with 429 + Retry-After before any user lookup or
+password hashing. Both buckets are checked before either is charged,
+so a refused attempt costs nothing.
+
+A bucket is stored as one float (the GCRA form of a token bucket): the
+time at which it will be full again. A full bucket and a missing entry
+are the same thing, so entries expire on their own once that time passes.
+
+Stores (RATE_LIMIT_BACKEND):
+- "memory": per process, a dict in least-recently-charged order, expired
+  entries swept from the front, bounded by RATE_LIMIT_MAX_KEYS. With
+  several workers each has its own buckets, so limits multiply.
+- "sqlite": a small SQLite file shared by all workers on the host.
+- "off": no limits.
+"""
+
+import ipaddress
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+from anyio import to_thread
+
+from app.core.config import (
+    RATE_LIMIT_BACKEND,
+    RATE_LIMIT_SQLITE_PATH,
+    RATE_LIMIT_MAX_KEYS,
+    RATE_LIMIT_IP_BURST,
+    RATE_LIMIT_IP_PER_MINUTE,
+    RATE_LIMIT_IDENTIFIER_BURST,
+    RATE_LIMIT_IDENTIFIER_PER_MINUTE,
+)
+from app.core.metrics import Counter
+
+
+class RateLimitedError(Exception):
+    """Too many attempts; the client may retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: float) -> None:
+        super().__init__("Too many attempts, try again later")
+        self.retry_after = retry_after
+
+
+class Rule:
+    """Bucket size and refill rate; burst or per_minute <= 0 means no limit."""
+
+    __slots__ = ("burst", "per_minute", "interval")
+
+    def __init__(self, burst: int, per_minute: float) -> None:
+        self.burst = burst
+        self.per_minute = per_minute
+        # seconds per token
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.burst > 0 and self.per_minute > 0
+
+    def wait(self, full_at: float, now: float) -> float:
+        """Seconds until the bucket has a token (0 = it has one now)."""
+        return max(0.0, full_at - now - (self.burst - 1) * self.interval)
+
+    def charge(self, full_at: float, now: float) -> float:
+        """New full-again time after taking one token."""
+        return max(full_at, now) + self.interval
+
+
+Buckets = Sequence[Tuple[str, Rule]]
+
+
+class MemoryBucketStore:
+    """Per-process buckets: key -> full-again time, oldest charge first."""
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        self.evictions = 0
+        self._entries: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def take(self, buckets: Buckets) -> float:
+        return self.take_now(buckets, time.time())
+
+    def take_now(self, buckets: Buckets, now: float) -> float:
+        """Charge all buckets and return 0, or charge none and return the wait."""
+        with self._lock:
+            entries = self._entries
+            wait = max(rule.wait(entries.get(key, now), now) for key, rule in buckets)
+            if wait > 0:
+                return wait
+            for key, rule in buckets:
+                entries[key] = rule.charge(entries.get(key, now), now)
+                entries.move_to_end(key)
+            self._sweep(now)
+        return 0.0
+
+    def _sweep(self, now: float) -> None:
+        # front = charged longest ago: drop full buckets, then enforce the bound
+        entries = self._entries
+        while entries:
+            key, full_at = next(iter(entries.items()))
+            if full_at > now:
+                if len(entries) <= self.max_keys:
+                    break
+                # evicting grants at most a full bucket
+                self.evictions += 1
+            del entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteBucketStore:
+    """Buckets in a SQLite file, shared by every worker that opens it."""
+
+    def __init__(self, path: str, sweep_interval: float = 60.0) -> None:
+        self.path = path
+        self.sweep_interval = sweep_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+
+    async def take(self, buckets: Buckets) -> float:
+        return await to_thread.run_sync(self.take_now, buckets, time.time())
+
+    def take_now(self, buckets: Buckets, now: float) -> float:
+        """Same contract as MemoryBucketStore.take_now, in one transaction."""
+        keys = [key for key, _ in buckets]
+        with self._lock:
+            conn = self._connect()
+            # write lock up front: two workers must not both take the last token
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = dict(conn.execute(
+                    f"SELECT key, full_at FROM buckets WHERE key IN ({','.join('?' * len(keys))})",
+                    keys,
+                ))
+                wait = max(rule.wait(rows.get(key, now), now) for key, rule in buckets)
+                if wait <= 0:
+                    conn.executemany(
+                        "INSERT INTO buckets (key, full_at) VALUES (?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET full_at = excluded.full_at",
+                        [(key, rule.charge(rows.get(key, now), now)) for key, rule in buckets],
+                    )
+                if now >= self._next_sweep:
+                    conn.execute("DELETE FROM buckets WHERE full_at <= ?", (now,))
+                    self._next_sweep = now + self.sweep_interval
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return max(wait, 0.0)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(
+                self.path, timeout=5.0, isolation_level=None, check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            # losing recent charges in a crash is harmless
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, full_at REAL NOT NULL) WITHOUT ROWID"
+            )
+            self._conn = conn
+        return self._conn
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM buckets")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_store(backend: str, path: str, max_keys: int):
+    """Build the bucket store for RATE_LIMIT_BACKEND (None = off)."""
+    if backend == "off":
+        return None
+    if backend == "memory":
+        return MemoryBucketStore(max_keys=max_keys)
+    if backend == "sqlite":
+        return SqliteBucketStore(path)
+    raise ValueError(f"Unknown rate limit backend: {backend!r}")
+
+
+def client_key(host: Optional[str]) -> Optional[str]:
+    """Bucket key for a client address: IPv6 clients are grouped by /64."""
+    if not host:
+        return None
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return host
+    if address.version == 6:
+        if address.ipv4_mapped is not None:
+            return str(address.ipv4_mapped)
+        return str(ipaddress.ip_network(f"{address}/64", strict=False))
+    return str(address)
+
+
+class RateLimiter:
+    """Per-IP and per-identifier buckets for one group of endpoints."""
+
+    def __init__(self, store, ip: Rule, identifier: Rule, scope: str = "auth") -> None:
+        self.store = store
+        self.ip = ip
+        self.identifier = identifier
+        self.scope = scope
+
+    async def check(self, host: Optional[str], identifier: str) -> None:
+        """Take a token for this attempt or raise RateLimitedError."""
+        if self.store is None:
+            return
+        buckets: List[Tuple[str, Rule]] = []
+        ip = client_key(host)
+        if ip is not None and self.ip.enabled:
+            buckets.append((f"{self.scope}:ip:{ip}", self.ip))
+        if self.identifier.enabled:
+            buckets.append((f"{self.scope}:id:{identifier}", self.identifier))
+        if not buckets:
+            return
+        wait = await self.store.take(buckets)
+        if wait > 0:
+            rate_limited.inc()
+            raise RateLimitedError(wait)
+
+    def reset(self) -> None:
+        if self.store is not None:
+            self.store.clear()
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+
+
+rate_limited = Counter(
+    "auth_rate_limited_total",
+    "Login/register attempts refused by the rate limiter.",
+)
+
+# Global limiter instance for /auth/login and /auth/register
+auth_limiter = RateLimiter(
+    create_store(RATE_LIMIT_BACKEND, RATE_LIMIT_SQLITE_PATH, RATE_LIMIT_MAX_KEYS),
+    ip=Rule(RATE_LIMIT_IP_BURST, RATE_LIMIT_IP_PER_MINUTE),
+    identifier=Rule(RATE_LIMIT_IDENTIFIER_BURST, RATE_LIMIT_IDENTIFIER_PER_MINUTE),
+)
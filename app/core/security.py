@@ -1,30 +1,53 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional
 
-from jose import jwt, JWTError
-from passlib.context import CryptContext
-
 from app.core.config import JWT_SECRET_KEY, JWT_ALGORITHM, JWT_ACCESS_TOKEN_EXPIRE_MINUTES
+from app.core.hashing import hash_duration, hasher
+from app.core.token_cache import MISS, token_cache
+
+# jose and passlib are imported on first use, not at startup: together they
+# are a large share of the app's import time (hashing workers import this too)
+
+
+@lru_cache(maxsize=None)
+def password_context():
+    """The passlib CryptContext, built on first use."""
+    from passlib.context import CryptContext
 
-# Use pbkdf2_sha256 instead of bcrypt to avoid Windows/bcrypt issues
-pwd_context = CryptContext(
-    schemes=["pbkdf2_sha256"],
-    deprecated="auto",
-)
+    # Use pbkdf2_sha256 instead of bcrypt to avoid Windows/bcrypt issues
+    return CryptContext(
+        schemes=["pbkdf2_sha256"],
+        deprecated="auto",
+    )
 
 
 def hash_password(password: str) -> str:
     """Hash plain password."""
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 
 def verify_password(plain_password: str, password_hash: str) -> bool:
     """Check that plain password matches hashed password."""
-    return pwd_context.verify(plain_password, password_hash)
+    return password_context().verify(plain_password, password_hash)
+
+
+async def hash_password_async(password: str) -> str:
+    """Hash plain password on the hashing backend (off the event loop)."""
+    with hash_duration.labels("hash").time():
+        return await hasher.run(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, password_hash: str) -> bool:
+    """Verify password on the hashing backend (off the event loop)."""
+    with hash_duration.labels("verify").time():
+        return await hasher.run(verify_password, plain_password, password_hash)
 
 
 def create_access_token(subject: str, expires_minutes: Optional[int] = None) -> str:
     """Create JWT access token with `sub` = subject."""
+    from jose import jwt
+
     if expires_minutes is None:
         expires_minutes = JWT_ACCESS_TOKEN_EXPIRE_MINUTES
 
@@ -35,9 +58,27 @@ def create_access_token(subject: str, expires_minutes: Optional[int] = None) ->
 
 
 def decode_access_token(token: str) -> Optional[str]:
-    """Decode JWT and return subject if valid, else None."""
+    """
+    Decode JWT and return subject if valid, else None.
+
+    Verified tokens are memoized until their `exp`; past that (or on any
+    cache miss) the token goes through full jose verification again.
+    """
+    cached = token_cache.get(token)
+    if cached is not MISS:
+        return cached
+
+    from jose import jwt, JWTError
+
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return payload.get("sub")
     except JWTError:
+        token_cache.put_invalid(token)
         return None
+
+    subject = payload.get("sub")
+    exp = payload.get("exp")
+    # tokens without exp would never expire from the cache -> don't cache them
+    if subject is not None and isinstance(exp, (int, float)):
+        token_cache.put(token, subject, exp)
+    return subject
@@ -0,0 +1,311 @@
+"""
+Avatar file server.
+
+A small ASGI app mounted at /static/avatars instead of a plain StaticFiles:
+
+- keeps an in-memory metadata index (size, mtime, strong ETag) so a
+  conditional GET (If-None-Match) is answered with 304 without a stat call;
+- serves single byte ranges (Range / If-Range);
+- sends content-addressed names with far-future immutable caching;
+- uses the ASGI zero-copy send extension when the server offers it.
+
+Content-addressed names (3f/3fa9...e1.png, 3f/3fa9...e1_48.webp) never change
+content, so their ETag is the hash from the name and their index entries
+stay valid until the file is deleted (services.avatars evicts them).
+"""
+
+import os
+import re
+import stat
+import threading
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Optional, Tuple
+
+from anyio import to_thread
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import AVATAR_INDEX_MAX_SIZE
+
+# Content-addressed files never change -> cache for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Other files (per-user names from before content addressing) -> revalidate
+REVALIDATE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+
+CONTENT_ADDRESSED_KEY = re.compile(r"^[0-9a-f]{2}/([0-9a-f]{32})(_\d+)?\.[a-z]+$")
+# Plain relative paths only: no "..", no hidden/temp (".upload-*.part") files
+SAFE_KEY = re.compile(r"^(?:[A-Za-z0-9_-][A-Za-z0-9_.-]*/)*[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+
+CONTENT_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def is_content_addressed(key: str) -> bool:
+    return bool(CONTENT_ADDRESSED_KEY.match(key))
+
+
+class FileMeta:
+    """Cached metadata of one served file."""
+
+    __slots__ = ("path", "size", "etag", "last_modified", "content_type", "cache_control")
+
+    def __init__(self, key: str, path: str, st: os.stat_result) -> None:
+        self.path = path
+        self.size = st.st_size
+        self.last_modified = formatdate(st.st_mtime, usegmt=True)
+        _, ext = os.path.splitext(key)
+        self.content_type = CONTENT_TYPES.get(ext.lower(), "application/octet-stream")
+
+        match = CONTENT_ADDRESSED_KEY.match(key)
+        if match:
+            # name carries the content hash -> strong validator by construction
+            self.etag = f'"{match.group(1)}{match.group(2) or ""}"'
+            self.cache_control = IMMUTABLE_CACHE_CONTROL
+        else:
+            self.etag = f'"{st.st_size:x}-{st.st_mtime_ns:x}"'
+            self.cache_control = REVALIDATE_CACHE_CONTROL
+
+
+class FileIndex:
+    """LRU map of key -> FileMeta, bounded by entry count."""
+
+    def __init__(self, max_size: int = 100_000) -> None:
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, FileMeta]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[FileMeta]:
+        with self._lock:
+            meta = self._entries.get(key)
+            if meta is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return meta
+
+    def put(self, key: str, meta: FileMeta) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = meta
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+# Global index of the avatar directory
+avatar_index = FileIndex(max_size=AVATAR_INDEX_MAX_SIZE)
+
+
+def _parse_range(value: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single "bytes=start-end" range into inclusive (start, end).
+    Returns None for anything we serve in full (multiple ranges, other units).
+    Raises ValueError if the range can't be satisfied.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, sep, end_text = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if start_text == "":
+            # suffix range: last N bytes
+            length = int(end_text)
+            if length <= 0:
+                raise ValueError("empty suffix range")
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        raise ValueError("malformed range")
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, min(end, size - 1)
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Whether an If-None-Match header matches `etag` (weak comparison)."""
+    if header.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in header.split(","))
+    return any(tag == etag or tag == f"W/{etag}" for tag in candidates)
+
+
+def _read_range(path: str, start: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(start)
+        return f.read(length)
+
+
+class AvatarFileServer:
+    """ASGI app serving files from `directory` (see module docstring)."""
+
+    def __init__(self, directory: str, index: Optional[FileIndex] = None) -> None:
+        self.directory = directory
+        self.index = index if index is not None else avatar_index
+
+    def _lookup(self, key: str) -> Optional[FileMeta]:
+        """Stat a file and index it (blocking, runs in a worker thread)."""
+        path = os.path.join(self.directory, *key.split("/"))
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not stat.S_ISREG(st.st_mode):
+            return None
+        meta = FileMeta(key, path, st)
+        self.index.put(key, meta)
+        return meta
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            await self._send_empty(send, 405, [(b"allow", b"GET, HEAD")])
+            return
+
+        key = self._route_key(scope)
+        if not SAFE_KEY.match(key):
+            await self._send_empty(send, 404)
+            return
+
+        meta = self.index.get(key)
+        if meta is None:
+            meta = await to_thread.run_sync(self._lookup, key)
+            if meta is None:
+                await self._send_empty(send, 404)
+                return
+
+        headers = dict(
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in scope["headers"]
+        )
+        base_headers = [
+            (b"etag", meta.etag.encode()),
+            (b"last-modified", meta.last_modified.encode()),
+            (b"cache-control", meta.cache_control.encode()),
+            (b"accept-ranges", b"bytes"),
+        ]
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, meta.etag):
+            await self._send_empty(send, 304, base_headers)
+            return
+
+        start, end, status = 0, meta.size - 1, 200
+        range_header = headers.get("range")
+        if_range = headers.get("if-range")
+        if range_header and meta.size and (if_range is None or if_range.strip() == meta.etag):
+            try:
+                byte_range = _parse_range(range_header, meta.size)
+            except ValueError:
+                await self._send_empty(
+                    send, 416, [(b"content-range", f"bytes */{meta.size}".encode())]
+                )
+                return
+            if byte_range is not None:
+                start, end = byte_range
+                status = 206
+                base_headers.append(
+                    (b"content-range", f"bytes {start}-{end}/{meta.size}".encode())
+                )
+
+        length = end - start + 1 if meta.size else 0
+        response_headers = base_headers + [
+            (b"content-type", meta.content_type.encode()),
+            (b"content-length", str(length).encode()),
+        ]
+
+        if method == "HEAD":
+            await send({"type": "http.response.start", "status": status, "headers": response_headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        try:
+            await self._send_file(scope, send, meta, status, response_headers, start, length)
+        except FileNotFoundError:
+            # deleted since it was indexed
+            self.index.discard(key)
+            await self._send_empty(send, 404)
+
+    @staticmethod
+    def _route_key(scope: Scope) -> str:
+        path = scope["path"]
+        root_path = scope.get("root_path", "")
+        # newer Starlette keeps the full path in a mount, older ones strip it
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        return path.lstrip("/")
+
+    async def _send_file(self, scope, send, meta, status, headers, start, length) -> None:
+        extensions = scope.get("extensions") or {}
+
+        if "http.response.zerocopysend" in extensions:
+            f = await to_thread.run_sync(open, meta.path, "rb")
+            try:
+                await send({"type": "http.response.start", "status": status, "headers": headers})
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": f.fileno(),
+                    "offset": start,
+                    "count": length,
+                })
+            finally:
+                f.close()
+            return
+
+        if length <= CHUNK_SIZE:
+            # typical avatar / thumbnail: one read, one send
+            body = await to_thread.run_sync(_read_range, meta.path, start, length)
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        f = await to_thread.run_sync(open, meta.path, "rb")
+        try:
+            await to_thread.run_sync(f.seek, start)
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            remaining = length
+            while remaining > 0:
+                chunk = await to_thread.run_sync(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body",
+                    "body": chunk,
+                    "more_body": remaining > 0,
+                })
+            if remaining > 0:
+                # file shrank under us; close the body anyway
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            f.close()
+
+    @staticmethod
+    async def _send_empty(send: Send, status: int, headers: Optional[list] = None) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": (headers or []) + [(b"content-length", b"0")],
+        })
+        await send({"type": "http.response.body", "body": b""})
@@ -0,0 +1,79 @@
+"""
+Hashed timing wheel: one task serves the timeouts of any number of items.
+
+The wheel is a ring of slots, one per `tick` seconds, spanning the longest
+delay in use. schedule() drops an item into the slot its delay lands on,
+cancel() takes it out again (both O(1)); every tick the task advances to
+the next slot and hands its items to the callback, which may schedule
+them again. Timeouts fire up to one tick late, never early.
+
+Items carry their own slot index in a `timer_slot` attribute (None when
+not scheduled), so the wheel needs no index of its own.
+"""
+
+import asyncio
+import math
+from typing import Callable, List, Optional, Set
+
+
+class TimerWheel:
+    """Ring of `span / tick` slots advanced by a single task."""
+
+    def __init__(self, tick: float, span: float, on_expire: Callable[[object], None]) -> None:
+        self.tick = tick
+        self.on_expire = on_expire
+        self._slots: List[Set[object]] = [set() for _ in range(math.ceil(span / tick) + 1)]
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self._slots)
+
+    def schedule(self, item, delay: float) -> None:
+        """Fire `item` after about `delay` seconds (capped at the wheel's span)."""
+        self.cancel(item)
+        steps = min(len(self._slots) - 1, max(1, math.ceil(delay / self.tick)))
+        index = (self._cursor + steps) % len(self._slots)
+        self._slots[index].add(item)
+        item.timer_slot = index
+
+    def cancel(self, item) -> None:
+        if item.timer_slot is not None:
+            self._slots[item.timer_slot].discard(item)
+            item.timer_slot = None
+
+    def advance(self) -> None:
+        """Move to the next slot and expire its items."""
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        due = self._slots[self._cursor]
+        if not due:
+            return
+        self._slots[self._cursor] = set()
+        for item in due:
+            item.timer_slot = None
+            self.on_expire(item)
+
+    # ---- ticking task ----
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self.tick
+        while True:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            # a stalled loop catches up slot by slot instead of drifting
+            while loop.time() >= next_tick:
+                next_tick += self.tick
+                self.advance()
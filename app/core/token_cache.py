@@ -0,0 +1,88 @@
+"""
+Cache of verified JWTs for decode_access_token.
+
+key = raw token string, value = (subject, valid_until).
+Valid tokens are kept until their `exp` claim, so a cached answer never
+outlives the token; invalid tokens are kept only for a short negative TTL.
+Bounded by count with LRU eviction.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.core.config import TOKEN_CACHE_MAX_SIZE, TOKEN_CACHE_NEGATIVE_TTL_SECONDS
+
+# Returned by get() when the token has to be decoded
+MISS = object()
+
+
+class TokenCache:
+    """LRU cache of token -> subject (None for invalid tokens)."""
+
+    def __init__(self, max_size: int = 10_000, negative_ttl_seconds: float = 1.0) -> None:
+        self.max_size = max_size
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[Optional[str], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        """Return cached subject (or None for a known-bad token), else MISS."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            subject, valid_until = entry
+            if now >= valid_until:
+                del self._entries[token]
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return subject
+
+    def put(self, token: str, subject: str, exp: float) -> None:
+        """Remember a verified token until its expiry time."""
+        self._store(token, subject, exp)
+
+    def put_invalid(self, token: str) -> None:
+        """Remember a rejected token for the (short) negative TTL."""
+        if self.negative_ttl_seconds > 0:
+            self._store(token, None, time.time() + self.negative_ttl_seconds)
+
+    def _store(self, token: str, subject: Optional[str], valid_until: float) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (subject, valid_until)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Global cache instance
+token_cache = TokenCache(
+    max_size=TOKEN_CACHE_MAX_SIZE,
+    negative_ttl_seconds=TOKEN_CACHE_NEGATIVE_TTL_SECONDS,
+)
@@ -0,0 +1,107 @@
+"""
+In-process cache of authenticated users for get_current_user.
+
+Holds detached, slot-based snapshots (no SQLAlchemy session attached),
+bounded by count (LRU eviction) and age (TTL). Endpoints that change or
+delete a user must call `manager.invalidate_user(user_id)` (app.core.ws_manager)
+after commit, which invalidates it here and in every other worker.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.config import USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS
+
+
+class CachedUser:
+    """Read-only snapshot of a User row."""
+
+    __slots__ = ("id", "identifier", "avatar_url")
+
+    def __init__(self, id: int, identifier: str, avatar_url: Optional[str] = None) -> None:
+        self.id = id
+        self.identifier = identifier
+        self.avatar_url = avatar_url
+
+    @classmethod
+    def from_row(cls, user) -> "CachedUser":
+        return cls(id=user.id, identifier=user.identifier, avatar_url=user.avatar_url)
+
+    def __repr__(self) -> str:
+        return f"CachedUser(id={self.id!r}, identifier={self.identifier!r})"
+
+
+class UserCache:
+    """
+    TTL + LRU cache of CachedUser keyed by user id.
+    key = user_id, value = (expires_at, CachedUser).
+    """
+
+    def __init__(self, max_size: int = 10_000, ttl_seconds: float = 30.0) -> None:
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # bumped on every invalidation; loads that started before are not stored
+        self.epoch = 0
+        self._entries: "OrderedDict[int, tuple[float, CachedUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> Optional[CachedUser]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, user = entry
+            if expires_at <= now:
+                del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return user
+
+    def put(self, user: CachedUser, epoch: int) -> None:
+        """
+        Store snapshot loaded when `self.epoch` was `epoch`.
+        Skipped if an invalidation happened meanwhile (the row may be stale).
+        """
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if epoch != self.epoch:
+                return
+            self._entries[user.id] = (time.monotonic() + self.ttl_seconds, user)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self.epoch += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Global cache instance
+user_cache = UserCache(max_size=USER_CACHE_MAX_SIZE, ttl_seconds=USER_CACHE_TTL_SECONDS)
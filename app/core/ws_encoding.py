@@ -0,0 +1,56 @@
+"""
+WebSocket message encodings.
+
+Events are serialized to JSON once, by the worker that publishes them
+(ConnectionManager.send_to_user). A worker holding sockets that asked for
+another encoding converts that JSON once per event, and the result is
+shared by all of them.
+
+- "json": text frames (the default).
+- "msgpack": binary MessagePack frames; needs the optional `msgpack`
+  package, and isn't offered without it.
+
+A client picks one with the `format` query parameter, or by offering it
+as a subprotocol (`Sec-WebSocket-Protocol: msgpack`). Frame compression
+(permessage-deflate) is separate: uvicorn negotiates it with clients that
+offer it (`--ws-per-message-deflate`, on by default), for either encoding.
+"""
+
+import json
+from typing import Callable, Dict, Optional, Sequence, Tuple, Union
+
+try:
+    import msgpack
+except ImportError:  # msgpack format not offered
+    msgpack = None
+
+# What a connection's queue holds: text frames (str) or binary frames (bytes)
+Payload = Union[str, bytes]
+
+
+def msgpack_from_json(text: str) -> bytes:
+    return msgpack.packb(json.loads(text))
+
+
+# encoding -> JSON text to its frame payload ("json" needs no conversion)
+ENCODERS: Dict[str, Callable[[str], bytes]] = {}
+if msgpack is not None:
+    ENCODERS["msgpack"] = msgpack_from_json
+
+ENCODINGS = ("json", *ENCODERS)
+
+
+def negotiate(requested: Optional[str], offered: Sequence[str]) -> Optional[Tuple[str, Optional[str]]]:
+    """
+    (encoding, subprotocol to accept with) for a handshake, or None if the
+    `format` asked for isn't available. Without `format` the first offered
+    subprotocol naming an encoding wins, else JSON.
+    """
+    if requested is not None:
+        if requested not in ENCODINGS:
+            return None
+        return requested, requested if requested in offered else None
+    for protocol in offered:
+        if protocol in ENCODINGS:
+            return protocol, protocol
+    return "json", None
@@ -1,71 +1,498 @@
-from typing import Dict, Set
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set
 
 from fastapi import WebSocket
-from starlette.websockets import WebSocketDisconnect
+
+from app.core.config import (
+    WS_SEND_QUEUE_SIZE,
+    WS_SLOW_CONSUMER_POLICY,
+    WS_SEND_TIMEOUT_SECONDS,
+    WS_PING_INTERVAL_SECONDS,
+    WS_IDLE_TIMEOUT_SECONDS,
+    WS_TIMER_TICK_SECONDS,
+    WS_MAX_HANDSHAKES,
+    WS_MAX_CONNECTIONS_PER_USER,
+    WS_RETRY_AFTER_SECONDS,
+    WS_BUS_BACKEND,
+    WS_BUS_SOCKET_PATH,
+)
+from app.core.event_bus import InProcessBus, create_bus
+from app.core.event_log import Event, EventLog, event_log
+from app.core.metrics import FAST_BUCKETS, Counter, Gauge, Histogram
+from app.core.timer_wheel import TimerWheel
+from app.core.user_cache import UserCache, user_cache
+from app.core.ws_encoding import ENCODERS, Payload
+
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "disconnect")
+
+# Close code for clients dropped because they can't keep up ("try again later")
+CLOSE_SLOW_CONSUMER = 1013
+# Close code for clients that stayed silent past the idle timeout
+CLOSE_IDLE = 1001
+# Handshake refused: worker busy (reason {"retry_after": seconds}) / user at the socket cap
+CLOSE_TRY_AGAIN = 1013
+CLOSE_TOO_MANY_CONNECTIONS = 1008
+# Handshake asked for a message format this server doesn't offer
+CLOSE_UNSUPPORTED_FORMAT = 1003
+
+# Heartbeat sent to silent sockets; any message back (e.g. {"event":"pong"}) counts
+PING_TEXT = '{"event":"ping"}'
+# ...in every encoding, built once: the writer knows a ping by identity
+PINGS: Dict[str, Payload] = {
+    "json": PING_TEXT,
+    **{name: encode(PING_TEXT) for name, encode in ENCODERS.items()},
+}
+
+ws_fanout_duration = Histogram(
+    "ws_fanout_duration_seconds",
+    "Event published -> queued on all of the user's sockets on this worker (bus hop included).",
+    buckets=FAST_BUCKETS,
+)
+ws_resumed = Counter(
+    "ws_resumed_total",
+    "Reconnects with ?since=: replay = missed events sent, resync = client told to re-fetch.",
+    ("result",),
+)
+ws_rejected = Counter(
+    "ws_rejected_total",
+    "WebSocket handshakes refused: busy = handshake limit, user_limit = per-user socket cap.",
+    ("reason",),
+)
+ws_send_duration = Histogram(
+    "ws_send_duration_seconds",
+    "Time for one queued message to be written to a socket.",
+    buckets=FAST_BUCKETS,
+)
+
+
+class Connection:
+    """
+    One registered socket and its bookkeeping.
+
+    Kept small for many idle sockets: the outbound queue and the writer
+    task draining it only exist while messages are pending.
+    """
+
+    __slots__ = (
+        "user_id", "websocket", "encoding", "queue", "writer", "dropped",
+        "connected_at", "last_seen", "timer_slot",
+    )
+
+    def __init__(self, user_id: int, websocket: WebSocket, encoding: str = "json") -> None:
+        self.user_id = user_id
+        self.websocket = websocket
+        # "json" (text frames) or a key of ws_encoding.ENCODERS (binary frames)
+        self.encoding = encoding
+        self.queue: Optional[Deque[Payload]] = None
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0
+        # monotonic times; last_seen = last message from the client
+        self.connected_at = self.last_seen = time.monotonic()
+        # heartbeat timer wheel slot
+        self.timer_slot: Optional[int] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self.queue) if self.queue else 0
+
+    def touch(self) -> None:
+        """The client sent something: it is alive."""
+        self.last_seen = time.monotonic()
 
 
 class ConnectionManager:
     """
     Holds active WebSocket connections per user.
-    key = user_id, value = set of WebSockets.
+    key = user_id, value = {WebSocket: Connection}.
+
+    Events go through the event bus, so every worker receives them and
+    fans out to the sockets it holds (see app.core.event_bus). The bus also
+    carries user cache invalidations, so a change made through one worker
+    isn't served stale by the others.
+
+    Broadcasts never await a socket: the event is serialized once (and
+    converted once per other encoding in use, see app.core.ws_encoding) and
+    the result is appended to each connection's bounded queue. A writer task per
+    connection (started when its queue fills, gone once drained) sends
+    queued messages with a timeout, so one slow client can't delay the
+    others (or the HTTP request that triggered the event).
+
+    Heartbeat: a single timer wheel visits every connection once per
+    ping interval. A socket silent for that long is sent a ping; one whose
+    ping fails or times out (dead peer, half-open TCP), or silent past the
+    idle timeout if one is set, is closed and removed.
+
+    Admission control: at most `max_handshakes` handshakes are validated at
+    once (a reconnect storm after a deploy queues on the DB otherwise), and
+    a user has at most `max_per_user` sockets here. Refused sockets are
+    accepted only to be closed with a code the client can read: 1013 with a
+    jittered retry hint, or 1008 for the per-user cap.
+
+    Resume: with an event log every event carries a "seq", and a client
+    connecting with the last seq it saw is first sent what it missed
+    (see app.core.event_log), or {"event":"resync"} if that is gone.
     """
 
-    def __init__(self) -> None:
-        self.active_connections: Dict[int, Set[WebSocket]] = {}
+    def __init__(
+        self,
+        queue_size: int = 32,
+        slow_consumer_policy: str = "drop_oldest",
+        send_timeout: float = 5.0,
+        bus=None,
+        ping_interval: float = 0.0,
+        idle_timeout: float = 0.0,
+        timer_tick: float = 1.0,
+        max_handshakes: int = 0,
+        max_per_user: int = 0,
+        retry_after: float = 2.0,
+        events: Optional[EventLog] = None,
+        users: Optional[UserCache] = None,
+    ) -> None:
+        if slow_consumer_policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {slow_consumer_policy!r}")
+        self.queue_size = queue_size
+        self.slow_consumer_policy = slow_consumer_policy
+        self.send_timeout = send_timeout
+        self.active_connections: Dict[int, Dict[WebSocket, Connection]] = {}
+        # close() calls in flight, kept referenced until done
+        self._closing: Set[asyncio.Task] = set()
+        self.bus = bus if bus is not None else InProcessBus()
+        self.bus.set_handler(self._on_bus_message)
+        # ping_interval 0: no heartbeat; idle_timeout 0: reap only when a ping can't be sent
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout if idle_timeout > 0 else math.inf
+        self.reaped = 0
+        # 0 = no limit
+        self.max_handshakes = max_handshakes
+        self.max_per_user = max_per_user
+        self.retry_after = retry_after
+        self.handshakes = 0
+        # None: events carry no seq and ?since= is ignored
+        self.events = events
+        # this worker's authenticated-user cache
+        self.users = users if users is not None else user_cache
+        # tells this worker's own events apart as they come back from the bus
+        self.origin = os.urandom(8).hex()
+        self.wheel: Optional[TimerWheel] = None
+        if ping_interval > 0:
+            self.wheel = TimerWheel(timer_tick, ping_interval, self._check_alive)
+
+    def connection_count(self) -> int:
+        """Open sockets on this worker."""
+        return sum(len(connections) for connections in self.active_connections.values())
+
+    async def start(self) -> None:
+        """Join the event bus and start the heartbeat (called on app startup)."""
+        await self.bus.start()
+        if self.wheel is not None:
+            self.wheel.start()
+
+    async def stop(self) -> None:
+        """Leave the event bus (called on app shutdown)."""
+        if self.wheel is not None:
+            await self.wheel.stop()
+        await self.bus.stop()
+        if self.events is not None:
+            await self.events.stop()
+
+    def _on_bus_message(self, message: dict) -> None:
+        """Apply a bus event to the sockets held by this worker."""
+        op = message.get("op")
+        user_id = message.get("user_id")
+        if op == "send":
+            text = message["text"]
+            if self.events is not None and "seq" in message:
+                text = self._log_event(user_id, message, text)
+            self.send_local(user_id, text)
+            sent_at = message.get("ts")
+            if sent_at is not None:
+                # wall clock: the publisher may be another worker
+                ws_fanout_duration.observe(max(0.0, time.time() - sent_at))
+        elif op == "invalidate_user":
+            self.users.invalidate(user_id)
+        elif op == "disconnect_user":
+            for ws in list(self.active_connections.get(user_id, {})):
+                self._remove(user_id, ws)
+                self._close_later(ws, 1000)
+
+    def _log_event(self, user_id: int, message: dict, text: str) -> str:
+        """Number an arriving event and keep it; returns its text with "seq"."""
+        seq = message["seq"]
+        if seq is None:
+            # no broker numbered it: single worker, or broker failover
+            seq = self.events.next_seq(user_id)
+        # same text as serializing the event with "seq" as its last key
+        text = f'{text[:-1]}{"," if len(text) > 2 else ""}"seq":{seq}}}'
+        self.events.append(user_id, seq, text)
+        if message.get("origin") == self.origin:
+            self.events.persist(user_id, seq, text)
+        return text
+
+    # ---- admission ----
+
+    def begin_handshake(self) -> bool:
+        """Take a handshake slot; False if the worker is busy (refuse the socket)."""
+        if self.max_handshakes and self.handshakes >= self.max_handshakes:
+            ws_rejected.labels("busy").inc()
+            return False
+        self.handshakes += 1
+        return True
 
-    async def connect(self, user_id: int, websocket: WebSocket) -> None:
-        """Accept connection and register it for this user."""
-        await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = set()
-        self.active_connections[user_id].add(websocket)
+    def end_handshake(self) -> None:
+        self.handshakes -= 1
 
-    def _remove(self, user_id: int, websocket: WebSocket) -> None:
-        sockets = self.active_connections.get(user_id)
-        if not sockets:
+    def retry_hint(self) -> str:
+        """Close reason for 1013: retry_after spread over [1x, 2x) the base delay."""
+        delay = self.retry_after * (1 + random.random())
+        return json.dumps({"retry_after": round(delay, 1)}, separators=(",", ":"))
+
+    async def refuse(self, websocket: WebSocket, code: int, reason: str = "") -> None:
+        """Accept only to close: before accept a client sees no close code."""
+        try:
+            await websocket.accept()
+        except Exception:
             return
-        sockets.discard(websocket)
-        if not sockets:
+        await self._close(websocket, code, reason)
+
+    async def connect(
+        self,
+        user_id: int,
+        websocket: WebSocket,
+        since: Optional[int] = None,
+        encoding: str = "json",
+        subprotocol: Optional[str] = None,
+    ) -> Optional[Connection]:
+        """
+        Accept connection and register it for this user. Returns None (and
+        closes the socket) if the user is at the per-user cap.
+        With `since`, the events after that seq are queued first.
+        """
+        await websocket.accept(subprotocol=subprotocol)
+        backlog = None
+        if since is not None and self.events is not None:
+            backlog = await self.events.replay(user_id, since)
+        connections = self.active_connections.setdefault(user_id, {})
+        # checked after accept(): nothing awaits between the check and registering
+        if self.max_per_user and len(connections) >= self.max_per_user:
+            ws_rejected.labels("user_limit").inc()
+            await self._close(websocket, CLOSE_TOO_MANY_CONNECTIONS, "too many connections")
+            return None
+        conn = Connection(user_id, websocket, encoding)
+        connections[websocket] = conn
+        if self.wheel is not None:
+            self.wheel.schedule(conn, self.ping_interval)
+        if since is not None and self.events is not None:
+            self._resume(conn, since, backlog)
+        return conn
+
+    def _resume(self, conn: Connection, since: int, backlog: Optional[List[Event]]) -> None:
+        """Queue missed events ahead of live ones (no await since registering)."""
+        if backlog is not None:
+            # published while the store was read
+            last = backlog[-1][0] if backlog else since
+            backlog += self.events.after(conn.user_id, last)
+        # more than the queue holds would be dropped: re-fetching is cheaper
+        if backlog is None or len(backlog) > self.queue_size:
+            ws_resumed.labels("resync").inc()
+            head = self.events.head(conn.user_id)
+            if backlog:
+                head = max(head, backlog[-1][0])
+            resync = json.dumps({"event": "resync", "seq": head}, separators=(",", ":"))
+            self._enqueue(conn, self._encode(conn, resync))
+            return
+        ws_resumed.labels("replay").inc()
+        for _, text in backlog:
+            self._enqueue(conn, self._encode(conn, text))
+
+    def _remove(self, user_id: int, websocket: WebSocket) -> Optional[Connection]:
+        connections = self.active_connections.get(user_id)
+        if not connections:
+            return None
+        conn = connections.pop(websocket, None)
+        if not connections:
             self.active_connections.pop(user_id, None)
+        if conn is not None:
+            if self.wheel is not None:
+                self.wheel.cancel(conn)
+            if conn.writer is not None and conn.writer is not asyncio.current_task():
+                conn.writer.cancel()
+        return conn
 
     async def disconnect(self, user_id: int, websocket: WebSocket) -> None:
         """Remove socket on disconnect."""
         self._remove(user_id, websocket)
 
-    async def broadcast_avatar_changed(self, user_id: int, avatar_url: str) -> None:
+    async def _close(self, websocket: WebSocket, code: int = 1000, reason: str = "") -> None:
+        try:
+            await asyncio.wait_for(websocket.close(code=code, reason=reason), self.send_timeout)
+        except Exception:
+            pass
+
+    def _close_later(self, websocket: WebSocket, code: int) -> None:
+        task = asyncio.create_task(self._close(websocket, code))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _writer(self, conn: Connection) -> None:
         """
-        Send avatar change event to all sockets of given user.
+        Drain the connection's queue; any send error or timeout drops it.
+        A ping that can't be sent means a dead peer: reaped, idle timeout or not.
         """
-        sockets = list(self.active_connections.get(user_id, []))
-        if not sockets:
+        payload = None
+        try:
+            while conn.queue:
+                payload = conn.queue.popleft()
+                started = time.perf_counter()
+                if isinstance(payload, str):
+                    send = conn.websocket.send_text(payload)
+                else:
+                    send = conn.websocket.send_bytes(payload)
+                await asyncio.wait_for(send, self.send_timeout)
+                ws_send_duration.observe(time.perf_counter() - started)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # send failed or timed out -> drop connection
+            self._remove(conn.user_id, conn.websocket)
+            if payload is PINGS[conn.encoding]:
+                self.reaped += 1
+                await self._close(conn.websocket, CLOSE_IDLE)
+            else:
+                await self._close(conn.websocket, CLOSE_SLOW_CONSUMER)
+        else:
+            # drained: idle connections hold neither a queue nor a task
+            conn.queue = None
+            conn.writer = None
+
+    @staticmethod
+    def _encode(conn: Connection, text: str) -> Payload:
+        """JSON text in the connection's encoding."""
+        if conn.encoding == "json":
+            return text
+        return ENCODERS[conn.encoding](text)
+
+    def _enqueue(self, conn: Connection, payload: Payload) -> None:
+        if conn.queue is None:
+            conn.queue = deque()
+        elif len(conn.queue) >= self.queue_size:
+            if self.slow_consumer_policy == "disconnect":
+                self._remove(conn.user_id, conn.websocket)
+                self._close_later(conn.websocket, CLOSE_SLOW_CONSUMER)
+                return
+            conn.queue.popleft()
+            conn.dropped += 1
+        conn.queue.append(payload)
+        if conn.writer is None:
+            conn.writer = asyncio.create_task(self._writer(conn))
+
+    def _check_alive(self, conn: Connection) -> None:
+        """Timer wheel callback: ping a silent socket, reap a dead one."""
+        silent = time.monotonic() - conn.last_seen
+        if silent >= self.idle_timeout:
+            self._remove(conn.user_id, conn.websocket)
+            self._close_later(conn.websocket, CLOSE_IDLE)
+            self.reaped += 1
             return
+        if silent >= self.ping_interval:
+            self._enqueue(conn, PINGS[conn.encoding])
+            delay = min(self.ping_interval, self.idle_timeout - silent)
+        else:
+            # heard from it recently: look again one interval after that
+            delay = self.ping_interval - silent
+        self.wheel.schedule(conn, delay)
 
+    def send_local(self, user_id: int, text: str) -> int:
+        """
+        Queue pre-serialized JSON for this worker's sockets of a user,
+        converted once per other encoding among them.
+        """
+        connections = list(self.active_connections.get(user_id, {}).values())
+        encoded: Dict[str, Payload] = {"json": text}
+        for conn in connections:
+            payload = encoded.get(conn.encoding)
+            if payload is None:
+                payload = encoded[conn.encoding] = ENCODERS[conn.encoding](text)
+            self._enqueue(conn, payload)
+        return len(connections)
+
+    async def send_to_user(self, user_id: int, message: dict) -> None:
+        """
+        Send a JSON event to every socket of a user, on any worker.
+        Serialized once here; workers only queue the text. With an event
+        log the message gets a "seq" and is kept for resuming clients.
+        The seq is given where events are put in order, the bus broker, so
+        it increases in the order every worker receives them (see
+        app.core.event_bus); this worker writes the event to the store
+        when it comes back.
+        """
+        bus_message = {"op": "send", "user_id": user_id, "ts": time.time()}
+        if self.events is not None:
+            bus_message["seq"] = None
+            bus_message["origin"] = self.origin
+        # same encoding as WebSocket.send_json
+        bus_message["text"] = json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+        await self.bus.publish(bus_message)
+
+    async def broadcast_avatar_changed(
+        self,
+        user_id: int,
+        avatar_url: str,
+        avatars: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """
+        Send avatar change event to all sockets of given user.
+        `avatars` maps derivative size -> URL.
+        """
         message = {
             "event": "avatar_changed",
             "avatar_url": avatar_url,
+            "avatars": avatars or {},
         }
+        await self.send_to_user(user_id, message)
 
-        for ws in sockets:
-            try:
-                await ws.send_json(message)
-            except WebSocketDisconnect:
-                self._remove(user_id, ws)
-            except Exception:
-                # any send error → drop connection
-                self._remove(user_id, ws)
+    async def invalidate_user(self, user_id: int) -> None:
+        """
+        Drop the user's cached snapshot on every worker (after a committed
+        change). Done here right away too: the bus echo comes later.
+        """
+        self.users.invalidate(user_id)
+        await self.bus.publish({"op": "invalidate_user", "user_id": user_id})
 
     async def disconnect_user(self, user_id: int) -> None:
         """
-        Close & remove all sockets for this user (for delete endpoint later).
+        Close & remove all sockets for this user on every worker (delete endpoint).
         """
-        sockets = list(self.active_connections.get(user_id, []))
-        for ws in sockets:
-            try:
-                await ws.close()
-            except Exception:
-                pass
-        self.active_connections.pop(user_id, None)
+        await self.bus.publish({"op": "disconnect_user", "user_id": user_id})
 
 
 # Global manager instance
-manager = ConnectionManager()
+manager = ConnectionManager(
+    queue_size=WS_SEND_QUEUE_SIZE,
+    slow_consumer_policy=WS_SLOW_CONSUMER_POLICY,
+    send_timeout=WS_SEND_TIMEOUT_SECONDS,
+    bus=create_bus(WS_BUS_BACKEND, WS_BUS_SOCKET_PATH),
+    ping_interval=WS_PING_INTERVAL_SECONDS,
+    idle_timeout=WS_IDLE_TIMEOUT_SECONDS,
+    timer_tick=WS_TIMER_TICK_SECONDS,
+    max_handshakes=WS_MAX_HANDSHAKES,
+    max_per_user=WS_MAX_CONNECTIONS_PER_USER,
+    retry_after=WS_RETRY_AFTER_SECONDS,
+    events=event_log,
+)
+
+Gauge(
+    "ws_connections_active",
+    "Open WebSocket connections on this worker.",
+    fn=manager.connection_count,
+)
+Counter(
+    "ws_reaped_total",
+    "WebSocket connections closed by the heartbeat after the idle timeout.",
+    fn=lambda: manager.reaped,
+)
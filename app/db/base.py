@@ -1,20 +1,231 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+"""
+Database engines and sessions.
 
-from app.core.config import DATABASE_URL
+DB_MODE selects how request handlers talk to the database:
+- "async": AsyncSession on an async driver (aiosqlite for SQLite);
+- "sync": plain Session, with every call pushed to a worker thread.
 
-Base = declarative_base()
+Either way `get_db` yields the session and services go through `run_db`,
+so no DB call ever blocks the event loop. The sync engine is always
+there for schema creation and scripts.
+
+Writes and read-only lookups use separate pools: `get_db` for request
+handlers that change data, `get_read_db` for lookups (auth, WebSocket
+handshake, login). Read connections are opened with query_only, so a
+write through them fails instead of silently bypassing the write pool.
+
+DB_PROFILE picks logging and SQLite pragmas (see DB_PROFILES); pragmas
+are applied on every new connection. With METRICS_ENABLED every statement
+is timed into db_query_duration_seconds{pool="write"|"read"}, and
+statements of requests captured by the profiler are listed in the capture.
+"""
+
+import os
+import time
+from typing import Any, Callable, Dict, TypeVar, Union
+
+from anyio import to_thread
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
 
-engine = create_engine(
+from app.core.config import (
     DATABASE_URL,
-    echo=True,
-    connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {},
+    DATABASE_READ_URL,
+    ASYNC_DATABASE_URL,
+    DB_MODE,
+    DB_PROFILE,
+    DB_WORKERS,
+    DB_POOL_SIZE,
+    DB_READ_POOL_SIZE,
+    DB_POOL_TIMEOUT,
+    METRICS_ENABLED,
+)
+from app.core.metrics import FAST_BUCKETS, Histogram
+from app.core.profiler import profiler
+
+try:
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+except ImportError:  # SQLAlchemy built without asyncio support
+    AsyncSession = None
+
+DB_MODES = ("async", "sync")
+if DB_MODE not in DB_MODES:
+    raise ValueError(f"Unknown DB_MODE: {DB_MODE!r}")
+
+# echo: log every SQL statement; pragmas: SQLite only, applied per connection
+DB_PROFILES: Dict[str, Dict[str, Any]] = {
+    "dev": {
+        "echo": True,
+        "pragmas": {},
+    },
+    "test": {
+        "echo": False,
+        # throwaway databases: skip fsync
+        "pragmas": {"synchronous": "OFF"},
+    },
+    "prod": {
+        "echo": False,
+        "pragmas": {
+            # readers don't block the writer and vice versa
+            "journal_mode": "WAL",
+            # WAL stays consistent without fsync on every commit
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,  # ms to wait for another writer
+            "cache_size": -64000,  # KiB (negative) -> 64 MB page cache
+            "mmap_size": 256 * 1024 * 1024,
+            "temp_store": "MEMORY",
+        },
+    },
+}
+
+if DB_PROFILE not in DB_PROFILES:
+    raise ValueError(f"Unknown DB_PROFILE: {DB_PROFILE!r}")
+profile = DB_PROFILES[DB_PROFILE]
+
+
+def pool_sizes(workers: int = DB_WORKERS) -> Dict[str, int]:
+    """
+    Per-process pool sizes: readers scale with the cores shared by all
+    worker processes; SQLite runs one writer at a time, so a few write
+    connections are enough (they cover requests holding a session while
+    hashing or storing an upload).
+    """
+    cores = os.cpu_count() or 1
+    read = DB_READ_POOL_SIZE or max(2, cores * 4 // max(workers, 1))
+    write = DB_POOL_SIZE or max(2, min(4, read))
+    return {"write": write, "read": read}
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _engine_options(url: str, size: int) -> Dict[str, Any]:
+    options: Dict[str, Any] = {"echo": profile["echo"]}
+    if _is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False}
+        database = make_url(url).database
+        if database in (None, "", ":memory:") or "mode=memory" in url:
+            # single shared connection pool; sizes don't apply
+            return options
+    options.update(pool_size=size, max_overflow=size, pool_timeout=DB_POOL_TIMEOUT)
+    return options
+
+
+def _apply_pragmas(sync_engine, read_only: bool = False) -> None:
+    if not _is_sqlite(str(sync_engine.url)):
+        return
+    pragmas = dict(profile["pragmas"])
+    if read_only:
+        pragmas["query_only"] = "ON"
+    if not pragmas:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+db_query_duration = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement execution time by connection pool.",
+    ("pool",),
+    buckets=FAST_BUCKETS,
 )
 
+
+def _time_queries(sync_engine, pool: str) -> None:
+    """Time every statement, for the metrics and the request profiler's SQL list."""
+    timed, captured = METRICS_ENABLED, profiler.enabled
+    if not (timed or captured):
+        return
+    histogram = db_query_duration.labels(pool)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        # the execution context lives for this one statement
+        context._query_started = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        if timed:
+            histogram.observe(elapsed)
+        if captured:
+            profiler.record_sql(statement, elapsed)
+
+
+def async_database_url(url: str) -> str:
+    """Async driver URL for a sync one (sqlite:///x.db -> sqlite+aiosqlite:///x.db)."""
+    scheme, sep, rest = url.partition("://")
+    if scheme == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    # other databases: set ASYNC_DATABASE_URL with an async driver
+    return url
+
+
+Base = declarative_base()
+
+_sizes = pool_sizes()
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL, _sizes["write"]))
+_apply_pragmas(engine)
+_time_queries(engine, "write")
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+read_engine = None
+ReadSessionLocal = None
+async_engine = None
+AsyncSessionLocal = None
+async_read_engine = None
+AsyncReadSessionLocal = None
+
+if DB_MODE == "sync":
+    read_engine = create_engine(
+        DATABASE_READ_URL, **_engine_options(DATABASE_READ_URL, _sizes["read"])
+    )
+    _apply_pragmas(read_engine, read_only=True)
+    _time_queries(read_engine, "read")
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+if DB_MODE == "async":
+    if AsyncSession is None:
+        raise RuntimeError("DB_MODE=async needs SQLAlchemy asyncio support (pip install greenlet)")
+    _async_url = ASYNC_DATABASE_URL or async_database_url(DATABASE_URL)
+    _async_read_url = (
+        _async_url if DATABASE_READ_URL == DATABASE_URL else async_database_url(DATABASE_READ_URL)
+    )
 
-def get_db():
+    async_engine = create_async_engine(_async_url, **_engine_options(_async_url, _sizes["write"]))
+    _apply_pragmas(async_engine.sync_engine)
+    _time_queries(async_engine.sync_engine, "write")
+    async_read_engine = create_async_engine(
+        _async_read_url, **_engine_options(_async_read_url, _sizes["read"])
+    )
+    _apply_pragmas(async_read_engine.sync_engine, read_only=True)
+    _time_queries(async_read_engine.sync_engine, "read")
+
+    # objects stay readable after commit without an implicit (sync) reload
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+    AsyncReadSessionLocal = async_sessionmaker(
+        async_read_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+DbSession = Union[Session, "AsyncSession"]
+T = TypeVar("T")
+
+
+def _get_sync_db():
     """
     FastAPI dependency that yields a DB session and closes it after the request.
     """
@@ -23,3 +234,68 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+def _get_sync_read_db():
+    """
+    FastAPI dependency that yields a read-only DB session.
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def _get_async_db():
+    """
+    FastAPI dependency that yields an async DB session and closes it after the request.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def _get_async_read_db():
+    """
+    FastAPI dependency that yields a read-only async DB session.
+    """
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+
+if DB_MODE == "async":
+    get_db, get_read_db = _get_async_db, _get_async_read_db
+else:
+    get_db, get_read_db = _get_sync_db, _get_sync_read_db
+
+
+async def run_db(db: DbSession, fn: Callable[..., T], *args: Any) -> T:
+    """
+    Run `fn(session, *args)` -- ordinary ORM code -- without blocking the loop.
+
+    AsyncSession: through run_sync, I/O is awaited on the async driver.
+    Session: in a worker thread.
+    """
+    if AsyncSession is not None and isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args)
+    return await to_thread.run_sync(fn, db, *args)
+
+
+async def release_db(db: DbSession) -> None:
+    """
+    Return the session's connection to the pool (the session stays usable).
+    For sessions that outlive the DB work, e.g. a WebSocket handshake.
+    """
+    if AsyncSession is not None and isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await to_thread.run_sync(db.close)
+
+
+async def dispose_engines() -> None:
+    """Close pooled connections (called on app shutdown)."""
+    for async_eng in (async_engine, async_read_engine):
+        if async_eng is not None:
+            await async_eng.dispose()
+    if read_engine is not None:
+        await to_thread.run_sync(read_engine.dispose)
@@ -0,0 +1,48 @@
+"""
+Schema bootstrap: create missing tables and the directories the app writes to.
+
+    python -m app.db.bootstrap
+
+Importing or building the app never touches the database; run this once
+per deploy before the servers start (the Docker image does), or let the
+lifespan call it with DB_BOOTSTRAP_ON_STARTUP=1 (the dev default).
+Existing tables are left as they are; there are no migrations yet.
+"""
+
+import os
+import sys
+from typing import Optional
+
+from sqlalchemy.engine import Engine, make_url
+
+from app.core.config import AVATAR_DIR
+from app.db.base import Base, engine
+from app.db import models  # noqa: F401  (registers tables)
+
+
+def sqlite_directory(url) -> Optional[str]:
+    """Directory holding a file-based SQLite database, else None."""
+    url = make_url(url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return os.path.dirname(url.database) or None
+
+
+def bootstrap(bind: Engine = engine, avatar_dir: str = AVATAR_DIR) -> None:
+    directory = sqlite_directory(bind.url)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    os.makedirs(avatar_dir, exist_ok=True)
+    Base.metadata.create_all(bind=bind)
+
+
+def main() -> int:
+    # SQL echo (dev profile) is noise here
+    engine.echo = False
+    bootstrap()
+    print(f"schema ready: {engine.url.render_as_string(hide_password=True)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -10,3 +10,12 @@ class User(Base):
     identifier = Column(String(255), unique=True, index=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
     avatar_url = Column(String(512), nullable=True)
+
+
+class AvatarBlob(Base):
+    """Stored avatar file shared by every user that uploaded the same bytes."""
+    __tablename__ = "avatar_blobs"
+
+    # Path relative to the avatar directory, e.g. "3f/3fa9...e1.png"
+    key = Column(String(255), primary_key=True)
+    refcount = Column(Integer, nullable=False, default=0)
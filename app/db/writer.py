@@ -0,0 +1,181 @@
+"""
+Group commit for user mutations.
+
+SQLite has one writer at a time and every commit is a sync to disk, so a
+burst of signups or avatar changes serializes on commits. With
+DB_WRITE_BATCH_SIZE > 0, mutations are queued to a single writer task
+that runs them in small batches -- up to DB_WRITE_BATCH_SIZE writes, or
+whatever arrived within DB_WRITE_BATCH_DELAY_MS of the first one -- and
+commits each batch once. Every caller still awaits its own result.
+
+A mutation is plain ORM code, `fn(session, *args)`, that doesn't commit.
+If one fails (e.g. duplicate identifier) the batch is rolled back and
+re-run without it, so only that caller gets the exception.
+"""
+
+import asyncio
+from functools import partial
+from typing import Any, Callable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.core.config import DB_WRITE_BATCH_SIZE, DB_WRITE_BATCH_DELAY_MS
+from app.db.base import (
+    AsyncSessionLocal,
+    Base,
+    DbSession,
+    SessionLocal,
+    release_db,
+    run_db,
+)
+
+
+class _Write:
+    __slots__ = ("fn", "args", "future", "result", "error")
+
+    def __init__(self, fn: Callable[..., Any], args: tuple, future: asyncio.Future) -> None:
+        self.fn = fn
+        self.args = args
+        self.future = future
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class GroupCommitWriter:
+    """Single writer task committing queued mutations in batches."""
+
+    def __init__(self, session_factory, batch_size: int = 32, max_delay: float = 0.002) -> None:
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.batches = 0
+        self.writes = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.batch_size > 0
+
+    async def submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Queue `fn(session, *args)`; returns its result once committed."""
+        if self._task is None:
+            # started on first use, in the loop that serves requests
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Write(fn, args, future))
+        return await future
+
+    async def stop(self) -> None:
+        """Commit what is queued and stop the writer task (called on app shutdown)."""
+        if self._task is None:
+            return
+        self._queue.put_nowait(None)
+        await self._task
+        self._task = None
+        self._queue = None
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._commit(batch)
+
+    async def _commit(self, batch: List[_Write]) -> None:
+        db = self.session_factory()
+        try:
+            await run_db(db, _run_batch, batch)
+        except Exception as exc:
+            # session unusable (e.g. no connection) -> the whole batch fails
+            for write in batch:
+                write.error = write.error or exc
+        finally:
+            await release_db(db)
+
+        self.batches += 1
+        self.writes += len(batch)
+        for write in batch:
+            if write.future.done():
+                # caller went away (cancelled)
+                continue
+            if write.error is not None:
+                write.future.set_exception(write.error)
+            else:
+                write.future.set_result(write.result)
+
+
+def _run_batch(db: Session, batch: List[_Write]) -> None:
+    """Run all writes in one transaction; drop and retry without a failing one."""
+    pending = list(batch)
+    while pending:
+        current = None
+        try:
+            for write in pending:
+                current = write
+                write.result = write.fn(db, *write.args)
+                # later writes in the batch see this one
+                db.flush()
+            current = None
+            db.commit()
+            return
+        except Exception as exc:
+            db.rollback()
+            if current is None:
+                # commit itself failed
+                for write in pending:
+                    write.error = exc
+                return
+            current.error = exc
+            pending.remove(current)
+
+
+def _commit_one(db: Session, fn: Callable[..., Any], *args: Any) -> Any:
+    try:
+        result = fn(db, *args)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    if isinstance(result, Base) and db.expire_on_commit:
+        # committed objects expire; reload here rather than lazily on the loop
+        db.refresh(result)
+    return result
+
+
+async def write(db: DbSession, fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run mutation `fn(session, *args)` and commit it: through the group-commit
+    writer when enabled, else in the request's own session.
+    """
+    if writer.enabled:
+        return await writer.submit(fn, *args)
+    return await run_db(db, _commit_one, fn, *args)
+
+
+# Global writer (sessions keep loaded attributes after commit)
+writer = GroupCommitWriter(
+    session_factory=AsyncSessionLocal or partial(SessionLocal, expire_on_commit=False),
+    batch_size=DB_WRITE_BATCH_SIZE,
+    max_delay=DB_WRITE_BATCH_DELAY_MS / 1000,
+)
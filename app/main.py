@@ -1,44 +1,120 @@
-import os
+"""
+Application factory.
+
+    uvicorn app.main:create_app --factory
+
+Importing this module is cheap: routers, the DB layer and background
+services are imported by create_app(), and nothing touches the database
+or the filesystem before the lifespan starts. Tables are created by
+`python -m app.db.bootstrap`, or at startup when settings.bootstrap_schema
+is set (DB_BOOTSTRAP_ON_STARTUP, on by default with the dev profile).
+
+`app.main:app` still works: a default app is built on first access.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Optional
 
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.v1.health import router as health_router
-from app.api.v1.auth import router as auth_router
+from app.core.config import AVATAR_DIR, AVATAR_MAX_BYTES, Settings
+
+
+def create_app(settings: Optional[Settings] = None) -> FastAPI:
+    settings = settings or Settings()
+
+    from anyio import to_thread
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.staticfiles import StaticFiles
+
+    from app.api.v1.health import router as health_router
+    from app.api.v1.auth import router as auth_router
+    from app.api.v1.admin import router as admin_router
+    from app.api.v1.users import router as users_router
+    from app.api.v1.ws import router as ws_router
+    from app.api.v1.metrics import router as metrics_router
+    from app.core.body_limit import MULTIPART_OVERHEAD, BodyLimitMiddleware
+    from app.core.error_handlers import register_exception_handlers
+    from app.core.jsend import JSendResponse
+    from app.core.metrics import MetricsMiddleware
+    from app.core.profiler import ProfilerMiddleware, profiler
+    from app.core.hashing import hasher
+    from app.core.rate_limit import auth_limiter
+    from app.core.ws_manager import manager
+    from app.core.static_files import AvatarFileServer
+    from app.db.base import dispose_engines, engine
+    from app.db.writer import writer
+    from app.services.avatars import shutdown_derivative_workers
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if settings.bootstrap_schema:
+            from app.db.bootstrap import bootstrap
 
-from app.db.base import Base, engine
-from app.db import models
-from fastapi.staticfiles import StaticFiles
-from app.api.v1.ws import router as ws_router
-from app.core.error_handlers import register_exception_handlers
+            await to_thread.run_sync(bootstrap, engine, AVATAR_DIR)
+        # Join the cross-worker WebSocket event bus
+        await manager.start()
+        yield
+        await manager.stop()
+        # Stop password hashing worker processes
+        hasher.shutdown()
+        # Close the shared rate-limit store, if any
+        auth_limiter.close()
+        # Stop avatar derivative workers
+        shutdown_derivative_workers()
+        # Commit queued writes, then close pooled DB connections
+        await writer.stop()
+        await dispose_engines()
 
-# Ensure data directory exists for SQLite database
-os.makedirs("data", exist_ok=True)
+    app = FastAPI(
+        title="Chili Backend",
+        version="0.1.0",
+        lifespan=lifespan,
+        default_response_class=JSendResponse,
+    )
 
-# Create tables at startup
-Base.metadata.create_all(bind=engine)
+    register_exception_handlers(app)
 
-app = FastAPI(
-    title="Chili Backend",
-    version="0.1.0",
-)
+    # innermost: the 413 for an oversized upload still gets CORS headers
+    app.add_middleware(
+        BodyLimitMiddleware,
+        limits={"/auth/avatar": AVATAR_MAX_BYTES + MULTIPART_OVERHEAD},
+    )
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=list(settings.cors_origins),
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    if profiler.enabled:
+        # off by default; not even installed then
+        app.add_middleware(ProfilerMiddleware, profiler=profiler)
+    if settings.metrics_enabled:
+        # added last = outermost user middleware: CORS and handlers are timed too
+        app.add_middleware(MetricsMiddleware)
 
-register_exception_handlers(app)
+    app.include_router(health_router)
+    app.include_router(auth_router)
+    app.include_router(admin_router)
+    app.include_router(users_router)
+    app.include_router(ws_router)
+    if settings.metrics_enabled:
+        app.include_router(metrics_router)
+    # Avatars first: the more specific mount has to win over /static
+    app.mount("/static/avatars", AvatarFileServer(directory=AVATAR_DIR), name="avatars")
+    app.mount("/static", StaticFiles(directory=settings.static_dir), name="static")
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    @app.get("/")
+    def root():
+        return {"status": "success", "data": {"message": "Welcome"}}
 
-app.include_router(health_router)
-app.include_router(auth_router)
-app.include_router(ws_router)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+    return app
 
 
-@app.get("/")
-def root():
-    return {"status": "success", "data": {"message": "Welcome"}}
+def __getattr__(name: str):
+    # `app` for `uvicorn app.main:app` and existing imports, built once on demand
+    if name == "app":
+        globals()["app"] = app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
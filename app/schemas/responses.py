@@ -4,16 +4,15 @@ JSend-compliant response models for API documentation.
 """
 
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
+
+from app.schemas.user import UserBase
 
 
 # ---- Nested data models ----
 
-class UserData(BaseModel):
-    """User information returned in responses."""
-    id: int
-    identifier: str
-    avatar_url: Optional[str] = None
+class UserData(UserBase):
+    """User information returned in responses (built from a User row)."""
 
 
 class TokenData(BaseModel):
@@ -31,6 +30,7 @@ class AuthData(BaseModel):
 class AvatarData(BaseModel):
     """Avatar upload response data."""
     avatar_url: str
+    avatars: Dict[str, str] = {}
 
 
 class MessageData(BaseModel):
@@ -38,6 +38,74 @@ class MessageData(BaseModel):
     message: str
 
 
+class CacheStatsData(BaseModel):
+    """Hit/miss counters of an in-process cache."""
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class CachesData(BaseModel):
+    """Stats of all in-process caches."""
+    user_cache: CacheStatsData
+    token_cache: CacheStatsData
+
+
+class UserListData(BaseModel):
+    """One page of users; pass next_cursor back to get the next one."""
+    users: List[UserData]
+    next_cursor: Optional[str] = None
+
+
+class UserBatchData(BaseModel):
+    """Users looked up by id, in the order asked for; ids with no user in `missing`."""
+    users: List[UserData]
+    missing: List[int] = []
+
+
+class ProfileSummary(BaseModel):
+    """One captured request (see app.core.profiler)."""
+    id: int
+    method: str
+    path: str
+    route: Optional[str] = None
+    status: int
+    reason: str
+    started_at: float
+    duration_ms: float
+    ticks: int
+    sql_count: int
+    sql_ms: float
+
+
+class ProfileListData(BaseModel):
+    """Captured requests, newest first."""
+    enabled: bool
+    profiles: List[ProfileSummary]
+
+
+class StackSample(BaseModel):
+    """A folded stack and how many samples saw it."""
+    stack: str
+    count: int
+
+
+class SqlStatement(BaseModel):
+    """A statement issued by a captured request."""
+    statement: str
+    duration_ms: float
+
+
+class ProfileData(ProfileSummary):
+    """A capture with its stack samples and SQL statements."""
+    interval_ms: float
+    stacks: List[StackSample]
+    sql: List[SqlStatement]
+    sql_dropped: int
+
+
 # ---- JSend response wrappers ----
 
 class AuthResponse(BaseModel):
@@ -58,3 +126,31 @@ class MessageResponse(BaseModel):
     data: MessageData
 
 
+class CachesResponse(BaseModel):
+    """JSend success response with cache stats."""
+    status: str = "success"
+    data: CachesData
+
+
+class UserListResponse(BaseModel):
+    """JSend success response with a page of users."""
+    status: str = "success"
+    data: UserListData
+
+
+class UserBatchResponse(BaseModel):
+    """JSend success response with users looked up by id."""
+    status: str = "success"
+    data: UserBatchData
+
+
+class ProfileListResponse(BaseModel):
+    """JSend success response with captured request profiles."""
+    status: str = "success"
+    data: ProfileListData
+
+
+class ProfileResponse(BaseModel):
+    """JSend success response with one request profile."""
+    status: str = "success"
+    data: ProfileData
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, computed_field
+from typing import Dict, Optional
+
+from app.services.avatars import derivative_urls
 
 
 class UserBase(BaseModel):
@@ -8,3 +10,9 @@ class UserBase(BaseModel):
     avatar_url: Optional[str] = None
 
     model_config = ConfigDict(from_attributes=True)
+
+    @computed_field
+    @property
+    def avatars(self) -> Dict[str, str]:
+        """Resized avatar URLs keyed by size (px)."""
+        return derivative_urls(self.avatar_url)
@@ -0,0 +1,426 @@
+"""
+Avatar storage.
+
+Avatars are content-addressed: a file is named after the hash of its bytes
+and sharded by the first two hex chars, e.g.
+/static/avatars/3f/3fa9c0...e1.png. Identical uploads share one file,
+and a URL never changes content, so it can be cached forever.
+Users reference files through AvatarBlob rows (refcount); a file is
+removed only when its last reference is dropped.
+
+Uploads are copied in fixed-size chunks to a temp file next to the final
+location, then hard-linked into place. The whole copy runs in
+a worker thread, so the event loop never waits on disk I/O, and memory use
+per upload is one chunk regardless of file size (Starlette already spools
+the multipart part to a temp file once it grows past 1 MB).
+
+Dedup vs. deletion: an identical upload can arrive while the previous
+owner's last reference is being released. So the upload keeps its temp
+file (a second link) until its reference is committed, and the file is
+put back from it if a delete removed it meanwhile (finish_avatar). The
+delete side moves the files aside, checks the reference again, and only
+then unlinks them (or puts them back): an upload committed before that
+check keeps its file, one committed after it finds the file gone and
+restores it. All of it runs in worker threads, never on the event loop.
+
+After upload, square derivatives (AVATAR_SIZES, e.g. 48/96/256 px) are
+rendered once in AVATAR_DERIVATIVE_FORMAT on a background worker pool,
+next to the original: 3f/3fa9c0...e1_48.webp.
+Pillow is optional: without it no derivatives are advertised or generated.
+"""
+
+import asyncio
+import hashlib
+import importlib.util
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from collections import Counter
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from anyio import to_thread
+from fastapi import UploadFile
+from sqlalchemy.orm import Session
+
+from app.core.config import (
+    AVATAR_DIR,
+    AVATAR_MAX_BYTES,
+    AVATAR_CHUNK_SIZE,
+    AVATAR_SIZES,
+    AVATAR_DERIVATIVE_FORMAT,
+    AVATAR_DERIVATIVE_WORKERS,
+)
+from app.core.metrics import Histogram
+from app.core.static_files import avatar_index
+from app.db.base import DbSession
+from app.db.writer import write
+from app.db.models import AvatarBlob, User
+
+# Pillow not installed -> originals only. It is imported by the first
+# render, not at startup.
+PILLOW_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+AVATAR_URL_PREFIX = "/static/avatars/"
+
+avatar_write_duration = Histogram(
+    "avatar_write_duration_seconds",
+    "Time to copy an uploaded avatar to its final file (worker thread).",
+)
+
+# Magic bytes -> file extension
+IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"\xff\xd8\xff", ".jpg"),
+)
+
+
+class InvalidImageError(Exception):
+    pass
+
+
+class AvatarTooLargeError(Exception):
+    pass
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Return file extension for PNG/JPEG data, else None."""
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+def avatar_key(avatar_url: str) -> str:
+    """Path of an avatar relative to AVATAR_DIR ("3f/3fa9...e1.png")."""
+    if avatar_url.startswith(AVATAR_URL_PREFIX):
+        return avatar_url[len(AVATAR_URL_PREFIX):]
+    # unexpected URL -> flat file name only
+    return os.path.basename(avatar_url)
+
+
+def _avatar_path(key: str) -> str:
+    return os.path.join(AVATAR_DIR, *key.split("/"))
+
+
+class StagedAvatar:
+    """A stored upload, plus a spare link to it kept until its reference is committed."""
+
+    __slots__ = ("key", "spare_path")
+
+    def __init__(self, key: str, spare_path: str) -> None:
+        self.key = key
+        self.spare_path = spare_path
+
+    @property
+    def url(self) -> str:
+        return AVATAR_URL_PREFIX + self.key
+
+
+def _write_avatar(src: BinaryIO) -> StagedAvatar:
+    """Copy upload stream into AVATAR_DIR (blocking)."""
+    head = src.read(AVATAR_CHUNK_SIZE)
+    ext = sniff_image_type(head)
+    if ext is None:
+        raise InvalidImageError("Only PNG and JPEG images are allowed")
+
+    os.makedirs(AVATAR_DIR, exist_ok=True)
+    # temp file in the same filesystem -> os.replace is an atomic rename
+    fd, tmp_path = tempfile.mkstemp(dir=AVATAR_DIR, prefix=".upload-", suffix=".part")
+    try:
+        digest = hashlib.blake2b(digest_size=16)
+        with os.fdopen(fd, "wb") as out:
+            size = 0
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > AVATAR_MAX_BYTES:
+                    raise AvatarTooLargeError(
+                        f"Avatar must be at most {AVATAR_MAX_BYTES} bytes"
+                    )
+                digest.update(chunk)
+                out.write(chunk)
+                chunk = src.read(AVATAR_CHUNK_SIZE)
+
+        name = digest.hexdigest()
+        key = f"{name[:2]}/{name}{ext}"
+        path = _avatar_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.chmod(tmp_path, 0o644)
+        try:
+            os.link(tmp_path, path)
+        except FileExistsError:
+            # same bytes already stored -> dedupe
+            pass
+    except BaseException:
+        _remove_file(tmp_path)
+        raise
+
+    return StagedAvatar(key, tmp_path)
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _finish_avatar(staged: StagedAvatar) -> None:
+    """Drop the spare link, or put it in place if the file was deleted meanwhile."""
+    if os.path.exists(_avatar_path(staged.key)):
+        _remove_file(staged.spare_path)
+    else:
+        os.replace(staged.spare_path, _avatar_path(staged.key))
+
+
+def derivatives_enabled() -> bool:
+    return PILLOW_AVAILABLE and bool(AVATAR_SIZES)
+
+
+def derivative_key(key: str, size: int) -> str:
+    stem, _ = os.path.splitext(key)
+    return f"{stem}_{size}.{AVATAR_DERIVATIVE_FORMAT}"
+
+
+def derivative_urls(avatar_url: Optional[str]) -> Dict[str, str]:
+    """Map of size -> derivative URL for an avatar (empty if none)."""
+    if not avatar_url or not derivatives_enabled():
+        return {}
+    stem, _ = os.path.splitext(avatar_url)
+    return {
+        str(size): f"{stem}_{size}.{AVATAR_DERIVATIVE_FORMAT}"
+        for size in AVATAR_SIZES
+    }
+
+
+def _rendered_derivative_urls(avatar_url: Optional[str]) -> Dict[str, str]:
+    return {
+        size: url
+        for size, url in derivative_urls(avatar_url).items()
+        if os.path.exists(_avatar_path(avatar_key(url)))
+    }
+
+
+async def rendered_derivative_urls(avatar_url: Optional[str]) -> Dict[str, str]:
+    """derivative_urls, limited to the files that exist by now (stat'ed off the event loop)."""
+    return await to_thread.run_sync(_rendered_derivative_urls, avatar_url)
+
+
+def _write_derivatives(key: str) -> None:
+    """Render all derivative sizes of an original avatar (blocking)."""
+    from PIL import Image, ImageOps
+
+    targets = {size: _avatar_path(derivative_key(key, size)) for size in AVATAR_SIZES}
+    if all(os.path.exists(path) for path in targets.values()):
+        # deduped upload -> rendered already
+        return
+
+    largest = max(AVATAR_SIZES)
+    with Image.open(_avatar_path(key)) as original:
+        # JPEG: decode at reduced scale when the original is much bigger
+        original.draft("RGB", (largest * 2, largest * 2))
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    # biggest first; each smaller size is downscaled from the previous one
+    for size in sorted(AVATAR_SIZES, reverse=True):
+        image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        fd, tmp_path = tempfile.mkstemp(dir=AVATAR_DIR, prefix=".derivative-", suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as out:
+                image.save(out, format=AVATAR_DERIVATIVE_FORMAT)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, targets[size])
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+_derivative_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _get_derivative_executor() -> ThreadPoolExecutor:
+    global _derivative_executor
+    if _derivative_executor is None:
+        _derivative_executor = ThreadPoolExecutor(
+            max_workers=AVATAR_DERIVATIVE_WORKERS,
+            thread_name_prefix="avatar-derivatives",
+        )
+    return _derivative_executor
+
+
+async def generate_derivatives(avatar_url: str) -> Dict[str, str]:
+    """
+    Render derivatives on the background pool and return their URLs.
+    Returns an empty map if disabled or the image can't be decoded,
+    so clients fall back to the original.
+    """
+    if not derivatives_enabled():
+        return {}
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(
+            _get_derivative_executor(), _write_derivatives, avatar_key(avatar_url)
+        )
+    except Exception:
+        return {}
+    return derivative_urls(avatar_url)
+
+
+def shutdown_derivative_workers() -> None:
+    """Wait for running derivative jobs and stop the pool (called on app shutdown)."""
+    global _derivative_executor
+    executor, _derivative_executor = _derivative_executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+# ---- reference counting (same transaction as the user change) ----
+
+def _incref(db: Session, key: str) -> None:
+    updated = (
+        db.query(AvatarBlob)
+        .filter(AvatarBlob.key == key)
+        .update({AvatarBlob.refcount: AvatarBlob.refcount + 1})
+    )
+    if not updated:
+        db.add(AvatarBlob(key=key, refcount=1))
+        db.flush()
+
+
+def add_references(db: Session, avatar_urls: Iterable[Optional[str]]) -> None:
+    """Count one more reference per URL (bulk import; caller commits)."""
+    counts = Counter(avatar_key(url) for url in avatar_urls if url)
+    for key, count in counts.items():
+        updated = (
+            db.query(AvatarBlob)
+            .filter(AvatarBlob.key == key)
+            .update({AvatarBlob.refcount: AvatarBlob.refcount + count})
+        )
+        if not updated:
+            db.add(AvatarBlob(key=key, refcount=count))
+    db.flush()
+
+
+def release_avatar(db: Session, avatar_url: Optional[str]) -> Optional[str]:
+    """
+    Drop one reference to an avatar (caller commits).
+    Returns the URL if that was the last reference, so its files can go.
+    """
+    if not avatar_url:
+        return None
+    key = avatar_key(avatar_url)
+    blob = db.get(AvatarBlob, key)
+    if blob is None:
+        # per-user file from before content addressing -> no one else uses it
+        return avatar_url
+    blob.refcount -= 1
+    if blob.refcount > 0:
+        return None
+    db.delete(blob)
+    db.flush()
+    return avatar_url
+
+
+def set_user_avatar(db: Session, user_id: int, avatar_url: str) -> Optional[str]:
+    """
+    Point user at a stored avatar and move the reference (caller commits).
+    Returns the previous URL if it lost its last reference.
+    """
+    old_url = db.query(User.avatar_url).filter(User.id == user_id).scalar()
+    if old_url == avatar_url:
+        return None
+    _incref(db, avatar_key(avatar_url))
+    db.query(User).filter(User.id == user_id).update({User.avatar_url: avatar_url})
+    return release_avatar(db, old_url)
+
+
+def _is_referenced(db: Session, key: str) -> bool:
+    # a column query: always asks the database, never the identity map
+    return db.query(AvatarBlob.key).filter(AvatarBlob.key == key).first() is not None
+
+
+async def assign_avatar(db: DbSession, user_id: int, avatar_url: str) -> Optional[str]:
+    """
+    set_user_avatar + commit (rolled back on failure; group-committed
+    when enabled). Returns the previous URL if it lost its last reference.
+    """
+    return await write(db, set_user_avatar, user_id, avatar_url)
+
+
+# ---- files ----
+
+def _set_aside_avatar_files(key: str) -> List[Tuple[str, str]]:
+    """Rename an avatar's files to hidden names; (path, hidden path) of those moved."""
+    moved = []
+    for name in [key] + [derivative_key(key, size) for size in AVATAR_SIZES]:
+        avatar_index.discard(name)
+        path = _avatar_path(name)
+        # dot-prefixed: never served (SAFE_KEY)
+        aside = os.path.join(
+            os.path.dirname(path), f".deleting-{os.urandom(6).hex()}-{os.path.basename(path)}"
+        )
+        try:
+            os.rename(path, aside)
+        except OSError:
+            # already gone or not removable -> nothing to do
+            continue
+        moved.append((path, aside))
+    return moved
+
+
+def _finish_removal(moved: List[Tuple[str, str]], referenced: bool) -> None:
+    """Unlink files set aside, after putting them back if referenced again."""
+    for path, aside in moved:
+        if referenced:
+            try:
+                os.link(aside, path)
+            except FileExistsError:
+                # the new owner put its copy there already
+                pass
+        _remove_file(aside)
+
+
+async def save_avatar(file: UploadFile) -> StagedAvatar:
+    """
+    Store uploaded avatar (its URL is `.url`). Call finish_avatar once the
+    reference to it is committed, or abandon_avatar if that failed.
+    Raises InvalidImageError / AvatarTooLargeError; nothing is left on disk then.
+    """
+    with avatar_write_duration.time():
+        return await to_thread.run_sync(_write_avatar, file.file)
+
+
+async def finish_avatar(staged: StagedAvatar) -> None:
+    """The upload is referenced now: make sure its file is in place."""
+    await to_thread.run_sync(_finish_avatar, staged)
+
+
+async def abandon_avatar(db: DbSession, staged: StagedAvatar) -> None:
+    """The upload was not referenced: remove it unless someone else uses the file."""
+    await to_thread.run_sync(_remove_file, staged.spare_path)
+    await delete_unreferenced_avatar(db, staged.url)
+
+
+async def delete_unreferenced_avatar(db: DbSession, avatar_url: Optional[str]) -> None:
+    """
+    Remove avatar and its derivatives from disk, unless it is referenced
+    again by now (same image uploaded meanwhile). The references are
+    checked before and after the files are moved aside (see module
+    docstring); file work runs in worker threads, off the event loop.
+    """
+    if not avatar_url:
+        return
+    key = avatar_key(avatar_url)
+    # checks go through write(): each ends with a commit, so the second one
+    # reads a fresh snapshot, not the one the first check started
+    if await write(db, _is_referenced, key):
+        return
+    moved = await to_thread.run_sync(_set_aside_avatar_files, key)
+    if not moved:
+        return
+    referenced = await write(db, _is_referenced, key)
+    await to_thread.run_sync(_finish_removal, moved, referenced)
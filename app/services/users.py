@@ -1,37 +1,190 @@
-from typing import Optional
+from typing import Iterable, Iterator, List, Optional, Sequence, Set
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.db.base import DbSession, run_db
+from app.db.writer import write
 from app.db.models import User
-from app.core.security import hash_password, verify_password
+from app.core.security import hash_password_async, verify_password_async
+from app.services.avatars import release_avatar
+
+
+# Largest id a SQLite INTEGER (signed 64-bit) holds; larger ones can't even be bound
+MAX_USER_ID = 2**63 - 1
 
 
 class IdentifierAlreadyUsedError(Exception):
     pass
 
 
-def get_user_by_identifier(db: Session, identifier: str) -> Optional[User]:
+def parse_user_id(text: str) -> int:
+    """User id written as plain digits, within MAX_USER_ID; ValueError otherwise."""
+    # isdigit() alone would let "²" through; int() alone "1_0", " 1" and "+1"
+    if not (text.isascii() and text.isdigit()) or len(text) > 19 or int(text) > MAX_USER_ID:
+        raise ValueError("not a user id")
+    return int(text)
+
+
+# ---- ORM work (plain Session; reads via run_db, mutations via write) ----
+
+def _get_user_by_identifier(db: Session, identifier: str) -> Optional[User]:
     return db.query(User).filter(User.identifier == identifier).first()
 
 
-def create_user(db: Session, identifier: str, password: str) -> User:
-    existing = get_user_by_identifier(db, identifier)
-    if existing:
-        raise IdentifierAlreadyUsedError("Identifier already in use")
+def _get_user_by_id(db: Session, user_id: int) -> Optional[User]:
+    return db.query(User).filter(User.id == user_id).first()
+
 
-    user = User(
-        identifier=identifier,
-        password_hash=hash_password(password),
-    )
+def _insert_user(db: Session, identifier: str, password_hash: str) -> User:
+    # checked again here: another request may have taken it while we hashed
+    if _get_user_by_identifier(db, identifier):
+        raise IdentifierAlreadyUsedError("Identifier already in use")
+    user = User(identifier=identifier, password_hash=password_hash, avatar_url=None)
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    try:
+        db.flush()
+    except IntegrityError:
+        # inserted by another process since the check
+        raise IdentifierAlreadyUsedError("Identifier already in use")
     return user
 
 
-def authenticate_user(db: Session, identifier: str, password: str) -> Optional[User]:
-    user = get_user_by_identifier(db, identifier)
+def _delete_user(db: Session, user_id: int) -> Optional[str]:
+    avatar_url = db.query(User.avatar_url).filter(User.id == user_id).scalar()
+    orphaned_url = release_avatar(db, avatar_url)
+    db.query(User).filter(User.id == user_id).delete()
+    return orphaned_url
+
+
+def prefix_upper_bound(prefix: str) -> Optional[str]:
+    """
+    Smallest string greater than every string starting with `prefix`,
+    so `prefix <= identifier < bound` is an index range scan (LIKE isn't:
+    SQLite's LIKE is case-insensitive and skips the index).
+    None if there is no such bound (prefix of only max code points).
+    """
+    while prefix:
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            return prefix[:-1] + chr(last + 1)
+        prefix = prefix[:-1]
+    return None
+
+
+def _get_users_by_ids(db: Session, ids: Sequence[int]) -> Sequence:
+    query = select(User.id, User.identifier, User.avatar_url).where(User.id.in_(ids))
+    return db.execute(query).all()
+
+
+def _list_users(db: Session, limit: int, after_id: Optional[int] = None) -> Sequence:
+    query = select(User.id, User.identifier, User.avatar_url)
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    return db.execute(query.order_by(User.id).limit(limit)).all()
+
+
+def _search_users(
+    db: Session, prefix: str, limit: int, after: Optional[str] = None
+) -> Sequence:
+    query = select(User.id, User.identifier, User.avatar_url)
+    # one lower bound only: SQLite seeks the index on a single one and
+    # would filter the other row by row
+    if after is not None and after >= prefix:
+        query = query.where(User.identifier > after)
+    else:
+        query = query.where(User.identifier >= prefix)
+    upper = prefix_upper_bound(prefix)
+    if upper is not None:
+        query = query.where(User.identifier < upper)
+    return db.execute(query.order_by(User.identifier).limit(limit)).all()
+
+
+# ---- service API ----
+
+async def get_user_by_identifier(db: DbSession, identifier: str) -> Optional[User]:
+    return await run_db(db, _get_user_by_identifier, identifier)
+
+
+async def get_user_by_id(db: DbSession, user_id: int) -> Optional[User]:
+    return await run_db(db, _get_user_by_id, user_id)
+
+
+async def create_user(db: DbSession, identifier: str, password: str) -> User:
+    existing = await get_user_by_identifier(db, identifier)
+    if existing:
+        raise IdentifierAlreadyUsedError("Identifier already in use")
+
+    password_hash = await hash_password_async(password)
+    return await write(db, _insert_user, identifier, password_hash)
+
+
+async def authenticate_user(db: DbSession, identifier: str, password: str) -> Optional[User]:
+    user = await get_user_by_identifier(db, identifier)
     if not user:
         return None
-    if not verify_password(password, user.password_hash):
+    if not await verify_password_async(password, user.password_hash):
         return None
     return user
+
+
+async def get_users_by_ids(db: DbSession, ids: Sequence[int]) -> Sequence:
+    """(id, identifier, avatar_url) rows of the users that exist among `ids` (one IN query)."""
+    if not ids:
+        return []
+    return await run_db(db, _get_users_by_ids, ids)
+
+
+async def list_users(db: DbSession, limit: int, after_id: Optional[int] = None) -> Sequence:
+    """Page of (id, identifier, avatar_url) rows in id order, after `after_id`."""
+    return await run_db(db, _list_users, limit, after_id)
+
+
+async def search_users(
+    db: DbSession, prefix: str, limit: int, after: Optional[str] = None
+) -> Sequence:
+    """Page of users whose identifier starts with `prefix`, in identifier order."""
+    return await run_db(db, _search_users, prefix, limit, after)
+
+
+async def delete_user(db: DbSession, user_id: int) -> Optional[str]:
+    """
+    Delete a user and drop its avatar reference.
+    Returns the avatar URL if it lost its last reference, so its files can go.
+    """
+    return await write(db, _delete_user, user_id)
+
+
+# ---- bulk (sync; used by app.tools.users) ----
+
+def existing_identifiers(db: Session, identifiers: Iterable[str]) -> Set[str]:
+    """Which of these identifiers are taken already (one IN query)."""
+    identifiers = list(identifiers)
+    if not identifiers:
+        return set()
+    rows = db.execute(select(User.identifier).where(User.identifier.in_(identifiers)))
+    return {identifier for (identifier,) in rows}
+
+
+def insert_users(db: Session, rows: List[dict]) -> None:
+    """
+    Insert many users in one executemany (caller commits).
+    Rows carry identifier, password_hash and avatar_url.
+    """
+    if rows:
+        db.execute(insert(User), rows)
+
+
+def iter_users(db: Session, batch_size: int = 1000) -> Iterator[dict]:
+    """All users by id, fetched in keyset-paginated batches (constant memory)."""
+    columns = (User.id, User.identifier, User.password_hash, User.avatar_url)
+    last_id = 0
+    while True:
+        rows = db.execute(
+            select(*columns).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        for row in rows:
+            yield row._asdict()
+        last_id = rows[-1].id
@@ -0,0 +1,307 @@
+"""
+Bulk user import/export.
+
+    python -m app.tools.users export users.ndjson
+    python -m app.tools.users import users.ndjson [--batch-size 1000] [--workers 4]
+
+Files are NDJSON (one JSON object per line) or CSV, picked by extension
+(.csv, else NDJSON) or --format; "-" is stdin/stdout. Both directions
+stream: memory use is one batch regardless of file size.
+
+Import records need an `identifier` and either a plain `password`
+(validated like /auth/register, hashed in parallel on worker processes)
+or a `password_hash` already in passlib format (as written by export),
+plus an optional `avatar_url` (counted as a reference to that stored
+avatar; the files themselves are not copied; paths outside AVATAR_DIR
+make the record invalid). Each batch is inserted with one
+executemany and committed; identifiers that already exist are skipped.
+Export writes id, identifier, password_hash and avatar_url.
+
+A summary with rows/sec goes to stderr.
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import islice
+from typing import IO, Iterable, Iterator, List, Optional
+
+from pydantic import ValidationError
+
+from app.core.security import hash_password, password_context
+from app.core.static_files import CONTENT_ADDRESSED_KEY, SAFE_KEY
+from app.db.base import SessionLocal, engine
+from app.db.bootstrap import bootstrap
+from app.schemas.auth import RegisterRequest
+from app.services import avatars as avatar_service
+from app.services import users as user_service
+
+EXPORT_FIELDS = ("id", "identifier", "password_hash", "avatar_url")
+
+
+class InvalidRecordError(ValueError):
+    pass
+
+
+# ---- files ----
+
+def detect_format(path: str, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    return "csv" if path.lower().endswith(".csv") else "ndjson"
+
+
+@contextmanager
+def open_stream(path: str, mode: str) -> Iterator[IO[str]]:
+    if path == "-":
+        yield sys.stdin if mode == "r" else sys.stdout
+        return
+    with open(path, mode, newline="", encoding="utf-8") as f:
+        yield f
+
+
+def read_records(stream: IO[str], fmt: str) -> Iterator[dict]:
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            # empty CSV cells mean "not set"
+            yield {key: value for key, value in row.items() if value not in ("", None)}
+        return
+    for line in stream:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # counted as invalid by parse_record
+                yield None
+
+
+def write_records(stream: IO[str], fmt: str, records: Iterable[dict]) -> int:
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+        return count
+    for record in records:
+        stream.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        stream.write("\n")
+        count += 1
+    return count
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+# ---- import ----
+
+def parse_record(record: Optional[dict]) -> dict:
+    """
+    Validate one import record.
+    Returns {identifier, password, password_hash, avatar_url}; exactly one
+    of password / password_hash is set.
+    """
+    if not isinstance(record, dict):
+        raise InvalidRecordError("not a JSON object")
+    identifier = record.get("identifier")
+    password = record.get("password")
+    password_hash = record.get("password_hash")
+    avatar_url = _parse_avatar_url(record.get("avatar_url") or None)
+
+    if password_hash:
+        if not isinstance(identifier, str) or not 3 <= len(identifier) <= 255:
+            raise InvalidRecordError("identifier must be 3-255 characters")
+        if not isinstance(password_hash, str) or not password_context().identify(password_hash, required=False):
+            raise InvalidRecordError("password_hash is not a supported passlib hash")
+        return {
+            "identifier": identifier,
+            "password": None,
+            "password_hash": password_hash,
+            "avatar_url": avatar_url,
+        }
+
+    try:
+        valid = RegisterRequest(identifier=identifier, password=password)
+    except ValidationError as e:
+        raise InvalidRecordError(str(e.errors()[0]["msg"]))
+    return {
+        "identifier": valid.identifier,
+        "password": valid.password,
+        "password_hash": None,
+        "avatar_url": avatar_url,
+    }
+
+
+def _parse_avatar_url(avatar_url) -> Optional[str]:
+    # its files are deleted with the last reference: it must name a file in AVATAR_DIR
+    if avatar_url is None:
+        return None
+    if not isinstance(avatar_url, str):
+        raise InvalidRecordError("avatar_url must be a string")
+    key = avatar_service.avatar_key(avatar_url)
+    if not (CONTENT_ADDRESSED_KEY.match(key) or SAFE_KEY.match(key)):
+        raise InvalidRecordError("avatar_url is not a stored avatar path")
+    return avatar_url
+
+
+class ImportStats:
+    def __init__(self) -> None:
+        self.read = 0
+        self.inserted = 0
+        self.skipped = 0
+        self.invalid = 0
+
+
+def import_users(
+    records: Iterable[dict],
+    batch_size: int = 1000,
+    workers: int = 0,
+    errors: Optional[IO[str]] = None,
+) -> ImportStats:
+    """Insert records batch by batch; plain passwords are hashed on `workers` processes."""
+    stats = ImportStats()
+    workers = workers or os.cpu_count() or 1
+    executor = None
+    if workers > 1:
+        # spawn: same as the app's hashing pool
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+
+    db = SessionLocal()
+    try:
+        for batch in batched(records, batch_size):
+            rows = _parse_batch(batch, stats, errors)
+            # first one wins: already stored, or earlier in this batch
+            taken = user_service.existing_identifiers(db, (row["identifier"] for row in rows))
+            fresh: List[dict] = []
+            for row in rows:
+                if row["identifier"] in taken:
+                    stats.skipped += 1
+                    continue
+                taken.add(row["identifier"])
+                fresh.append(row)
+
+            _hash_passwords(fresh, executor, workers)
+            user_service.insert_users(db, [
+                {key: row[key] for key in ("identifier", "password_hash", "avatar_url")}
+                for row in fresh
+            ])
+            avatar_service.add_references(db, (row["avatar_url"] for row in fresh))
+            db.commit()
+            stats.inserted += len(fresh)
+    finally:
+        db.close()
+        if executor is not None:
+            executor.shutdown()
+    return stats
+
+
+def _parse_batch(batch: list, stats: ImportStats, errors: Optional[IO[str]]) -> List[dict]:
+    rows = []
+    for record in batch:
+        stats.read += 1
+        try:
+            rows.append(parse_record(record))
+        except InvalidRecordError as e:
+            stats.invalid += 1
+            if errors is not None:
+                errors.write(f"record {stats.read}: {e}\n")
+    return rows
+
+
+def _hash_passwords(rows: List[dict], executor, workers: int) -> None:
+    """Fill password_hash for rows with a plain password."""
+    plain = [row for row in rows if row["password"] is not None]
+    if not plain:
+        return
+    passwords = [row["password"] for row in plain]
+    if executor is not None:
+        chunksize = max(1, len(passwords) // (workers * 4))
+        hashes = executor.map(hash_password, passwords, chunksize=chunksize)
+    else:
+        hashes = map(hash_password, passwords)
+    for row, password_hash in zip(plain, hashes):
+        row["password_hash"] = password_hash
+
+
+# ---- CLI ----
+
+def _report(action: str, rows: int, elapsed: float, details: str = "") -> None:
+    rate = rows / elapsed if elapsed > 0 else 0.0
+    suffix = f" ({details})" if details else ""
+    print(
+        f"{action} {rows} rows{suffix} in {elapsed:.2f}s: {rate:.0f} rows/sec",
+        file=sys.stderr,
+    )
+
+
+def cmd_import(args) -> int:
+    fmt = detect_format(args.file, args.format)
+    start = time.perf_counter()
+    with open_stream(args.file, "r") as stream:
+        stats = import_users(
+            read_records(stream, fmt),
+            batch_size=args.batch_size,
+            workers=args.workers,
+            errors=sys.stderr,
+        )
+    details = f"{stats.inserted} inserted, {stats.skipped} skipped, {stats.invalid} invalid"
+    _report("imported", stats.read, time.perf_counter() - start, details)
+    return 1 if stats.invalid else 0
+
+
+def cmd_export(args) -> int:
+    fmt = detect_format(args.file, args.format)
+    start = time.perf_counter()
+    db = SessionLocal()
+    try:
+        with open_stream(args.file, "w") as stream:
+            rows = write_records(stream, fmt, user_service.iter_users(db, args.batch_size))
+    finally:
+        db.close()
+    _report("exported", rows, time.perf_counter() - start)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.tools.users", description="Bulk user import/export."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_import = sub.add_parser("import", help="insert users from NDJSON/CSV")
+    p_import.add_argument("file", help='input file, "-" for stdin')
+    p_import.add_argument("--workers", type=int, default=0, help="hashing processes; 0 = one per core")
+    p_import.set_defaults(handler=cmd_import)
+
+    p_export = sub.add_parser("export", help="write all users as NDJSON/CSV")
+    p_export.add_argument("file", help='output file, "-" for stdout')
+    p_export.set_defaults(handler=cmd_export)
+
+    for p in (p_import, p_export):
+        p.add_argument("--format", choices=("ndjson", "csv"), help="default: from extension")
+        p.add_argument("--batch-size", type=int, default=1000)
+
+    args = parser.parse_args(argv)
+    # SQL echo (dev profile) would end up in the export on stdout
+    engine.echo = False
+    bootstrap(engine)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
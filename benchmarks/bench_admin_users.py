@@ -0,0 +1,120 @@
+# benchmarks/bench_admin_users.py
+"""
+GET /admin/users on a large table: keyset pages vs OFFSET.
+
+Fills a temporary SQLite file with N users (1M by default, inserted with
+executemany in batches) and times, per page of --limit rows, the query
+plus the streamed JSend encoding:
+
+- first page and a page near the end, keyset (WHERE id > cursor)
+- the same deep page with LIMIT/OFFSET, for comparison
+- prefix search: a narrow prefix, and a broad one paged near its end
+- walking every page of the table with cursors
+
+Usage:
+    python -m benchmarks.bench_admin_users --users 1000000 --limit 100
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from app.api.v1.admin import _stream_page
+from app.db.base import Base
+from app.db.models import User
+from app.services.users import _list_users, _search_users
+
+PASSWORD_HASH = "$pbkdf2-sha256$29000$benchmark$benchmark"
+
+
+def fill(db, users: int, batch: int = 50_000) -> None:
+    for start in range(0, users, batch):
+        rows = [
+            {
+                # identifier order differs from id order
+                "identifier": f"user{(i * 7919) % users:07d}@example.com",
+                "password_hash": PASSWORD_HASH,
+                "avatar_url": None,
+            }
+            for i in range(start, min(start + batch, users))
+        ]
+        db.execute(insert(User), rows)
+        db.commit()
+
+
+async def _consume(rows) -> int:
+    size = 0
+    async for chunk in _stream_page(rows, None):
+        size += len(chunk)
+    return size
+
+
+def timed(fn, repeat: int) -> float:
+    """Best of `repeat` runs of fn() + encoding, in ms."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        asyncio.run(_consume(fn()))
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+        Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+
+        start = time.perf_counter()
+        fill(db, args.users)
+        print(f"inserted {args.users} users in {time.perf_counter() - start:.1f}s")
+
+        limit = args.limit
+        deep = args.users - limit * 2
+        offset_query = (
+            select(User.id, User.identifier, User.avatar_url)
+            .order_by(User.id).limit(limit).offset(deep)
+        )
+        broad_tail = f"user{args.users - limit * 2:07d}"
+        results = {
+            "first_page_ms": timed(lambda: _list_users(db, limit), args.repeat),
+            "deep_page_keyset_ms": timed(lambda: _list_users(db, limit, after_id=deep), args.repeat),
+            "deep_page_offset_ms": timed(lambda: db.execute(offset_query).all(), args.repeat),
+            "prefix_narrow_ms": timed(lambda: _search_users(db, "user00012", limit), args.repeat),
+            "prefix_broad_deep_ms": timed(
+                lambda: _search_users(db, "user", limit, after=broad_tail), args.repeat
+            ),
+        }
+
+        start = time.perf_counter()
+        pages, after_id = 0, None
+        while True:
+            rows = _list_users(db, 1000, after_id)
+            if not rows:
+                break
+            asyncio.run(_consume(rows))
+            pages += 1
+            after_id = rows[-1].id
+        elapsed = time.perf_counter() - start
+        results["full_walk_pages_of_1000"] = pages
+        results["full_walk_rows_per_sec"] = round(args.users / elapsed)
+
+        db.close()
+        engine.dispose()
+
+    print(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# benchmarks/bench_db.py
+"""
+Request latency under mixed WebSocket + HTTP load, DB_MODE=sync vs async.
+
+For each mode a uvicorn server is started on a fresh SQLite file. Users
+register and keep WebSocket connections open; concurrent clients then
+upload avatars in a loop (a DB read + write/commit per request, the user
+cache is disabled so auth hits the DB too), while a probe calls
+GET /health/ every 10 ms. Reports p50/p95/p99 of:
+
+- upload:   POST /auth/avatar
+- ws_event: upload sent -> avatar_changed received on the user's socket
+- health:   a request that never touches the DB; it only gets slow if
+            something blocks the event loop
+
+Usage:
+    python -m benchmarks.bench_db --users 20 --sockets 5 --concurrency 16 --seconds 10
+    python -m benchmarks.bench_db --profile dev   # echo + rollback journal
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+import websockets
+
+from benchmarks.common import (
+    PNG_BYTES,
+    avatar_url_for,
+    free_port,
+    percentiles,
+    server_env,
+    start_uvicorn,
+    wait_ready,
+)
+
+
+def start_server(mode: str, profile: str, workdir: str, port: int):
+    env = server_env(
+        workdir,
+        DB_MODE=mode,
+        DB_PROFILE=profile,
+        AVATAR_SIZES="",
+        USER_CACHE_MAX_SIZE="0",
+        PASSWORD_HASH_BACKEND="thread",
+    )
+    return start_uvicorn(env, port)
+
+
+async def run_mode(mode: str, args) -> dict:
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        server = start_server(mode, args.profile, workdir, port)
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=30) as http:
+                await wait_ready(http)
+                return await _load(http, port, args)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+async def _load(http: httpx.AsyncClient, port: int, args) -> dict:
+    tokens = []
+    for i in range(args.users):
+        response = await http.post(
+            "/auth/register", json={"identifier": f"bench{i}", "password": "bench-password"}
+        )
+        tokens.append(response.json()["data"]["token"]["access_token"])
+
+    sent_at: dict = {}
+    upload_lat: list = []
+    event_lat: list = []
+    health_lat: list = []
+    stop = asyncio.Event()
+
+    async def listen(ws) -> None:
+        try:
+            async for text in ws:
+                received = time.perf_counter()
+                started = sent_at.get(json.loads(text).get("avatar_url"))
+                if started is not None:
+                    event_lat.append(received - started)
+        except websockets.ConnectionClosed:
+            pass
+
+    sockets = []
+    for token in tokens:
+        for _ in range(args.sockets):
+            sockets.append(await websockets.connect(f"ws://127.0.0.1:{port}/ws?token={token}"))
+    listeners = [asyncio.create_task(listen(ws)) for ws in sockets]
+
+    counter = 0
+
+    async def uploader(worker: int) -> None:
+        nonlocal counter
+        headers = {"Authorization": f"Bearer {tokens[worker % len(tokens)]}"}
+        while not stop.is_set():
+            counter += 1
+            body = PNG_BYTES + counter.to_bytes(8, "big")
+            # content-addressed URL is known up front; the event may beat the response
+            started = time.perf_counter()
+            sent_at[avatar_url_for(body)] = started
+            await http.post(
+                "/auth/avatar", files={"file": ("a.png", body, "image/png")}, headers=headers
+            )
+            upload_lat.append(time.perf_counter() - started)
+
+    async def probe() -> None:
+        while not stop.is_set():
+            started = time.perf_counter()
+            await http.get("/health/")
+            health_lat.append(time.perf_counter() - started)
+            await asyncio.sleep(0.01)
+
+    tasks = [asyncio.create_task(uploader(i)) for i in range(args.concurrency)]
+    tasks.append(asyncio.create_task(probe()))
+    await asyncio.sleep(args.seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    # let the last events arrive
+    await asyncio.sleep(0.5)
+
+    for ws in sockets:
+        await ws.close()
+    await asyncio.gather(*listeners)
+
+    return {
+        "uploads_per_sec": round(len(upload_lat) / args.seconds, 1),
+        "upload": percentiles(upload_lat),
+        "ws_event": percentiles(event_lat),
+        "health": percentiles(health_lat),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--sockets", type=int, default=5, help="WebSocket connections per user")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent uploaders")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--modes", default="sync,async")
+    parser.add_argument("--profile", default="prod", help="DB_PROFILE of the server")
+    args = parser.parse_args()
+
+    print(f"cores={os.cpu_count()}")
+    for mode in args.modes.split(","):
+        result = await run_mode(mode, args)
+        print({"mode": mode, **result})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,79 @@
+# benchmarks/bench_hashing.py
+"""
+Login hashing throughput: thread backend (old behaviour) vs process pool.
+
+Runs N concurrent verify_password jobs per backend and reports logins/sec,
+logins/sec per core, and the worst event-loop stall seen by a 1ms ticker
+(how long other requests on the worker would have waited).
+
+Usage:
+    python -m benchmarks.bench_hashing --logins 200 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+from app.core.hashing import PasswordHasher
+from app.core.security import hash_password, verify_password
+
+
+async def _ticker(stop: asyncio.Event, lags: list) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+
+
+async def run_backend(backend: str, logins: int, concurrency: int, workers: int) -> dict:
+    pool = PasswordHasher(backend=backend, workers=workers, max_queue=logins)
+    password_hash = hash_password("benchmark-password")
+    # warm up (spawns worker processes)
+    await pool.run(verify_password, "benchmark-password", password_hash)
+
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one_login() -> None:
+        async with sem:
+            await pool.run(verify_password, "benchmark-password", password_hash)
+
+    stop = asyncio.Event()
+    lags: list = []
+    ticker = asyncio.create_task(_ticker(stop, lags))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    pool.shutdown()
+
+    rate = logins / elapsed
+    cores = os.cpu_count() or 1
+    return {
+        "backend": backend,
+        "logins": logins,
+        "seconds": round(elapsed, 3),
+        "logins_per_sec": round(rate, 1),
+        "logins_per_sec_per_core": round(rate / cores, 1),
+        "max_loop_stall_ms": round(max(lags, default=0.0) * 1000, 2),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=0, help="0 = one per core")
+    args = parser.parse_args()
+
+    print(f"cores={os.cpu_count()}")
+    for backend in ("thread", "process"):
+        result = await run_backend(backend, args.logins, args.concurrency, args.workers)
+        print(result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+# benchmarks/bench_responses.py
+"""
+Response-building time per endpoint: previous path vs JSendResponse.
+
+"before" is what the routes did previously: model_dump() into a dict, then
+Starlette's JSONResponse (stdlib json). "after" is the current
+jsend helpers, once with orjson (if installed) and once with the stdlib
+fallback. Each case builds the complete response (object + encoded body)
+for the payload the endpoint returns. Reports microseconds per response.
+
+Usage:
+    python -m benchmarks.bench_responses --ops 20000
+"""
+
+import argparse
+import json
+import time
+
+from fastapi.responses import JSONResponse
+
+from app.api.v1.admin import _stream_page
+from app.core import jsend
+from app.core.user_cache import user_cache
+from app.core.token_cache import token_cache
+from app.schemas.responses import AuthData, AvatarData, MessageData, TokenData, UserData
+from app.schemas.user import UserBase
+
+TOKEN = "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9." + "x" * 120
+
+
+class _Row:
+    id = 42
+    identifier = "benchmark-user@example.com"
+    avatar_url = "/static/avatars/3f/3fa9c0d2b1e84f7a9c0d2b1e84f7a9e1.png"
+
+
+class _ListRow:
+    def __init__(self, i: int) -> None:
+        self.id = i
+        self.identifier = f"user{i:07d}@example.com"
+        self.avatar_url = None
+
+
+ROW = _Row()
+PAGE = [_ListRow(i) for i in range(100)]
+VALIDATION_ERRORS = [
+    {"type": "string_too_short", "loc": ["body", "password"], "msg": "String should have at least 6 characters",
+     "input": "abc", "ctx": {"min_length": 6}},
+]
+
+
+def before_auth():
+    data = {
+        "user": UserBase.model_validate(ROW).model_dump(),
+        "token": {"access_token": TOKEN, "token_type": "bearer"},
+    }
+    return JSONResponse(status_code=200, content={"status": "success", "data": data})
+
+
+def after_auth():
+    data = AuthData(user=UserData.model_validate(ROW), token=TokenData(access_token=TOKEN))
+    return jsend.jsend_success(data)
+
+
+def before_avatar():
+    data = {"avatar_url": ROW.avatar_url, "avatars": UserBase.model_validate(ROW).avatars}
+    return JSONResponse(content={"status": "success", "data": data})
+
+
+def after_avatar():
+    return jsend.jsend_success(
+        AvatarData(avatar_url=ROW.avatar_url, avatars=UserBase.model_validate(ROW).avatars)
+    )
+
+
+def before_health():
+    return JSONResponse(content={"status": "success", "data": {"message": "OK"}})
+
+
+def after_health():
+    return jsend.jsend_success(MessageData(message="OK"))
+
+
+def before_caches():
+    return JSONResponse(content={"status": "success", "data": {
+        "user_cache": user_cache.stats(), "token_cache": token_cache.stats(),
+    }})
+
+
+def after_caches():
+    return jsend.jsend_success({"user_cache": user_cache.stats(), "token_cache": token_cache.stats()})
+
+
+def before_validation_fail():
+    return JSONResponse(status_code=422, content={"status": "fail", "data": {"errors": VALIDATION_ERRORS}})
+
+
+def after_validation_fail():
+    return jsend.jsend_fail({"errors": VALIDATION_ERRORS}, http_status=422)
+
+
+def before_admin_page():
+    users = ",".join(
+        json.dumps(
+            {"id": r.id, "identifier": r.identifier, "avatar_url": r.avatar_url, "avatars": {}},
+            ensure_ascii=False, separators=(",", ":"),
+        )
+        for r in PAGE
+    )
+    return b'{"status":"success","data":{"users":[' + users.encode() + b'],"next_cursor":null}}'
+
+
+def after_admin_page():
+    gen = _stream_page(PAGE, None)
+    chunks = []
+    while True:
+        # the generator awaits nothing: each step finishes synchronously
+        try:
+            gen.asend(None).send(None)
+        except StopIteration as step:
+            chunks.append(step.value)
+        except StopAsyncIteration:
+            return b"".join(chunks)
+
+
+CASES = {
+    "register/login": (before_auth, after_auth),
+    "avatar": (before_avatar, after_avatar),
+    "health": (before_health, after_health),
+    "health/caches": (before_caches, after_caches),
+    "422 fail": (before_validation_fail, after_validation_fail),
+    "admin/users (100)": (before_admin_page, after_admin_page),
+}
+
+
+def per_op_us(fn, ops: int) -> float:
+    for _ in range(min(ops, 1000)):
+        fn()
+    start = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    return round((time.perf_counter() - start) / ops * 1e6, 2)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=20000)
+    args = parser.parse_args()
+
+    orjson = jsend.orjson
+    for name, (before, after) in CASES.items():
+        result = {"endpoint": name, "before_us": per_op_us(before, args.ops)}
+        if orjson is not None:
+            result["after_orjson_us"] = per_op_us(after, args.ops)
+        jsend.orjson = None
+        result["after_stdlib_us"] = per_op_us(after, args.ops)
+        jsend.orjson = orjson
+        print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/bench_startup.py
+"""
+Startup cost: module import, app construction and first-request latency.
+
+Every sample runs in a fresh interpreter, so nothing is cached in
+sys.modules (bytecode caches are warm: the first sample is discarded).
+Reports the median of --runs samples, in ms:
+
+- import:        `import app.main`
+- build:         getting the app object (create_app(); routers, DB layer, services)
+- first_request: lifespan startup + the first GET /health/ in process
+- cold_start:    uvicorn spawned -> first 200 from /health/ over TCP,
+                 i.e. what a new worker or an autoscaled pod waits for
+
+The database is created once up front, as the deploy-time bootstrap step
+would; the server itself is started with the given --profile.
+
+Usage:
+    python -m benchmarks.bench_startup --runs 7
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy import create_engine
+
+from benchmarks.common import free_port
+
+# Timed in the child process; prints one JSON object
+PROBE = """
+import asyncio, json, time
+start = time.perf_counter()
+import app.main as main
+imported = time.perf_counter()
+app = main.create_app() if hasattr(main, "create_app") else main.app
+built = time.perf_counter()
+
+async def first_request():
+    import httpx
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            assert (await client.get("/health/")).status_code == 200
+
+asyncio.run(first_request())
+done = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "build": built - imported,
+    "first_request": done - built,
+}))
+"""
+
+
+def _env(workdir: str, profile: str) -> dict:
+    return dict(
+        os.environ,
+        DB_PROFILE=profile,
+        DATABASE_URL=f"sqlite:///{workdir}/bench.db",
+        AVATAR_DIR=f"{workdir}/avatars",
+    )
+
+
+def probe(env: dict) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE], env=env, check=True, capture_output=True, text=True
+    ).stdout
+    # the dev profile echoes SQL to stdout; the result is the last line
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def cold_start(env: dict, timeout: float = 30.0) -> float:
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as http:
+            while True:
+                try:
+                    if http.get("/health/").status_code == 200:
+                        return time.perf_counter() - start
+                except httpx.TransportError:
+                    pass
+                if time.perf_counter() - start > timeout:
+                    raise RuntimeError("server did not start")
+                time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--profile", default="prod", choices=("dev", "test", "prod"))
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = _env(workdir, args.profile)
+        os.makedirs(env["AVATAR_DIR"])
+        from app.db.base import Base
+        from app.db import models  # noqa: F401  (registers tables)
+        Base.metadata.create_all(bind=create_engine(env["DATABASE_URL"]))
+
+        samples = {"import": [], "build": [], "first_request": [], "cold_start": []}
+        for run in range(args.runs + 1):
+            timings = probe(env)
+            timings["cold_start"] = cold_start(env)
+            if run == 0:
+                continue  # bytecode compilation, page cache
+            for name, value in timings.items():
+                samples[name].append(value)
+
+    print({f"{name}_ms": round(statistics.median(values) * 1000, 1) for name, values in samples.items()})
+
+
+if __name__ == "__main__":
+    main()
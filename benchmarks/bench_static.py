@@ -0,0 +1,88 @@
+# benchmarks/bench_static.py
+"""
+Avatar serving: plain StaticFiles mount vs AvatarFileServer.
+
+Drives both ASGI apps directly (no HTTP client overhead) with three request
+kinds against a content-addressed avatar: full GET, conditional GET
+(If-None-Match -> 304) and a byte range. Reports requests/sec.
+
+Usage:
+    python -m benchmarks.bench_static --requests 5000 --size 20000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from starlette.staticfiles import StaticFiles
+
+from app.core.static_files import AvatarFileServer, FileIndex
+
+KEY = "3f/3fa9c0d2b1e84f7a9c0d2b1e84f7a9e1.png"
+
+
+async def request(app, headers=()) -> dict:
+    scope = {
+        "type": "http",
+        # 2.4: responses don't poll receive() for a disconnect
+        "asgi": {"version": "3.0", "spec_version": "2.4"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/" + KEY,
+        "raw_path": ("/" + KEY).encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(k.encode(), v.encode()) for k, v in headers],
+        "server": ("bench", 80),
+    }
+    result = {}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            result["status"] = message["status"]
+            result["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+
+    await app(scope, receive, send)
+    return result
+
+
+async def measure(app, count: int, headers=()) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        await request(app, headers)
+    return count / (time.perf_counter() - start)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--size", type=int, default=20000, help="avatar size in bytes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.makedirs(os.path.join(directory, "3f"))
+        with open(os.path.join(directory, KEY), "wb") as f:
+            f.write(os.urandom(args.size))
+
+        apps = {
+            "StaticFiles": StaticFiles(directory=directory),
+            "AvatarFileServer": AvatarFileServer(directory, index=FileIndex()),
+        }
+        for name, app in apps.items():
+            etag = (await request(app))["headers"]["etag"]
+            results = {
+                "full_get": await measure(app, args.requests),
+                "if_none_match_304": await measure(app, args.requests, [("if-none-match", etag)]),
+                "range": await measure(app, args.requests, [("range", "bytes=0-1023")]),
+            }
+            print({"app": name, **{k: round(v) for k, v in results.items()}})
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,212 @@
+# benchmarks/bench_ws_encoding.py
+"""
+WebSocket message encodings: JSON vs MessagePack, with and without
+permessage-deflate.
+
+Two parts:
+
+- frames (in process): for sample events, the frame payload size and the
+  CPU each step costs. `encode_us` is paid once per event per worker (JSON
+  serialization, or the JSON -> MessagePack conversion the manager does);
+  `deflate_us` once per socket per message, because every compressed socket
+  has its own compression context (emulated with zlib and websockets'
+  server defaults: 12-bit window, memLevel 5, context takeover).
+- server: a uvicorn worker with --sockets sockets of one user in each mode,
+  --events avatar uploads fanned out to them. Reports server CPU per event
+  (upload handling included; see the "none" row, no sockets) and bytes the
+  server wrote per delivered message (from /proc/<pid>/io; uploads'
+  responses included, small next to the fan-out).
+
+Needs `msgpack` for the MessagePack rows.
+
+Usage:
+    python -m benchmarks.bench_ws_encoding --sockets 200 --events 200
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+from typing import Dict, List
+
+import httpx
+from websockets.asyncio.client import connect
+
+from app.core.ws_encoding import ENCODERS
+from benchmarks.common import PNG_BYTES, free_port, server_env, start_uvicorn, wait_ready
+
+
+
+def _avatar(i: int) -> str:
+    name = hashlib.blake2b(str(i).encode(), digest_size=16).hexdigest()
+    return f"/static/avatars/{name[:2]}/{name}"
+
+
+# every event differs, as real ones do (a compressor would otherwise
+# just reference the previous message)
+SAMPLES = {
+    "avatar_changed": lambda i: {
+        "event": "avatar_changed",
+        "avatar_url": f"{_avatar(i)}.png",
+        "avatars": {size: f"{_avatar(i)}_{size}.webp" for size in ("48", "96", "256")},
+        "seq": 1792203572207270 + i,
+    },
+    # stand-in for a higher-volume stream: a batch of small records
+    "activity_batch": lambda i: {
+        "event": "activity",
+        "items": [
+            {"id": 10 * i + n, "user_id": 4200 + (i * 7 + n) % 997, "kind": "like",
+             "ts": 1792203572.25 + i + n / 10, "target": f"post:{90000 + i * 3 + n}"}
+            for n in range(10)
+        ],
+        "seq": 1792203572207270 + i,
+    },
+}
+
+
+def _deflate_stream():
+    """Compress successive messages like a permessage-deflate socket."""
+    compressor = zlib.compressobj(wbits=-12, memLevel=5)
+
+    def compress(data: bytes) -> bytes:
+        out = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        return out[:-4] if out.endswith(b"\x00\x00\xff\xff") else out
+
+    return compress
+
+
+def bench_frames(messages: int) -> List[dict]:
+    rows = []
+    for name, build in SAMPLES.items():
+        events = [build(i) for i in range(messages)]
+        encoders = {"json": None, **ENCODERS}
+        for encoding, convert in encoders.items():
+            started = time.perf_counter()
+            texts = [json.dumps(event, separators=(",", ":"), ensure_ascii=False) for event in events]
+            payloads = [text.encode() for text in texts]
+            if convert is not None:
+                # the manager converts the published JSON
+                payloads = [convert(text) for text in texts]
+            encode = time.perf_counter() - started
+
+            compress = _deflate_stream()
+            started = time.perf_counter()
+            compressed = [compress(payload) for payload in payloads]
+            deflate = time.perf_counter() - started
+
+            rows.append({
+                "sample": name,
+                "encoding": encoding,
+                "bytes": round(sum(map(len, payloads)) / messages, 1),
+                "deflate_bytes": round(sum(map(len, compressed)) / messages, 1),
+                "encode_us": round(encode * 1e6 / messages, 2),
+                "deflate_us": round(deflate * 1e6 / messages, 2),
+            })
+    return rows
+
+
+def _process_stats(pid: int) -> Dict[str, float]:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    with open(f"/proc/{pid}/io") as f:
+        io = dict(line.split(": ") for line in f.read().splitlines())
+    return {"cpu": (int(fields[11]) + int(fields[12])) / ticks, "written": int(io["wchar"])}
+
+
+async def bench_mode(args, pid: int, port: int, http, token: str, mode: str) -> dict:
+    encoding, _, compression = mode.partition("+")
+    sockets = []
+    if encoding != "none":
+        for _ in range(args.sockets):
+            sockets.append(await connect(
+                f"ws://127.0.0.1:{port}/ws?token={token}",
+                subprotocols=[encoding],
+                compression="deflate" if compression else None,
+                max_size=None,
+            ))
+    received = 0
+
+    async def drain(ws) -> None:
+        nonlocal received
+        for _ in range(args.events):
+            await ws.recv()
+            received += 1
+
+    readers = [asyncio.create_task(drain(ws)) for ws in sockets]
+    before = _process_stats(pid)
+    headers = {"Authorization": f"Bearer {token}"}
+    for i in range(args.events):
+        body = PNG_BYTES + f"{mode}-{i}".encode()
+        response = await http.post(
+            "/auth/avatar", files={"file": ("a.png", body, "image/png")}, headers=headers
+        )
+        response.raise_for_status()
+    if readers:
+        await asyncio.wait_for(asyncio.gather(*readers, return_exceptions=True), 60)
+    after = _process_stats(pid)
+    for ws in sockets:
+        await ws.close()
+
+    delivered = args.events * len(sockets)
+    return {
+        "mode": mode,
+        "delivered": received,
+        "server_cpu_ms_per_event": round((after["cpu"] - before["cpu"]) * 1000 / args.events, 2),
+        "bytes_per_message": (
+            round((after["written"] - before["written"]) / delivered, 1) if delivered else None
+        ),
+    }
+
+
+async def bench_server(args, pid: int, port: int) -> List[dict]:
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as http:
+        await wait_ready(http)
+        response = await http.post(
+            "/auth/register", json={"identifier": "encoding", "password": "bench-password"}
+        )
+        response.raise_for_status()
+        token = response.json()["data"]["token"]["access_token"]
+        modes = ["none", "json", "json+deflate"]
+        if "msgpack" in ENCODERS:
+            modes += ["msgpack", "msgpack+deflate"]
+        return [await bench_mode(args, pid, port, http, token, mode) for mode in modes]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=20_000, help="frames part: events per sample")
+    parser.add_argument("--sockets", type=int, default=200, help="server part: sockets of the user")
+    parser.add_argument("--events", type=int, default=200, help="server part: uploads per mode")
+    args = parser.parse_args()
+
+    for row in bench_frames(args.messages):
+        print(json.dumps(row))
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = server_env(
+            workdir,
+            # events only: no derivative rendering per upload
+            AVATAR_SIZES="",
+            # the clients never answer pings
+            WS_PING_INTERVAL_SECONDS="0",
+            WS_MAX_CONNECTIONS_PER_USER=str(args.sockets),
+            WS_SEND_QUEUE_SIZE=str(args.events),
+        )
+        server = start_uvicorn(env, port, 1)
+        try:
+            rows = asyncio.run(bench_server(args, server.pid, port))
+        finally:
+            server.terminate()
+            server.wait()
+    for row in rows:
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# benchmarks/bench_ws_idle.py
+"""
+Memory held by idle WebSocket connections in one worker.
+
+Starts a single uvicorn worker, opens --sockets connections to /ws and
+leaves them idle, then reports the server process's RSS:
+
+- rss_start_mb:   after startup and one warm-up connection
+- rss_mb:         with all sockets open, after --hold seconds
+- per_socket_kb:  (rss_mb - rss_start_mb) / sockets
+- connects_per_sec, and the server's own ws_connections_active count
+
+The client side is raw non-blocking sockets doing the HTTP upgrade by hand
+(no WebSocket library), so the load generator stays small. Connections come
+from 127.0.0.x source addresses: one address runs out of ephemeral ports
+near 28k. These clients never answer pings, so idle reaping is off and so
+are uvicorn's protocol-level pings (they would close the sockets after
+--ws-ping-interval + --ws-ping-timeout); the app heartbeat still runs at
+--ping-interval.
+
+Every socket is a file descriptor in both processes: `ulimit -n` must
+be above --sockets.
+
+Usage:
+    python -m benchmarks.bench_ws_idle --sockets 50000 --users 100
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import socket
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import free_port, server_env, start_uvicorn, wait_ready
+
+# Source addresses used per loopback IP (ephemeral range is ~28k ports)
+SOCKETS_PER_SOURCE = 20_000
+
+
+def rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    raise RuntimeError("no VmRSS")
+
+
+async def open_socket(port: int, token: str, source: str) -> socket.socket:
+    """Connect and finish the WebSocket handshake; returns the raw socket."""
+    loop = asyncio.get_running_loop()
+    sock = socket.socket()
+    sock.setblocking(False)
+    try:
+        sock.bind((source, 0))
+        await loop.sock_connect(sock, ("127.0.0.1", port))
+        key = base64.b64encode(os.urandom(16)).decode()
+        await loop.sock_sendall(sock, (
+            f"GET /ws?token={token} HTTP/1.1\r\n"
+            f"Host: 127.0.0.1:{port}\r\n"
+            "Upgrade: websocket\r\nConnection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        response = b""
+        while b"\r\n\r\n" not in response:
+            chunk = await loop.sock_recv(sock, 4096)
+            if not chunk:
+                raise ConnectionError("closed during handshake")
+            response += chunk
+        if not response.startswith(b"HTTP/1.1 101"):
+            raise ConnectionError(response.split(b"\r\n", 1)[0].decode())
+    except BaseException:
+        sock.close()
+        raise
+    return sock
+
+
+async def active_connections(http: httpx.AsyncClient) -> float:
+    for line in (await http.get("/metrics")).text.splitlines():
+        if line.startswith("ws_connections_active "):
+            return float(line.split()[1])
+    return float("nan")
+
+
+async def run(args, pid: int, port: int) -> dict:
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60) as http:
+        await wait_ready(http)
+        tokens = []
+        for i in range(args.users):
+            response = await http.post(
+                "/auth/register", json={"identifier": f"idle{i}", "password": "bench-password"}
+            )
+            response.raise_for_status()
+            tokens.append(response.json()["data"]["token"]["access_token"])
+
+        warm = await open_socket(port, tokens[0], "127.0.0.1")
+        await asyncio.sleep(0.5)
+        rss_start = rss_mb(pid)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def one(i: int) -> socket.socket:
+            source = f"127.0.0.{1 + i // SOCKETS_PER_SOURCE}"
+            async with semaphore:
+                return await open_socket(port, tokens[i % len(tokens)], source)
+
+        started = time.perf_counter()
+        sockets = await asyncio.gather(*(one(i) for i in range(args.sockets)))
+        elapsed = time.perf_counter() - started
+
+        await asyncio.sleep(args.hold)
+        rss = rss_mb(pid)
+        registered = await active_connections(http)
+
+        for sock in [warm, *sockets]:
+            sock.close()
+
+    return {
+        "sockets": args.sockets,
+        "connects_per_sec": round(args.sockets / elapsed, 1),
+        "ws_connections_active": registered,
+        "rss_start_mb": round(rss_start, 1),
+        "rss_mb": round(rss, 1),
+        "per_socket_kb": round((rss - rss_start) * 1024 / args.sockets, 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sockets", type=int, default=50_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=200, help="handshakes in flight")
+    parser.add_argument("--hold", type=float, default=5.0, help="seconds idle before measuring")
+    parser.add_argument("--ping-interval", type=float, default=20.0)
+    args = parser.parse_args()
+
+    # the server inherits the raised limit
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    if hard != resource.RLIM_INFINITY and hard < args.sockets + 1000:
+        raise SystemExit(f"ulimit -n is {hard}; need more than {args.sockets + 1000}")
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = server_env(
+            workdir,
+            WS_PING_INTERVAL_SECONDS=str(args.ping_interval),
+            WS_IDLE_TIMEOUT_SECONDS="0",
+            # every handshake must get in: no admission control
+            WS_MAX_HANDSHAKES="0",
+            WS_MAX_CONNECTIONS_PER_USER="0",
+            PASSWORD_HASH_BACKEND="thread",
+        )
+        server = start_uvicorn(env, port, 1, "--ws-ping-interval", "0")
+        try:
+            result = asyncio.run(run(args, server.pid, port))
+        finally:
+            server.terminate()
+            server.wait()
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# benchmarks/common.py
+"""
+Helpers shared by the benchmark scripts: starting the app (uvicorn
+subprocess or in-process server), latency percentiles, test payloads.
+"""
+
+import asyncio
+import hashlib
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, Optional
+
+import httpx
+
+# Minimal PNG header; append a counter so every upload is a new file
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + b"\x00" * 17
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(samples: list) -> dict:
+    """n and p50/p95/p99 in ms of latencies given in seconds."""
+    if len(samples) < 2:
+        return {"n": len(samples)}
+    cuts = statistics.quantiles(samples, n=100)
+    return {
+        "n": len(samples),
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+    }
+
+
+def avatar_url_for(body: bytes, extension: str = ".png") -> str:
+    """The content-addressed URL an upload of `body` gets (see app.services.avatars)."""
+    name = hashlib.blake2b(body, digest_size=16).hexdigest()
+    return f"/static/avatars/{name[:2]}/{name}{extension}"
+
+
+def server_env(workdir: str, **overrides: str) -> Dict[str, str]:
+    """Environment for an app on a fresh SQLite file and avatar dir in `workdir`."""
+    env = dict(
+        os.environ,
+        DB_PROFILE="prod",
+        DATABASE_URL=f"sqlite:///{workdir}/bench.db",
+        DB_BOOTSTRAP_ON_STARTUP="1",
+        AVATAR_DIR=f"{workdir}/avatars",
+        # every client comes from 127.0.0.1: measure the server, not the limiter
+        RATE_LIMIT_BACKEND="off",
+    )
+    env.update(overrides)
+    return env
+
+
+def start_uvicorn(env: Dict[str, str], port: int, workers: int = 1, *options: str) -> subprocess.Popen:
+    """uvicorn serving create_app(); `options` are extra uvicorn flags."""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:create_app", "--factory",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning", *options],
+        env=env,
+        stdout=subprocess.DEVNULL,  # SQL echo with the dev profile
+        stderr=subprocess.DEVNULL,
+    )
+
+
+async def wait_ready(http: httpx.AsyncClient, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await http.get("/health/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError("server did not start")
+        await asyncio.sleep(0.05)
+
+
+class InProcessServer:
+    """
+    uvicorn running as a task on the caller's event loop: no subprocess,
+    same interpreter as the load generator (so they share the one loop).
+    The app reads its settings at import: the environment has to be
+    prepared (os.environ) before the first start().
+    """
+
+    def __init__(self, port: int) -> None:
+        self.port = port
+        self._server = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        import uvicorn
+        from app.main import create_app
+
+        config = uvicorn.Config(create_app(), port=self.port, log_level="warning", lifespan="on")
+        self._server = uvicorn.Server(config)
+        self._task = asyncio.create_task(self._server.serve())
+        while not self._server.started:
+            if self._task.done():
+                self._task.result()
+            await asyncio.sleep(0.01)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.should_exit = True
+            await self._task
@@ -0,0 +1,456 @@
+# benchmarks/suite.py
+"""
+Load benchmark suite for the auth, avatar and WebSocket paths.
+
+    python -m benchmarks.suite run --out results/$(git rev-parse --short HEAD).json
+    python -m benchmarks.suite run --server inprocess --scenarios login_storm --seconds 5
+    python -m benchmarks.suite compare results/base.json results/new.json --tolerance 0.1
+
+`run` boots the app on a fresh SQLite file, either as a local uvicorn
+process (default; the load generator gets its own process) or in-process
+(uvicorn on the suite's event loop: no subprocess, easy to profile, but
+client and server share one core's worth of loop). It then drives each
+scenario for --seconds with --concurrency clients:
+
+- register:    sign-ups with unique identifiers (hashing + insert)
+- login_storm: logins against --users accounts (hashing pool saturation)
+- avatar:      uploads of unique images (file write + DB + broadcast)
+- ws_fanout:   --users x --sockets open sockets; each upload's event is
+               timed from request start to arrival on every socket of the user
+- mixed:       ws_fanout uploads, a quarter as many login clients and a
+               /health/ probe every 10 ms, all at once
+- reconnect_storm: --storm-clients sockets (--sockets per user) all
+               connecting at once, as after a deploy; refused clients
+               (1013) come back after the server's retry hint. Reports each
+               attempt (handshake; refusals are its errors), time until each
+               client is in (connected) and /health/ meanwhile
+
+Every operation reports throughput (successful ops/sec; deliveries/sec for
+ws_event), p50/p95/p99 latency and errors. Results are printed and, with
+--out, written as JSON together with the commit, machine and settings.
+
+`compare` checks a new result file against a baseline and exits 1 if any
+throughput dropped, or any p95/p99 grew, by more than --tolerance
+(latency changes under --min-ms are noise and ignored).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import httpx
+import websockets
+
+from benchmarks.common import (
+    InProcessServer,
+    PNG_BYTES,
+    avatar_url_for,
+    free_port,
+    percentiles,
+    server_env,
+    start_uvicorn,
+    wait_ready,
+)
+
+SCENARIOS = ("register", "login_storm", "avatar", "ws_fanout", "mixed", "reconnect_storm")
+# Close code of a refused handshake (app.core.ws_manager.CLOSE_TRY_AGAIN)
+CLOSE_TRY_AGAIN = 1013
+PASSWORD = "bench-password"
+
+
+class Recorder:
+    """Latencies and errors of one operation."""
+
+    def __init__(self) -> None:
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def summary(self, seconds: float) -> dict:
+        return {
+            "throughput_rps": round(len(self.latencies) / seconds, 1),
+            "errors": self.errors,
+            **percentiles(self.latencies),
+        }
+
+
+class Workload:
+    """One running server plus the clients driving it."""
+
+    def __init__(self, base_url: str, args) -> None:
+        self.base_url = base_url
+        self.ws_url = base_url.replace("http://", "ws://", 1)
+        self.args = args
+        self.prefix = f"bench{random.randrange(16 ** 6):06x}"
+        self._uploads = 0
+        limits = httpx.Limits(max_connections=args.concurrency * 2 + 8)
+        self.http = httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits)
+
+    async def close(self) -> None:
+        await self.http.aclose()
+
+    # ---- building blocks ----
+
+    async def timed(self, recorder: Recorder, request: Awaitable[httpx.Response], ok: int = 200) -> None:
+        started = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            recorder.errors += 1
+            return
+        if response.status_code == ok:
+            recorder.latencies.append(time.perf_counter() - started)
+        else:
+            recorder.errors += 1
+
+    async def drive(self, clients: int, op: Callable[[int], Awaitable[None]], stop: asyncio.Event) -> None:
+        """Run op(client) in a loop on `clients` concurrent clients until stopped."""
+        async def client(index: int) -> None:
+            while not stop.is_set():
+                await op(index)
+        await asyncio.gather(*(client(i) for i in range(clients)))
+
+    async def run_for(self, *loops: Callable[[asyncio.Event], Awaitable[None]]) -> None:
+        stop = asyncio.Event()
+        tasks = [asyncio.create_task(loop(stop)) for loop in loops]
+        await asyncio.sleep(self.args.seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+
+    async def register_users(self, count: int, tag: str) -> List[dict]:
+        """Accounts for a scenario: [{identifier, token}]."""
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+
+        async def register(i: int) -> dict:
+            identifier = f"{self.prefix}-{tag}-{i}"
+            async with semaphore:
+                response = await self.http.post(
+                    "/auth/register", json={"identifier": identifier, "password": PASSWORD}
+                )
+            response.raise_for_status()
+            return {"identifier": identifier, "token": response.json()["data"]["token"]["access_token"]}
+
+        return await asyncio.gather(*(register(i) for i in range(count)))
+
+    def next_image(self) -> bytes:
+        self._uploads += 1
+        return PNG_BYTES + self.prefix.encode() + self._uploads.to_bytes(8, "big")
+
+    def upload(self, token: str, body: bytes) -> Awaitable[httpx.Response]:
+        return self.http.post(
+            "/auth/avatar",
+            files={"file": ("a.png", body, "image/png")},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    # ---- scenarios ----
+
+    async def register(self) -> Dict[str, dict]:
+        recorder = Recorder()
+        counter = iter(range(10 ** 9))
+
+        async def op(client: int) -> None:
+            body = {"identifier": f"{self.prefix}-reg-{next(counter)}", "password": PASSWORD}
+            await self.timed(recorder, self.http.post("/auth/register", json=body), ok=201)
+
+        await self.run_for(lambda stop: self.drive(self.args.concurrency, op, stop))
+        return {"register": recorder.summary(self.args.seconds)}
+
+    async def login_storm(self) -> Dict[str, dict]:
+        users = await self.register_users(self.args.users, "login")
+        recorder = Recorder()
+
+        async def op(client: int) -> None:
+            user = users[random.randrange(len(users))]
+            body = {"identifier": user["identifier"], "password": PASSWORD}
+            await self.timed(recorder, self.http.post("/auth/login", json=body))
+
+        await self.run_for(lambda stop: self.drive(self.args.concurrency, op, stop))
+        return {"login": recorder.summary(self.args.seconds)}
+
+    async def avatar(self) -> Dict[str, dict]:
+        users = await self.register_users(self.args.users, "avatar")
+        recorder = Recorder()
+
+        async def op(client: int) -> None:
+            token = users[client % len(users)]["token"]
+            await self.timed(recorder, self.upload(token, self.next_image()))
+
+        await self.run_for(lambda stop: self.drive(self.args.concurrency, op, stop))
+        return {"upload": recorder.summary(self.args.seconds)}
+
+    async def ws_fanout(self, with_logins: bool = False) -> Dict[str, dict]:
+        users = await self.register_users(self.args.users, "ws" if not with_logins else "mixed")
+        uploads, events, logins, health = Recorder(), Recorder(), Recorder(), Recorder()
+        sent_at: Dict[str, float] = {}
+        expected = 0
+
+        async def listen(ws) -> None:
+            try:
+                async for text in ws:
+                    started = sent_at.get(json.loads(text).get("avatar_url"))
+                    if started is not None:
+                        events.latencies.append(time.perf_counter() - started)
+            except websockets.ConnectionClosed:
+                pass
+
+        sockets = []
+        for user in users:
+            for _ in range(self.args.sockets):
+                sockets.append(await websockets.connect(f"{self.ws_url}/ws?token={user['token']}"))
+        listeners = [asyncio.create_task(listen(ws)) for ws in sockets]
+
+        async def upload(client: int) -> None:
+            nonlocal expected
+            body = self.next_image()
+            # content-addressed: the URL is known before the event can arrive
+            sent_at[avatar_url_for(body)] = time.perf_counter()
+            expected += self.args.sockets
+            await self.timed(uploads, self.upload(users[client % len(users)]["token"], body))
+
+        async def login(client: int) -> None:
+            user = users[random.randrange(len(users))]
+            body = {"identifier": user["identifier"], "password": PASSWORD}
+            await self.timed(logins, self.http.post("/auth/login", json=body))
+
+        async def probe(stop: asyncio.Event) -> None:
+            while not stop.is_set():
+                await self.timed(health, self.http.get("/health/"))
+                await asyncio.sleep(0.01)
+
+        loops = [lambda stop: self.drive(self.args.concurrency, upload, stop)]
+        if with_logins:
+            loops.append(lambda stop: self.drive(max(1, self.args.concurrency // 4), login, stop))
+            loops.append(probe)
+        await self.run_for(*loops)
+        # let the last events arrive
+        await asyncio.sleep(0.5)
+        for ws in sockets:
+            await ws.close()
+        await asyncio.gather(*listeners)
+
+        # a lost or late-beyond-the-drain event counts as an error
+        events.errors = max(0, expected - len(events.latencies))
+        results = {"upload": uploads.summary(self.args.seconds), "ws_event": events.summary(self.args.seconds)}
+        if with_logins:
+            results["login"] = logins.summary(self.args.seconds)
+            results["health"] = health.summary(self.args.seconds)
+        return results
+
+    async def mixed(self) -> Dict[str, dict]:
+        return await self.ws_fanout(with_logins=True)
+
+    async def reconnect_storm(self) -> Dict[str, dict]:
+        users = await self.register_users(-(-self.args.storm_clients // self.args.sockets), "storm")
+        handshakes, connected, health = Recorder(), Recorder(), Recorder()
+        sockets = []
+        deadline = time.perf_counter() + max(self.args.seconds, 30)
+
+        async def client(index: int) -> None:
+            url = f"{self.ws_url}/ws?token={users[index % len(users)]['token']}"
+            first = time.perf_counter()
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    ws = await websockets.connect(url, open_timeout=30)
+                except (OSError, websockets.WebSocketException, asyncio.TimeoutError):
+                    handshakes.errors += 1
+                    await asyncio.sleep(1)
+                    continue
+                opened = time.perf_counter() - started
+                try:
+                    # a refused socket is closed right after the upgrade
+                    await asyncio.wait_for(ws.recv(), 0.25)
+                except asyncio.TimeoutError:
+                    handshakes.latencies.append(opened)
+                    connected.latencies.append(time.perf_counter() - first - 0.25)
+                    sockets.append(ws)
+                    return
+                except websockets.ConnectionClosed as closed:
+                    handshakes.errors += 1
+                    if closed.rcvd is not None and closed.rcvd.code == CLOSE_TRY_AGAIN:
+                        await asyncio.sleep(json.loads(closed.rcvd.reason)["retry_after"])
+                        continue
+                    await asyncio.sleep(1)
+                    continue
+                # unexpected message: still connected
+                handshakes.latencies.append(opened)
+                connected.latencies.append(time.perf_counter() - first)
+                sockets.append(ws)
+                return
+            connected.errors += 1
+
+        async def probe(stop: asyncio.Event) -> None:
+            while not stop.is_set():
+                await self.timed(health, self.http.get("/health/"))
+                await asyncio.sleep(0.01)
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(client(i) for i in range(self.args.storm_clients)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await prober
+        for ws in sockets:
+            await ws.close()
+        return {
+            "handshake": handshakes.summary(elapsed),
+            "connected": connected.summary(elapsed),
+            "health": health.summary(elapsed),
+        }
+
+
+# ---- run ----
+
+def _git(*command: str) -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", *command], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _meta(args, env: Dict[str, str]) -> dict:
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cores": os.cpu_count(),
+        "server": args.server,
+        "params": {
+            name: getattr(args, name)
+            for name in (
+                "scenarios", "seconds", "concurrency", "users", "sockets", "storm_clients", "workers"
+            )
+        },
+        "env": dict(args.env),
+    }
+
+
+async def run(args) -> dict:
+    scenarios = args.scenarios.split(",")
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    port = free_port()
+    with tempfile.TemporaryDirectory() as workdir:
+        env = server_env(workdir, **dict(args.env))
+        if args.server == "inprocess":
+            # read by app.core.config at import
+            os.environ.update(env)
+            server = InProcessServer(port)
+            await server.start()
+        else:
+            process = start_uvicorn(env, port, workers=args.workers)
+
+        workload = Workload(f"http://127.0.0.1:{port}", args)
+        try:
+            await wait_ready(workload.http)
+            results = {}
+            for name in scenarios:
+                results[name] = await getattr(workload, name)()
+                print(json.dumps({name: results[name]}), file=sys.stderr)
+        finally:
+            await workload.close()
+            if args.server == "inprocess":
+                await server.stop()
+            else:
+                process.terminate()
+                process.wait()
+    return {"meta": _meta(args, env), "results": results}
+
+
+# ---- compare ----
+
+def compare(baseline: dict, current: dict, tolerance: float, min_ms: float) -> List[str]:
+    """Human-readable regressions of `current` against `baseline` (empty = none)."""
+    regressions = []
+    for scenario, ops in current["results"].items():
+        for op, new in ops.items():
+            old = baseline["results"].get(scenario, {}).get(op)
+            if old is None:
+                continue
+            where = f"{scenario}/{op}"
+            if old.get("throughput_rps") and new["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{where}: throughput {old['throughput_rps']} -> {new['throughput_rps']} ops/s"
+                )
+            for key in ("p95_ms", "p99_ms"):
+                if key not in old or key not in new:
+                    continue
+                if new[key] > old[key] * (1 + tolerance) and new[key] - old[key] >= min_ms:
+                    regressions.append(f"{where}: {key} {old[key]} -> {new[key]}")
+    return regressions
+
+
+def _env_pair(value: str):
+    name, sep, setting = value.partition("=")
+    if not sep:
+        raise argparse.ArgumentTypeError("expected NAME=VALUE")
+    return name, setting
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.suite", description="Load benchmarks with JSON results."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="run scenarios against a fresh server")
+    p_run.add_argument("--server", choices=("uvicorn", "inprocess"), default="uvicorn")
+    p_run.add_argument("--scenarios", default=",".join(SCENARIOS))
+    p_run.add_argument("--seconds", type=float, default=10.0, help="per scenario")
+    p_run.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    p_run.add_argument("--users", type=int, default=20, help="accounts per scenario")
+    p_run.add_argument("--sockets", type=int, default=5, help="WebSocket connections per user")
+    p_run.add_argument("--storm-clients", type=int, default=1000, help="sockets in reconnect_storm")
+    p_run.add_argument("--workers", type=int, default=1, help="uvicorn workers (uvicorn server only)")
+    p_run.add_argument("--env", type=_env_pair, action="append", default=[],
+                       metavar="NAME=VALUE", help="server setting, e.g. DB_MODE=sync (repeatable)")
+    p_run.add_argument("--out", help="write results JSON here")
+
+    p_compare = sub.add_parser("compare", help="fail on regressions against a baseline")
+    p_compare.add_argument("baseline")
+    p_compare.add_argument("current")
+    p_compare.add_argument("--tolerance", type=float, default=0.10, help="allowed relative change")
+    p_compare.add_argument("--min-ms", type=float, default=1.0, help="ignore smaller latency changes")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "compare":
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = compare(baseline, current, args.tolerance, args.min_ms)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if not regressions:
+            print(f"no regressions beyond {args.tolerance:.0%}")
+        return 1 if regressions else 0
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,12 +7,20 @@ Uses a temporary file SQLite database to avoid in-memory DB issues.
 import os
 import tempfile
 import pytest
+
+# Hash passwords in worker threads: a process pool per TestClient is slow to spawn
+os.environ.setdefault("PASSWORD_HASH_BACKEND", "thread")
+# No SQL echo in test output
+os.environ.setdefault("DB_PROFILE", "test")
+
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
-from app.db.base import Base, get_db
+from app.db.base import Base, get_db, get_read_db
+from app.core.user_cache import user_cache
+from app.core.rate_limit import auth_limiter
 
 
 # Create a temp file for test database
@@ -81,6 +89,10 @@ def client(db_session):
             pass
     
     app.dependency_overrides[get_db] = _override_get_db
+    # reads must see the test transaction's uncommitted rows -> same session
+    app.dependency_overrides[get_read_db] = _override_get_db
+    # user ids are reused after rollback, so cached snapshots must not leak
+    user_cache.clear()
     
     with TestClient(app) as test_client:
         yield test_client
@@ -88,6 +100,21 @@ def client(db_session):
     app.dependency_overrides.clear()
 
 
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Every test starts with full login/register buckets."""
+    auth_limiter.reset()
+
+
+@pytest.fixture
+def avatar_dir(tmp_path, monkeypatch):
+    """Store uploaded avatars in a temp directory instead of static/avatars."""
+    from app.services import avatars
+
+    monkeypatch.setattr(avatars, "AVATAR_DIR", str(tmp_path))
+    return tmp_path
+
+
 @pytest.fixture
 def test_user_data():
     """Sample user data for tests."""
@@ -113,3 +140,9 @@ def registered_user(client, test_user_data):
 
 
 
+
+
+@pytest.fixture
+def anyio_backend():
+    """Run async tests on asyncio only."""
+    return "asyncio"
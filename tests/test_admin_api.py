@@ -0,0 +1,132 @@
+# tests/test_admin_api.py
+"""
+API tests for admin endpoints (app/api/v1/admin.py).
+"""
+
+import pytest
+from sqlalchemy import event
+
+from app.api.v1.admin import encode_cursor
+from app.core import deps
+from app.core.security import hash_password
+from app.db.models import User
+from app.services.users import _search_users, prefix_upper_bound
+
+ADMIN = {"identifier": "admin@example.com", "password": "adminpass123"}
+
+
+@pytest.fixture
+def admin_headers(client, db_session, monkeypatch):
+    monkeypatch.setattr(deps, "ADMIN_IDENTIFIERS", frozenset({ADMIN["identifier"]}))
+    # admin identifiers can't be registered: created like `app.tools.users import` does
+    db_session.add(User(identifier=ADMIN["identifier"], password_hash=hash_password(ADMIN["password"])))
+    db_session.commit()
+    response = client.post("/auth/login", json=ADMIN)
+    token = response.json()["data"]["token"]["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def users(client):
+    names = ["bob@example.com", "alice@example.com", "alina@example.com", "albert@example.com"]
+    for name in names:
+        assert client.post("/auth/register", json={"identifier": name, "password": "secret123"}).status_code == 201
+    return names
+
+
+def _pages(client, headers, **params):
+    pages = []
+    cursor = None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        response = client.get("/admin/users", params=query, headers=headers)
+        assert response.status_code == 200
+        body = response.json()
+        assert body["status"] == "success"
+        pages.append([user["identifier"] for user in body["data"]["users"]])
+        cursor = body["data"]["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+class TestListUsers:
+    """Tests for GET /admin/users."""
+
+    def test_requires_admin(self, client, registered_user):
+        response = client.get(
+            "/admin/users", headers={"Authorization": f"Bearer {registered_user['token']}"}
+        )
+        assert response.status_code == 403
+        assert response.json()["status"] == "fail"
+
+    def test_admin_identifier_cannot_be_registered(self, client, monkeypatch):
+        monkeypatch.setattr(deps, "ADMIN_IDENTIFIERS", frozenset({ADMIN["identifier"]}))
+        response = client.post("/auth/register", json=ADMIN)
+        assert response.status_code == 400
+        assert "identifier" in response.json()["data"]
+
+    def test_pages_in_id_order(self, client, admin_headers, users):
+        pages = _pages(client, admin_headers, limit=2)
+        assert pages == [[ADMIN["identifier"], users[0]], users[1:3], users[3:]]
+
+    def test_prefix_search(self, client, admin_headers, users):
+        pages = _pages(client, admin_headers, prefix="al", limit=2)
+        assert pages == [["albert@example.com", "alice@example.com"], ["alina@example.com"]]
+        assert _pages(client, admin_headers, prefix="zz") == [[]]
+
+    def test_invalid_cursor(self, client, admin_headers, users):
+        response = client.get("/admin/users", params={"cursor": "!!"}, headers=admin_headers)
+        assert response.status_code == 400
+
+        # id cursor used for a prefix listing
+        cursor = client.get(
+            "/admin/users", params={"limit": 1}, headers=admin_headers
+        ).json()["data"]["next_cursor"]
+        response = client.get(
+            "/admin/users", params={"cursor": cursor, "prefix": "al"}, headers=admin_headers
+        )
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("value", ["abc", "99999999999999999999999", "1_0", "-1"])
+    def test_malformed_id_cursor(self, client, admin_headers, value):
+        response = client.get(
+            "/admin/users", params={"cursor": encode_cursor("id", value)}, headers=admin_headers
+        )
+        assert response.status_code == 400
+        assert response.json()["data"] == {"cursor": "malformed cursor"}
+
+    def test_page_size_is_bounded(self, client, admin_headers):
+        response = client.get("/admin/users", params={"limit": 100000}, headers=admin_headers)
+        assert response.status_code == 422
+
+
+class TestPrefixSearchQuery:
+    """Prefix search is an index range scan."""
+
+    def test_upper_bound(self):
+        assert prefix_upper_bound("al") == "am"
+        assert prefix_upper_bound("a\U0010ffff") == "b"
+        assert prefix_upper_bound("\U0010ffff") is None
+
+    def test_uses_identifier_index(self, db_session):
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+
+        bind = db_session.get_bind()
+        event.listen(bind, "before_cursor_execute", capture)
+        try:
+            _search_users(db_session, "al", 10, after="albert")
+        finally:
+            event.remove(bind, "before_cursor_execute", capture)
+
+        statement, parameters = statements[-1]
+        # the SQLite dialect always renders "OFFSET ?"; keyset pages skip nothing
+        assert parameters[-1] == 0
+        plan = db_session.connection().exec_driver_sql(
+            "EXPLAIN QUERY PLAN " + statement, parameters
+        )
+        details = " ".join(row[-1] for row in plan)
+        assert "ix_users_identifier" in details
+        assert "TEMP B-TREE" not in details
@@ -0,0 +1,223 @@
+# tests/test_async_db.py
+"""
+Tests for the async DB path (app/db/base.py, DB_MODE=async) and the
+non-blocking WebSocket handshake.
+"""
+
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+
+from app.main import app
+from app.db.base import Base, get_db, get_read_db, run_db
+from app.core.user_cache import user_cache
+from app.services.users import create_user, authenticate_user, get_user_by_id
+
+from tests.test_auth_api import PNG_BYTES
+
+pytest.importorskip("aiosqlite")
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+
+@pytest.fixture
+def async_sessions(tmp_path):
+    """AsyncSession factory on a fresh SQLite file."""
+    path = tmp_path / "async.db"
+    Base.metadata.create_all(bind=create_engine(f"sqlite:///{path}"))
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    yield async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+    engine.sync_engine.dispose()
+
+
+@pytest.fixture
+def async_client(async_sessions):
+    """Test client whose requests get an AsyncSession."""
+    async def _override_get_db():
+        async with async_sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = _override_get_db
+    app.dependency_overrides[get_read_db] = _override_get_db
+    user_cache.clear()
+    with TestClient(app) as test_client:
+        yield test_client
+    app.dependency_overrides.clear()
+
+
+class TestAsyncServices:
+    """User services with an AsyncSession."""
+
+    @pytest.mark.anyio
+    async def test_create_and_authenticate(self, async_sessions):
+        async with async_sessions() as db:
+            user = await create_user(db, identifier="async@example.com", password="password123")
+            assert user.id is not None
+
+            found = await authenticate_user(db, identifier="async@example.com", password="password123")
+            assert found is not None and found.id == user.id
+            assert await authenticate_user(db, identifier="async@example.com", password="nope") is None
+            assert (await get_user_by_id(db, user.id)).identifier == "async@example.com"
+
+    @pytest.mark.anyio
+    async def test_sync_session_runs_in_worker_thread(self, db_session):
+        """run_db must not run ORM calls for a sync Session on the loop thread."""
+        loop_thread = threading.get_ident()
+        ran_in = await run_db(db_session, lambda db: threading.get_ident())
+        assert ran_in != loop_thread
+
+
+class TestAsyncEndpoints:
+    """Full request cycle on the async DB path."""
+
+    def test_register_login_avatar_delete(self, async_client, avatar_dir):
+        credentials = {"identifier": "asyncapi@example.com", "password": "password123"}
+        response = async_client.post("/auth/register", json=credentials)
+        assert response.status_code == 201
+
+        response = async_client.post("/auth/login", json=credentials)
+        assert response.status_code == 200
+        headers = {"Authorization": f"Bearer {response.json()['data']['token']['access_token']}"}
+
+        response = async_client.post(
+            "/auth/avatar",
+            files={"file": ("a.png", PNG_BYTES, "image/png")},
+            headers=headers,
+        )
+        assert response.status_code == 200
+        assert list(avatar_dir.rglob("*.png"))
+
+        response = async_client.delete("/auth/me", headers=headers)
+        assert response.status_code == 200
+        assert not list(avatar_dir.rglob("*.png"))
+
+        response = async_client.post("/auth/login", json=credentials)
+        assert response.status_code == 401
+
+
+    def test_avatar_files_removed_off_the_loop(self, async_client, avatar_dir, monkeypatch):
+        """AsyncSession.run_sync runs on the loop thread: file work must not go through it."""
+        import asyncio
+
+        from app.services import avatars
+
+        calls = []
+
+        def spy(fn):
+            def wrapper(*args):
+                try:
+                    asyncio.get_running_loop()
+                    calls.append((fn.__name__, "loop"))
+                except RuntimeError:
+                    calls.append((fn.__name__, "thread"))
+                return fn(*args)
+            return wrapper
+
+        for name in ("_set_aside_avatar_files", "_finish_removal"):
+            monkeypatch.setattr(avatars, name, spy(getattr(avatars, name)))
+
+        credentials = {"identifier": "asyncfiles@example.com", "password": "password123"}
+        token = async_client.post("/auth/register", json=credentials).json()["data"]["token"]["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        async_client.post("/auth/avatar", files={"file": ("a.png", PNG_BYTES, "image/png")}, headers=headers)
+        async_client.delete("/auth/me", headers=headers)
+
+        assert not list(avatar_dir.rglob("*.png"))
+        assert calls == [("_set_aside_avatar_files", "thread"), ("_finish_removal", "thread")]
+
+
+class TestWebSocketHandshake:
+    """GET /ws resolves the user without holding a DB connection."""
+
+    def test_ws_receives_avatar_event(self, client, registered_user, avatar_dir):
+        headers = {"Authorization": f"Bearer {registered_user['token']}"}
+        with client.websocket_connect(f"/ws?token={registered_user['token']}") as ws:
+            # the request session is still usable after the handshake released it
+            response = client.post(
+                "/auth/avatar",
+                files={"file": ("a.png", PNG_BYTES, "image/png")},
+                headers=headers,
+            )
+            assert response.status_code == 200
+            event = ws.receive_json()
+
+        assert event["event"] == "avatar_changed"
+        assert event["avatar_url"] == response.json()["data"]["avatar_url"]
+
+    def test_ws_resume_since(self, client, registered_user, avatar_dir):
+        headers = {"Authorization": f"Bearer {registered_user['token']}"}
+        url = f"/ws?token={registered_user['token']}"
+        with client.websocket_connect(url) as ws:
+            client.post(
+                "/auth/avatar", files={"file": ("a.png", PNG_BYTES, "image/png")}, headers=headers
+            )
+            seen = ws.receive_json()["seq"]
+
+        # uploaded while disconnected
+        client.post(
+            "/auth/avatar", files={"file": ("b.png", PNG_BYTES + b"b", "image/png")}, headers=headers
+        )
+        with client.websocket_connect(f"{url}&since={seen}") as ws:
+            missed = ws.receive_json()
+
+        assert missed["event"] == "avatar_changed" and missed["seq"] > seen
+
+    def test_ws_msgpack_subprotocol(self, client, registered_user, avatar_dir):
+        msgpack = pytest.importorskip("msgpack")
+        headers = {"Authorization": f"Bearer {registered_user['token']}"}
+        url = f"/ws?token={registered_user['token']}"
+        with client.websocket_connect(url, subprotocols=["msgpack"]) as ws:
+            assert ws.accepted_subprotocol == "msgpack"
+            client.post(
+                "/auth/avatar", files={"file": ("a.png", PNG_BYTES, "image/png")}, headers=headers
+            )
+            event = msgpack.unpackb(ws.receive_bytes())
+
+        assert event["event"] == "avatar_changed"
+
+    def test_ws_unknown_format_refused(self, client, registered_user):
+        from starlette.websockets import WebSocketDisconnect
+        from app.core.ws_manager import CLOSE_UNSUPPORTED_FORMAT
+
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            url = f"/ws?token={registered_user['token']}&format=xml"
+            with client.websocket_connect(url) as ws:
+                ws.receive_text()
+        assert exc_info.value.code == CLOSE_UNSUPPORTED_FORMAT
+
+    def test_ws_rejects_unknown_user(self, client):
+        from starlette.websockets import WebSocketDisconnect
+        from app.core.security import create_access_token
+
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            with client.websocket_connect(f"/ws?token={create_access_token('999999')}") as ws:
+                ws.receive_text()
+        assert exc_info.value.code == 1008
+
+    def test_ws_refused_while_handshakes_busy(self, client, registered_user, monkeypatch):
+        import json
+        from starlette.websockets import WebSocketDisconnect
+        from app.core.ws_manager import CLOSE_TRY_AGAIN, manager
+
+        monkeypatch.setattr(manager, "max_handshakes", 1)
+        monkeypatch.setattr(manager, "handshakes", 1)  # one already in flight
+        with pytest.raises(WebSocketDisconnect) as exc_info:
+            with client.websocket_connect(f"/ws?token={registered_user['token']}") as ws:
+                ws.receive_text()
+        assert exc_info.value.code == CLOSE_TRY_AGAIN
+        retry_after = json.loads(exc_info.value.reason)["retry_after"]
+        assert manager.retry_after <= retry_after <= 2 * manager.retry_after
+
+    def test_ws_per_user_cap(self, client, registered_user, monkeypatch):
+        from starlette.websockets import WebSocketDisconnect
+        from app.core.ws_manager import CLOSE_TOO_MANY_CONNECTIONS, manager
+
+        monkeypatch.setattr(manager, "max_per_user", 1)
+        url = f"/ws?token={registered_user['token']}"
+        with client.websocket_connect(url):
+            with pytest.raises(WebSocketDisconnect) as exc_info:
+                with client.websocket_connect(url) as second:
+                    second.receive_text()
+            assert exc_info.value.code == CLOSE_TOO_MANY_CONNECTIONS
+            assert manager.connection_count() == 1
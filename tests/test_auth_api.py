@@ -4,8 +4,13 @@ API tests for auth endpoints (app/api/v1/auth.py).
 Tests full request/response cycle through FastAPI.
 """
 
+import io
+
 import pytest
 
+# Minimal PNG signature + IHDR header, enough for magic-byte sniffing
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + b"\x00" * 17
+
 
 class TestRegister:
     """Tests for POST /auth/register endpoint."""
@@ -117,6 +122,204 @@ class TestAvatar:
         # No credentials → 401 Unauthorized
         assert response.status_code == 401
 
+    def test_avatar_upload_sniffs_content(self, client, registered_user, avatar_dir):
+        """PNG bytes are accepted even with a generic content type."""
+        response = client.post(
+            "/auth/avatar",
+            headers={"Authorization": f"Bearer {registered_user['token']}"},
+            files={"file": ("avatar.bin", PNG_BYTES, "application/octet-stream")},
+        )
+
+        assert response.status_code == 200
+        avatar_url = response.json()["data"]["avatar_url"]
+        assert avatar_url.endswith(".png")
+        assert (avatar_dir / avatar_url.removeprefix("/static/avatars/")).is_file()
+
+    def test_avatar_derivatives_generated(self, client, registered_user, avatar_dir):
+        """Upload should produce square WebP derivatives for every configured size."""
+        Image = pytest.importorskip("PIL.Image")
+        buffer = io.BytesIO()
+        Image.new("RGB", (300, 200), "red").save(buffer, format="PNG")
+
+        response = client.post(
+            "/auth/avatar",
+            headers={"Authorization": f"Bearer {registered_user['token']}"},
+            files={"file": ("avatar.png", buffer.getvalue(), "image/png")},
+        )
+
+        assert response.status_code == 200
+        # rendered after the response: not listed before they exist
+        assert response.json()["data"]["avatars"] == {}
+
+        # same image again: stored and rendered already
+        response = client.post(
+            "/auth/avatar",
+            headers={"Authorization": f"Bearer {registered_user['token']}"},
+            files={"file": ("avatar.png", buffer.getvalue(), "image/png")},
+        )
+        avatars = response.json()["data"]["avatars"]
+        assert set(avatars) == {"48", "96", "256"}
+        for size, url in avatars.items():
+            with Image.open(avatar_dir / url.removeprefix("/static/avatars/")) as derivative:
+                assert derivative.format == "WEBP"
+                assert derivative.size == (int(size), int(size))
+
+    def test_identical_avatars_are_deduplicated(self, client, registered_user, avatar_dir):
+        """Same bytes from two users share one file until both references are gone."""
+        other = client.post(
+            "/auth/register",
+            json={"identifier": "other@example.com", "password": "password123"},
+        ).json()["data"]["token"]["access_token"]
+
+        urls = []
+        for token in (registered_user["token"], other):
+            response = client.post(
+                "/auth/avatar",
+                headers={"Authorization": f"Bearer {token}"},
+                files={"file": ("avatar.png", PNG_BYTES, "image/png")},
+            )
+            urls.append(response.json()["data"]["avatar_url"])
+
+        assert urls[0] == urls[1]
+        stored = avatar_dir / urls[0].removeprefix("/static/avatars/")
+
+        client.delete("/auth/me", headers={"Authorization": f"Bearer {other}"})
+        assert stored.is_file()
+
+        client.delete(
+            "/auth/me",
+            headers={"Authorization": f"Bearer {registered_user['token']}"},
+        )
+        assert not stored.exists()
+
+    def test_identical_upload_survives_concurrent_delete(
+        self, client, registered_user, avatar_dir, monkeypatch
+    ):
+        """The last owner's delete racing an upload of the same bytes leaves the file."""
+        from app.services import avatars
+        from app.services import users as user_service
+
+        other = client.post(
+            "/auth/register",
+            json={"identifier": "other@example.com", "password": "password123"},
+        ).json()["data"]
+        client.post(
+            "/auth/avatar",
+            headers={"Authorization": f"Bearer {other['token']['access_token']}"},
+            files={"file": ("avatar.png", PNG_BYTES, "image/png")},
+        )
+
+        assign_avatar = avatars.assign_avatar
+
+        async def delete_owner_first(db, user_id, avatar_url):
+            # the owner's delete runs after the upload was stored, before it is referenced
+            orphaned_url = await user_service.delete_user(db, other["user"]["id"])
+            await avatars.delete_unreferenced_avatar(db, orphaned_url)
+            return await assign_avatar(db, user_id, avatar_url)
+
+        monkeypatch.setattr(avatars, "assign_avatar", delete_owner_first)
+        response = client.post(
+            "/auth/avatar",
+            headers={"Authorization": f"Bearer {registered_user['token']}"},
+            files={"file": ("avatar.png", PNG_BYTES, "image/png")},
+        )
+
+        assert response.status_code == 200
+        stored = avatar_dir / response.json()["data"]["avatar_url"].removeprefix("/static/avatars/")
+        assert stored.read_bytes() == PNG_BYTES
+        assert [path.name for path in avatar_dir.iterdir()] == [stored.parent.name]
+
+    @pytest.mark.anyio
+    async def test_reference_committed_during_delete_keeps_file(
+        self, db_session, avatar_dir, monkeypatch
+    ):
+        """An upload committed (and finished) while the files are being removed keeps them."""
+        from app.services import avatars
+
+        key = "ab/" + "ab" * 16 + ".png"
+        stored = avatar_dir / key
+        stored.parent.mkdir()
+        stored.write_bytes(PNG_BYTES)
+
+        set_aside = avatars._set_aside_avatar_files
+
+        def upload_commits_first(key):
+            # the new owner's reference lands after the first check; its
+            # finish_avatar saw the file still in place and dropped its spare
+            avatars._incref(db_session, key)
+            db_session.commit()
+            return set_aside(key)
+
+        monkeypatch.setattr(avatars, "_set_aside_avatar_files", upload_commits_first)
+        await avatars.delete_unreferenced_avatar(db_session, avatars.AVATAR_URL_PREFIX + key)
+
+        assert stored.read_bytes() == PNG_BYTES
+        assert [path.name for path in stored.parent.iterdir()] == [stored.name]
+
+    def test_content_addressed_avatar_is_immutable(self, client, registered_user, avatar_dir):
+        """Hash-named avatars are served with a year-long immutable Cache-Control."""
+        from starlette.applications import Starlette
+        from starlette.routing import Mount
+        from fastapi.testclient import TestClient
+        from app.core.static_files import AvatarFileServer, FileIndex
+
+        avatar_url = client.post(
+            "/auth/avatar",
+            headers={"Authorization": f"Bearer {registered_user['token']}"},
+            files={"file": ("avatar.png", PNG_BYTES, "image/png")},
+        ).json()["data"]["avatar_url"]
+
+        static_app = Starlette(routes=[
+            Mount("/static/avatars", AvatarFileServer(str(avatar_dir), index=FileIndex())),
+        ])
+        response = TestClient(static_app).get(avatar_url)
+
+        assert response.status_code == 200
+        assert response.content == PNG_BYTES
+        assert "immutable" in response.headers["Cache-Control"]
+
+    def test_avatar_rejects_non_image(self, client, registered_user, avatar_dir):
+        """Declared image/png with non-image bytes should return 400 fail."""
+        response = client.post(
+            "/auth/avatar",
+            headers={"Authorization": f"Bearer {registered_user['token']}"},
+            files={"file": ("avatar.png", b"not an image", "image/png")},
+        )
+
+        assert response.status_code == 400
+        assert response.json()["status"] == "fail"
+        assert list(avatar_dir.iterdir()) == []
+
+    def test_avatar_too_large(self, client, registered_user, avatar_dir, monkeypatch):
+        """Uploads over the size limit should return 413 and leave no file."""
+        from app.services import avatars
+
+        monkeypatch.setattr(avatars, "AVATAR_MAX_BYTES", 1024)
+        monkeypatch.setattr(avatars, "AVATAR_CHUNK_SIZE", 256)
+
+        response = client.post(
+            "/auth/avatar",
+            headers={"Authorization": f"Bearer {registered_user['token']}"},
+            files={"file": ("avatar.png", PNG_BYTES + b"\0" * 2048, "image/png")},
+        )
+
+        assert response.status_code == 413
+        assert list(avatar_dir.iterdir()) == []
+
+    def test_avatar_body_over_limit_rejected_early(self, client, registered_user, avatar_dir):
+        """A body past AVATAR_MAX_BYTES plus multipart framing gets 413 before it is parsed."""
+        from app.core.config import AVATAR_MAX_BYTES
+
+        response = client.post(
+            "/auth/avatar",
+            headers={"Authorization": f"Bearer {registered_user['token']}"},
+            files={"file": ("avatar.png", PNG_BYTES + b"\0" * (AVATAR_MAX_BYTES + 65536), "image/png")},
+        )
+
+        assert response.status_code == 413
+        assert response.json()["status"] == "fail"
+        assert list(avatar_dir.iterdir()) == []
+
 
 class TestDeleteUser:
     """Tests for DELETE /auth/me endpoint."""
@@ -0,0 +1,60 @@
+# tests/test_body_limit.py
+"""
+Tests for per-path request body caps (app/core/body_limit.py).
+"""
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app.core.body_limit import BodyLimitMiddleware
+from app.core.error_handlers import register_exception_handlers
+
+
+def make_client(limit: int) -> TestClient:
+    app = FastAPI()
+    register_exception_handlers(app)
+    app.add_middleware(BodyLimitMiddleware, limits={"/upload": limit})
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    @app.post("/other")
+    async def other(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+
+class TestBodyLimit:
+    """BodyLimitMiddleware"""
+
+    def test_under_limit_passes(self):
+        response = make_client(1024).post("/upload", files={"file": ("a", b"x" * 100)})
+        assert response.status_code == 200
+        assert response.json() == {"size": 100}
+
+    def test_content_length_over_limit_rejected_before_reading(self):
+        response = make_client(1024).post("/upload", files={"file": ("a", b"x" * 4096)})
+        assert response.status_code == 413
+        assert response.json()["status"] == "fail"
+
+    def test_streamed_body_cut_off(self):
+        def chunks():
+            yield b"--b\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a\"\r\n\r\n"
+            for _ in range(8):
+                yield b"x" * 512
+            yield b"\r\n--b--\r\n"
+
+        # no Content-Length: counted as it arrives
+        response = make_client(1024).post(
+            "/upload",
+            content=chunks(),
+            headers={"Content-Type": "multipart/form-data; boundary=b"},
+        )
+        assert response.status_code == 413
+        assert response.json()["status"] == "fail"
+
+    def test_other_paths_unlimited(self):
+        response = make_client(1024).post("/other", files={"file": ("a", b"x" * 4096)})
+        assert response.status_code == 200
@@ -0,0 +1,78 @@
+# tests/test_db_profiles.py
+"""
+Tests for DB connection profiles and the read/write split (app/db/base.py).
+"""
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.db import base
+
+
+@pytest.fixture
+def prod_profile(monkeypatch):
+    monkeypatch.setattr(base, "profile", base.DB_PROFILES["prod"])
+
+
+def _pragma(conn, name):
+    return conn.execute(text(f"PRAGMA {name}")).scalar()
+
+
+class TestPragmas:
+    """Pragmas are applied on every new connection."""
+
+    def test_prod_profile_pragmas(self, tmp_path, prod_profile):
+        engine = create_engine(f"sqlite:///{tmp_path}/prod.db")
+        base._apply_pragmas(engine)
+        with engine.connect() as conn:
+            assert _pragma(conn, "journal_mode") == "wal"
+            assert _pragma(conn, "synchronous") == 1  # NORMAL
+            assert _pragma(conn, "busy_timeout") == 5000
+            assert _pragma(conn, "cache_size") == -64000
+        engine.dispose()
+
+    def test_read_connections_are_query_only(self, tmp_path, prod_profile):
+        url = f"sqlite:///{tmp_path}/split.db"
+        writer = create_engine(url)
+        base._apply_pragmas(writer)
+        reader = create_engine(url)
+        base._apply_pragmas(reader, read_only=True)
+
+        with writer.begin() as conn:
+            conn.execute(text("CREATE TABLE t (x INTEGER)"))
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+
+        with reader.connect() as conn:
+            assert conn.execute(text("SELECT x FROM t")).scalar() == 1
+            with pytest.raises(OperationalError):
+                conn.execute(text("INSERT INTO t VALUES (2)"))
+        writer.dispose()
+        reader.dispose()
+
+    @pytest.mark.anyio
+    async def test_pragmas_on_async_engine(self, tmp_path, prod_profile):
+        pytest.importorskip("aiosqlite")
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/async.db")
+        base._apply_pragmas(engine.sync_engine)
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("PRAGMA journal_mode"))).scalar() == "wal"
+        await engine.dispose()
+
+
+class TestPoolSizes:
+    """Pools are sized per worker process."""
+
+    def test_more_workers_get_smaller_read_pools(self, monkeypatch):
+        monkeypatch.setattr(base.os, "cpu_count", lambda: 8)
+        assert base.pool_sizes(workers=1)["read"] == 32
+        assert base.pool_sizes(workers=8)["read"] == 4
+        assert base.pool_sizes(workers=64)["read"] == 2
+        assert 2 <= base.pool_sizes(workers=1)["write"] <= 4
+
+    def test_memory_database_skips_pool_sizes(self):
+        options = base._engine_options("sqlite://", 8)
+        assert "pool_size" not in options
+        assert "pool_size" in base._engine_options("sqlite:///x.db", 8)
@@ -0,0 +1,89 @@
+# tests/test_db_writer.py
+"""
+Tests for the group-commit writer (app/db/writer.py).
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.models import User
+from app.db.writer import GroupCommitWriter
+from app.services.users import IdentifierAlreadyUsedError, _insert_user
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path}/writer.db", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=engine)
+    engine.commits = 0
+
+    @event.listens_for(engine, "commit")
+    def _count(conn):
+        engine.commits += 1
+
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def writer(engine):
+    return GroupCommitWriter(
+        session_factory=sessionmaker(bind=engine, autoflush=False, expire_on_commit=False),
+        batch_size=16,
+        max_delay=0.05,
+    )
+
+
+def _identifiers(engine):
+    with sessionmaker(bind=engine)() as db:
+        return sorted(identifier for (identifier,) in db.query(User.identifier))
+
+
+class TestGroupCommit:
+    """Queued writes are committed together; each caller gets its own result."""
+
+    @pytest.mark.anyio
+    async def test_concurrent_writes_share_a_commit(self, engine, writer):
+        users = await asyncio.gather(*(
+            writer.submit(_insert_user, f"user{i}", "hash") for i in range(10)
+        ))
+        await writer.stop()
+
+        assert [user.identifier for user in users] == [f"user{i}" for i in range(10)]
+        assert len({user.id for user in users}) == 10
+        assert engine.commits == 1
+        assert writer.batches == 1
+        assert len(_identifiers(engine)) == 10
+
+    @pytest.mark.anyio
+    async def test_duplicate_fails_only_its_request(self, engine, writer):
+        results = await asyncio.gather(
+            writer.submit(_insert_user, "a", "hash"),
+            writer.submit(_insert_user, "dup", "hash"),
+            writer.submit(_insert_user, "dup", "hash"),
+            writer.submit(_insert_user, "b", "hash"),
+            return_exceptions=True,
+        )
+        await writer.stop()
+
+        errors = [r for r in results if isinstance(r, Exception)]
+        assert len(errors) == 1
+        assert isinstance(errors[0], IdentifierAlreadyUsedError)
+        assert _identifiers(engine) == ["a", "b", "dup"]
+
+    @pytest.mark.anyio
+    async def test_batches_bounded_by_size(self, engine, writer):
+        writer.batch_size = 4
+        await asyncio.gather(*(
+            writer.submit(_insert_user, f"user{i}", "hash") for i in range(10)
+        ))
+        await writer.stop()
+
+        assert writer.batches == 3
+        assert len(_identifiers(engine)) == 10
@@ -0,0 +1,55 @@
+# tests/test_hashing.py
+"""
+Unit tests for the password hashing service (app/core/hashing.py).
+"""
+
+import pytest
+
+from app.core.hashing import PasswordHasher, HashingBusyError, hasher
+from app.core.security import hash_password, verify_password
+
+
+class TestPasswordHasher:
+    """Tests for PasswordHasher backends and queue limit."""
+
+    @pytest.mark.anyio
+    async def test_process_backend_hash_and_verify(self):
+        """Process backend should produce hashes that verify."""
+        pool = PasswordHasher(backend="process", workers=1, max_queue=4)
+        try:
+            password_hash = await pool.run(hash_password, "secret123")
+            assert await pool.run(verify_password, "secret123", password_hash)
+            assert not await pool.run(verify_password, "wrong", password_hash)
+        finally:
+            pool.shutdown()
+
+    @pytest.mark.anyio
+    async def test_full_queue_rejects_job(self):
+        """Jobs beyond max_queue should be rejected immediately."""
+        pool = PasswordHasher(backend="thread", max_queue=0)
+
+        with pytest.raises(HashingBusyError):
+            await pool.run(hash_password, "secret123")
+        assert pool.rejected == 1
+        assert pool.pending == 0
+
+    def test_unknown_backend(self):
+        """Unknown backend name should fail fast."""
+        with pytest.raises(ValueError):
+            PasswordHasher(backend="gpu")
+
+
+class TestHashingBusyResponse:
+    """Full hashing queue should surface as JSend 503."""
+
+    def test_register_returns_503_when_queue_full(self, client, monkeypatch):
+        monkeypatch.setattr(hasher, "max_queue", 0)
+
+        response = client.post(
+            "/auth/register",
+            json={"identifier": "busy@example.com", "password": "password123"},
+        )
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert response.json()["status"] == "error"
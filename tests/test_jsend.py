@@ -0,0 +1,70 @@
+# tests/test_jsend.py
+"""
+Unit tests for JSend responses (app/core/jsend.py).
+"""
+
+import json
+
+import pytest
+
+from app.core import jsend
+from app.schemas.responses import AuthData, TokenData, UserData
+
+
+class _Row:
+    """Stand-in for a User row."""
+    id = 7
+    identifier = "jürgen@example.com"
+    avatar_url = None
+
+
+@pytest.fixture(params=["orjson", "stdlib"])
+def encoder(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(jsend, "orjson", None)
+    elif jsend.orjson is None:
+        pytest.skip("orjson not installed")
+    return request.param
+
+
+class TestEncode:
+    """Both encoders produce the same compact UTF-8 JSON."""
+
+    def test_dict(self, encoder):
+        content = {"status": "fail", "data": {"identifier": "jürgen", "n": [1, 2.5, None, True]}}
+        expected = json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+        assert jsend.encode_json(content) == expected
+
+    def test_model_nested_in_dict(self, encoder):
+        body = jsend.encode_json({"token": TokenData(access_token="abc")})
+        assert json.loads(body) == {"token": {"access_token": "abc", "token_type": "bearer"}}
+
+    def test_bytes_pass_through(self, encoder):
+        assert jsend.encode_json(b'{"a":1}') == b'{"a":1}'
+
+
+class TestResponses:
+    """jsend_* helpers build complete responses."""
+
+    def test_success_with_model(self, encoder):
+        data = AuthData(user=UserData.model_validate(_Row()), token=TokenData(access_token="abc"))
+        response = jsend.jsend_success(data, http_status=201)
+
+        assert response.status_code == 201
+        assert response.headers["content-type"] == "application/json"
+        assert json.loads(response.body) == {
+            "status": "success",
+            "data": {
+                "user": {"id": 7, "identifier": "jürgen@example.com", "avatar_url": None, "avatars": {}},
+                "token": {"access_token": "abc", "token_type": "bearer"},
+            },
+        }
+
+    def test_fail_and_error(self, encoder):
+        fail = jsend.jsend_fail({"file": "bad"}, http_status=413)
+        assert fail.status_code == 413
+        assert json.loads(fail.body) == {"status": "fail", "data": {"file": "bad"}}
+
+        error = jsend.jsend_error("busy", http_status=503, headers={"Retry-After": "1"})
+        assert error.headers["retry-after"] == "1"
+        assert json.loads(error.body) == {"status": "error", "message": "busy"}
@@ -0,0 +1,140 @@
+# tests/test_metrics.py
+"""
+Tests for the metrics subsystem (app/core/metrics.py) and GET /metrics.
+"""
+
+import time
+
+import pytest
+from fastapi import BackgroundTasks, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.core.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsMiddleware,
+    MetricsRegistry,
+    http_request_duration,
+)
+from app.db.base import _time_queries, db_query_duration
+
+from tests.test_auth_api import PNG_BYTES
+
+
+def parse(exposition: str) -> dict:
+    """Sample lines -> {'name{labels}': value}."""
+    samples = {}
+    for line in exposition.splitlines():
+        if line and not line.startswith("#"):
+            key, _, value = line.rpartition(" ")
+            samples[key] = float(value)
+    return samples
+
+
+class TestMetricTypes:
+    """Recording and the text format, on a private registry."""
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        histogram = Histogram("op_seconds", "Op time.", ("op",), registry=registry, buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.labels("read").observe(value)
+
+        samples = parse(registry.render())
+        assert samples['op_seconds_bucket{op="read",le="0.1"}'] == 2
+        assert samples['op_seconds_bucket{op="read",le="1"}'] == 3
+        assert samples['op_seconds_bucket{op="read",le="+Inf"}'] == 4
+        assert samples['op_seconds_count{op="read"}'] == 4
+        assert samples['op_seconds_sum{op="read"}'] == pytest.approx(3.65)
+        assert "# TYPE op_seconds histogram" in registry.render()
+
+    def test_counter_gauge_and_callbacks(self):
+        registry = MetricsRegistry()
+        counter = Counter("jobs_total", "Jobs.", ("kind",), registry=registry)
+        counter.labels('say "hi"\n').inc()
+        counter.labels('say "hi"\n').inc(2)
+        gauge = Gauge("level", "Level.", registry=registry)
+        gauge.set(7)
+        Gauge("open", "Open things.", registry=registry, fn=lambda: 3)
+
+        samples = parse(registry.render())
+        assert samples['jobs_total{kind="say \\"hi\\"\\n"}'] == 3
+        assert samples["level"] == 7
+        assert samples["open"] == 3
+
+    def test_invalid_use(self):
+        registry = MetricsRegistry()
+        histogram = Histogram("dup", "Dup.", ("a",), registry=registry)
+        with pytest.raises(ValueError):
+            Histogram("dup", "Again.", registry=registry)
+        with pytest.raises(ValueError):
+            histogram.labels("x", "y")
+        with pytest.raises(ValueError):
+            Gauge("cb", "Callback.", ("a",), registry=registry, fn=lambda: 1)
+
+
+class TestQueryTiming:
+    """SQLAlchemy events time every statement per pool."""
+
+    def test_statements_are_timed(self):
+        engine = create_engine("sqlite://")
+        _time_queries(engine, "test")
+        before = sum(db_query_duration.labels("test").counts)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            with pytest.raises(Exception):
+                conn.execute(text("SELECT * FROM missing"))
+            conn.execute(text("SELECT 2"))
+        assert sum(db_query_duration.labels("test").counts) == before + 2
+        engine.dispose()
+
+
+class TestMetricsEndpoint:
+    """GET /metrics reflects requests, hashing and WebSocket traffic."""
+
+    def test_request_latency_by_route_template(self, client):
+        client.get("/health/")
+        client.get("/no/such/path")
+        response = client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        samples = parse(response.text)
+        key = 'http_request_duration_seconds_count{method="GET",route="/health/",status="200"}'
+        assert samples[key] >= 1
+        assert samples['http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}'] >= 1
+
+    def test_background_tasks_are_not_request_time(self):
+        app = FastAPI()
+        app.add_middleware(MetricsMiddleware)
+
+        @app.get("/background-probe")
+        def probe(background_tasks: BackgroundTasks):
+            background_tasks.add_task(time.sleep, 0.3)
+            return {}
+
+        with TestClient(app) as client:
+            assert client.get("/background-probe").status_code == 200
+
+        samples = parse("\n".join(http_request_duration.samples()))
+        labels = '{method="GET",route="/background-probe",status="200"}'
+        assert samples["http_request_duration_seconds_count" + labels] == 1
+        assert samples["http_request_duration_seconds_sum" + labels] < 0.3
+
+    def test_hashing_and_ws_metrics(self, client, registered_user, avatar_dir):
+        client.post("/auth/login", json=registered_user["credentials"])
+        headers = {"Authorization": f"Bearer {registered_user['token']}"}
+        with client.websocket_connect(f"/ws?token={registered_user['token']}") as ws:
+            client.post("/auth/avatar", files={"file": ("a.png", PNG_BYTES, "image/png")}, headers=headers)
+            ws.receive_json()
+            samples = parse(client.get("/metrics").text)
+
+        assert samples["ws_connections_active"] == 1
+        assert samples["ws_fanout_duration_seconds_count"] >= 1
+        assert samples["ws_send_duration_seconds_count"] >= 1
+        assert samples["avatar_write_duration_seconds_count"] >= 1
+        assert samples['password_hash_duration_seconds_count{op="hash"}'] >= 1
+        assert samples['password_hash_duration_seconds_count{op="verify"}'] >= 1
+        assert "password_hash_pending" in samples
@@ -0,0 +1,153 @@
+# tests/test_profiler.py
+"""
+Tests for the request profiler (app/core/profiler.py) and the
+/admin/profiles endpoints.
+"""
+
+import time
+from collections import deque
+
+import httpx
+import pytest
+from anyio import to_thread
+from sqlalchemy import create_engine, text
+
+from app.core import profiler as profiler_module
+from app.core.profiler import ProfilerMiddleware, RequestProfiler
+from app.db.base import _time_queries
+from app.main import create_app
+
+from tests.test_admin_api import admin_headers  # noqa: F401  (fixture)
+
+
+def burn(seconds: float) -> None:
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def make_app(sleep: float):
+    """ASGI app burning CPU in a worker thread for `sleep` seconds."""
+    async def app(scope, receive, send):
+        await to_thread.run_sync(burn, sleep)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return app
+
+
+async def _get(app, path: str = "/") -> None:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.get(path)).status_code == 200
+
+
+class TestRequestProfiler:
+    """Capture decisions, stack samples and the ring buffer."""
+
+    def test_disabled_by_default(self):
+        profiler = RequestProfiler()
+        assert not profiler.enabled
+        assert profiler.start("GET", "/") is None
+        app = create_app()
+        assert ProfilerMiddleware not in [m.cls for m in app.user_middleware]
+
+    @pytest.mark.anyio
+    async def test_sampled_request_has_stacks(self):
+        profiler = RequestProfiler(sample_rate=1.0, interval=0.001)
+        await _get(ProfilerMiddleware(make_app(0.05), profiler=profiler), "/work")
+
+        (capture,) = profiler.captures
+        assert capture["reason"] == "sampled" and capture["path"] == "/work"
+        assert capture["status"] == 200 and capture["duration_ms"] >= 50
+        assert capture["ticks"] > 0
+        assert any("tests.test_profiler:burn" in row["stack"] for row in capture["stacks"])
+
+    @pytest.mark.anyio
+    async def test_only_slow_requests_are_kept(self):
+        profiler = RequestProfiler(slow_ms=30, interval=0.001, max_captures=2)
+        app = ProfilerMiddleware(make_app(0.0), profiler=profiler)
+        await _get(app)
+        assert list(profiler.captures) == []
+
+        slow = ProfilerMiddleware(make_app(0.04), profiler=profiler)
+        for _ in range(3):
+            await _get(slow)
+        # ring buffer keeps the last two
+        assert [c["reason"] for c in profiler.captures] == ["slow", "slow"]
+        assert profiler.captures[0]["id"] < profiler.captures[1]["id"]
+
+    @pytest.mark.anyio
+    async def test_work_after_the_response_is_not_counted(self):
+        """Background tasks run after the last body message: not slow, not captured."""
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+            await to_thread.run_sync(burn, 0.05)
+
+        profiler = RequestProfiler(slow_ms=30, interval=0.001)
+        await _get(ProfilerMiddleware(app, profiler=profiler))
+        assert list(profiler.captures) == []
+
+    def test_sql_goes_to_the_current_capture(self, monkeypatch):
+        monkeypatch.setattr(profiler_module.profiler, "sample_rate", 1.0)
+        engine = create_engine("sqlite://")
+        _time_queries(engine, "test")
+
+        recording = profiler_module.profiler.start("GET", "/")
+        token = profiler_module._current.set(recording)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 42"))
+        finally:
+            profiler_module._current.reset(token)
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 43"))  # outside any request
+        profiler_module.profiler.finish(recording, 200, "/")
+
+        statements = [row["statement"] for row in recording.sql]
+        assert statements == ["SELECT 42"]
+        engine.dispose()
+
+
+@pytest.fixture
+def captures(monkeypatch):
+    """A fresh ring buffer with one capture on the global profiler."""
+    profiler = profiler_module.profiler
+    monkeypatch.setattr(profiler, "captures", deque(maxlen=10))
+    monkeypatch.setattr(profiler, "sample_rate", 1.0)
+    # built directly: profiler.start() would wake the sampler thread,
+    # which adds live stacks of its own
+    recording = profiler_module.Recording(1, "POST", "/auth/login", sampled=True)
+    recording.samples.update({"MainThread;app.main:f": 3, "MainThread;app.main:g": 1})
+    recording.add_sql("SELECT 1", 0.002)
+    profiler.finish(recording, 200, "/auth/login")
+    return profiler.captures
+
+
+class TestProfilesApi:
+    """Tests for GET /admin/profiles."""
+
+    def test_requires_admin(self, client, registered_user, captures):
+        headers = {"Authorization": f"Bearer {registered_user['token']}"}
+        assert client.get("/admin/profiles", headers=headers).status_code == 403
+
+    def test_list_and_detail(self, client, admin_headers, captures):  # noqa: F811
+        body = client.get("/admin/profiles", headers=admin_headers).json()
+        assert body["status"] == "success" and body["data"]["enabled"] is True
+        (summary,) = body["data"]["profiles"]
+        assert summary["route"] == "/auth/login"
+        assert summary["sql_count"] == 1 and summary["sql_ms"] == 2.0
+
+        detail = client.get(f"/admin/profiles/{summary['id']}", headers=admin_headers).json()["data"]
+        assert detail["stacks"][0] == {"stack": "MainThread;app.main:f", "count": 3}
+        assert detail["sql"] == [{"statement": "SELECT 1", "duration_ms": 2.0}]
+
+        collapsed = client.get(
+            f"/admin/profiles/{summary['id']}", params={"format": "collapsed"}, headers=admin_headers
+        )
+        assert collapsed.text == "MainThread;app.main:f 3\nMainThread;app.main:g 1\n"
+
+    def test_unknown_capture(self, client, admin_headers, captures):  # noqa: F811
+        response = client.get("/admin/profiles/999999", headers=admin_headers)
+        assert response.status_code == 404
+        assert response.json()["status"] == "fail"
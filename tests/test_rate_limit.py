@@ -0,0 +1,100 @@
+# tests/test_rate_limit.py
+"""
+Tests for login/register rate limiting (app/core/rate_limit.py).
+"""
+
+import pytest
+
+from app.core.rate_limit import (
+    MemoryBucketStore,
+    Rule,
+    SqliteBucketStore,
+    auth_limiter,
+    client_key,
+)
+from app.services import users as user_service
+
+
+class TestBuckets:
+    """Token bucket math and the stores."""
+
+    def test_burst_then_refill(self):
+        store = MemoryBucketStore()
+        rule = Rule(burst=3, per_minute=60)  # one token per second
+        buckets = [("k", rule)]
+
+        assert [store.take_now(buckets, 100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert store.take_now(buckets, 100.0) == pytest.approx(1.0)
+        assert store.take_now(buckets, 100.5) == pytest.approx(0.5)
+        assert store.take_now(buckets, 101.0) == 0.0
+
+    def test_refused_attempt_charges_nothing(self):
+        store = MemoryBucketStore()
+        loose, tight = Rule(10, 60), Rule(1, 60)
+        assert store.take_now([("ip", loose), ("id", tight)], 100.0) == 0.0
+        for _ in range(5):
+            assert store.take_now([("ip", loose), ("id", tight)], 100.0) > 0
+        # only the first attempt took a token from the IP bucket
+        assert [store.take_now([("ip", loose)], 100.0) for _ in range(9)] == [0.0] * 9
+
+    def test_full_buckets_expire_and_size_is_bounded(self):
+        store = MemoryBucketStore(max_keys=2)
+        rule = Rule(5, 60)
+        store.take_now([("a", rule)], 100.0)
+        store.take_now([("b", rule)], 100.0)
+        # "a" and "b" are full again by now
+        store.take_now([("c", rule)], 200.0)
+        assert len(store) == 1 and store.evictions == 0
+
+        store.take_now([("d", rule)], 200.0)
+        store.take_now([("e", rule)], 200.0)
+        assert len(store) == 2 and store.evictions == 1
+
+    def test_sqlite_store_is_shared(self, tmp_path):
+        path = str(tmp_path / "limits.db")
+        first, second = SqliteBucketStore(path), SqliteBucketStore(path)
+        rule = Rule(2, 60)
+        try:
+            assert first.take_now([("k", rule)], 100.0) == 0.0
+            assert second.take_now([("k", rule)], 100.0) == 0.0
+            assert first.take_now([("k", rule)], 100.0) == pytest.approx(1.0)
+        finally:
+            first.close()
+            second.close()
+
+    def test_client_key(self):
+        assert client_key("203.0.113.7") == "203.0.113.7"
+        assert client_key("::ffff:203.0.113.7") == "203.0.113.7"
+        assert client_key("2001:db8::1") == client_key("2001:db8::ffff") == "2001:db8::/64"
+        assert client_key(None) is None
+
+
+class TestAuthRateLimit:
+    """Limits through /auth/login and /auth/register."""
+
+    def test_login_refused_before_hashing(self, client, registered_user, monkeypatch):
+        monkeypatch.setattr(auth_limiter, "identifier", Rule(2, 1))
+        auth_limiter.reset()  # registering took a token too
+        credentials = registered_user["credentials"]
+        for _ in range(2):
+            assert client.post("/auth/login", json=credentials).status_code == 200
+
+        async def no_hashing(*args, **kwargs):
+            raise AssertionError("authenticate_user called")
+
+        monkeypatch.setattr(user_service, "authenticate_user", no_hashing)
+        response = client.post("/auth/login", json=credentials)
+        assert response.status_code == 429
+        assert response.json()["status"] == "fail"
+        assert "rate_limit" in response.json()["data"]
+        assert 1 <= int(response.headers["Retry-After"]) <= 60
+
+    def test_register_limited_per_ip(self, client, monkeypatch):
+        monkeypatch.setattr(auth_limiter, "ip", Rule(2, 1))
+        statuses = [
+            client.post(
+                "/auth/register", json={"identifier": f"burst{i}", "password": "password123"}
+            ).status_code
+            for i in range(3)
+        ]
+        assert statuses == [201, 201, 429]
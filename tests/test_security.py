@@ -0,0 +1,62 @@
+# tests/test_security.py
+"""
+Unit tests for JWT helpers (app/core/security.py) and the verified-token cache.
+"""
+
+import time
+
+from app.core.security import create_access_token, decode_access_token
+from app.core.token_cache import MISS, TokenCache, token_cache
+
+
+class TestDecodeAccessToken:
+    """Tests for decode_access_token with memoization."""
+
+    def setup_method(self):
+        token_cache.clear()
+
+    def test_valid_token_is_memoized(self):
+        token = create_access_token(subject="42")
+        before = token_cache.stats()
+
+        assert decode_access_token(token) == "42"
+        assert decode_access_token(token) == "42"
+
+        stats = token_cache.stats()
+        assert stats["misses"] - before["misses"] == 1
+        assert stats["hits"] - before["hits"] == 1
+
+    def test_expired_token_rejected(self):
+        token = create_access_token(subject="42", expires_minutes=-1)
+
+        assert decode_access_token(token) is None
+        assert decode_access_token(token) is None
+
+    def test_tampered_token_rejected(self):
+        token = create_access_token(subject="42")
+
+        assert decode_access_token(token[:-2] + "xx") is None
+
+
+class TestTokenCache:
+    """Unit tests for TokenCache expiry rules."""
+
+    def test_entry_not_served_after_exp(self):
+        cache = TokenCache(max_size=10)
+        cache.put("token", "42", exp=time.time() - 0.001)
+
+        assert cache.get("token") is MISS
+
+    def test_negative_entries_are_short_lived(self):
+        cache = TokenCache(max_size=10, negative_ttl_seconds=0)
+        cache.put_invalid("bad")
+
+        assert cache.get("bad") is MISS
+
+    def test_size_bound(self):
+        cache = TokenCache(max_size=2)
+        for i in range(3):
+            cache.put(f"t{i}", str(i), exp=time.time() + 60)
+
+        assert cache.get("t0") is MISS
+        assert cache.stats()["size"] == 2
@@ -0,0 +1,93 @@
+# tests/test_startup.py
+"""
+Tests for the app factory (app/main.py) and the schema bootstrap
+(app/db/bootstrap.py).
+"""
+
+import os
+import subprocess
+import sys
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, inspect
+
+from app.core.config import Settings
+from app.db import bootstrap as bootstrap_module
+from app.db.bootstrap import bootstrap, sqlite_directory
+from app.main import create_app
+
+
+class TestImport:
+    """Importing app.main builds nothing and touches no files."""
+
+    def test_import_is_side_effect_free(self, tmp_path):
+        code = (
+            "import sys, app.main\n"
+            "heavy = ('app.api.v1.auth', 'app.db.base', 'jose', 'passlib', 'PIL')\n"
+            "print(','.join(m for m in heavy if m in sys.modules))\n"
+        )
+        env = dict(
+            os.environ,
+            DATABASE_URL=f"sqlite:///{tmp_path}/data/app.db",
+            AVATAR_DIR=str(tmp_path / "avatars"),
+            DB_PROFILE="dev",
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True
+        ).stdout
+        assert out.strip() == ""
+        assert os.listdir(tmp_path) == []
+
+    def test_app_attribute_is_built_once(self):
+        import app.main
+
+        assert app.main.app is app.main.app
+
+
+class TestCreateApp:
+    """create_app(settings) wires routes, mounts and the lifespan."""
+
+    def test_settings_are_applied(self, tmp_path, monkeypatch):
+        calls = []
+        monkeypatch.setattr(bootstrap_module, "bootstrap", lambda *args: calls.append(args))
+        (tmp_path / "static").mkdir()
+        (tmp_path / "static" / "hello.txt").write_text("hi")
+
+        settings = Settings(
+            bootstrap_schema=True,
+            static_dir=str(tmp_path / "static"),
+            cors_origins=("https://example.com",),
+        )
+        with TestClient(create_app(settings)) as client:
+            assert client.get("/static/hello.txt").text == "hi"
+            response = client.get("/health/", headers={"Origin": "https://example.com"})
+            assert response.headers["access-control-allow-origin"] == "https://example.com"
+
+        assert len(calls) == 1
+
+    def test_no_bootstrap_by_default_outside_dev(self, monkeypatch):
+        calls = []
+        monkeypatch.setattr(bootstrap_module, "bootstrap", lambda *args: calls.append(args))
+        # the test suite runs with DB_PROFILE=test
+        with TestClient(create_app()) as client:
+            assert client.get("/health/").status_code == 200
+        assert calls == []
+
+
+class TestBootstrap:
+    """The explicit schema step creates tables and directories."""
+
+    def test_creates_tables_and_directories(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path}/nested/data/app.db")
+        bootstrap(engine, avatar_dir=str(tmp_path / "avatars"))
+        bootstrap(engine, avatar_dir=str(tmp_path / "avatars"))  # idempotent
+
+        assert {"users", "avatar_blobs"} <= set(inspect(engine).get_table_names())
+        assert (tmp_path / "avatars").is_dir()
+        engine.dispose()
+
+    def test_sqlite_directory(self):
+        assert sqlite_directory("sqlite:///./data/dev.db") == "./data"
+        assert sqlite_directory("sqlite:///dev.db") is None
+        assert sqlite_directory("sqlite://") is None
+        assert sqlite_directory("postgresql://user@host/db") is None
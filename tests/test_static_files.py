@@ -0,0 +1,92 @@
+# tests/test_static_files.py
+"""
+Tests for the avatar file server (app/core/static_files.py).
+"""
+
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+from app.core.static_files import AvatarFileServer, FileIndex
+
+DIGEST = "3fa9c0d2b1e84f7a9c0d2b1e84f7a9e1"
+KEY = f"3f/{DIGEST}.png"
+CONTENT = bytes(range(256)) * 4
+
+
+@pytest.fixture
+def files(tmp_path):
+    os.makedirs(tmp_path / "3f")
+    (tmp_path / KEY).write_bytes(CONTENT)
+    (tmp_path / "user_1_legacy.png").write_bytes(CONTENT)
+    (tmp_path / ".upload-abc.part").write_bytes(b"partial")
+    index = FileIndex()
+    app = Starlette(routes=[Mount("/static/avatars", AvatarFileServer(str(tmp_path), index=index))])
+    return TestClient(app), index, tmp_path
+
+
+class TestAvatarFileServer:
+    """Conditional GET, ranges and caching headers."""
+
+    def test_full_get(self, files):
+        client, _, _ = files
+        response = client.get(f"/static/avatars/{KEY}")
+
+        assert response.status_code == 200
+        assert response.content == CONTENT
+        assert response.headers["content-type"] == "image/png"
+        assert response.headers["etag"] == f'"{DIGEST}"'
+        assert "immutable" in response.headers["cache-control"]
+
+    def test_if_none_match_served_from_index(self, files, monkeypatch):
+        """A repeat conditional GET is answered 304 without touching the disk."""
+        client, index, _ = files
+        etag = client.get(f"/static/avatars/{KEY}").headers["etag"]
+
+        def no_stat(*args, **kwargs):
+            raise AssertionError("stat called")
+
+        monkeypatch.setattr(os, "stat", no_stat)
+        response = client.get(f"/static/avatars/{KEY}", headers={"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert index.hits == 1
+
+    def test_range_request(self, files):
+        client, _, _ = files
+        response = client.get(f"/static/avatars/{KEY}", headers={"Range": "bytes=10-19"})
+
+        assert response.status_code == 206
+        assert response.content == CONTENT[10:20]
+        assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+
+    def test_unsatisfiable_range(self, files):
+        client, _, _ = files
+        response = client.get(f"/static/avatars/{KEY}", headers={"Range": "bytes=5000-"})
+
+        assert response.status_code == 416
+
+    def test_legacy_name_revalidates(self, files):
+        client, _, _ = files
+        response = client.get("/static/avatars/user_1_legacy.png")
+
+        assert response.status_code == 200
+        assert "immutable" not in response.headers["cache-control"]
+
+    def test_hidden_and_missing_files_404(self, files):
+        client, _, _ = files
+
+        assert client.get("/static/avatars/.upload-abc.part").status_code == 404
+        assert client.get("/static/avatars/../secret.txt").status_code == 404
+        assert client.get("/static/avatars/ff/missing.png").status_code == 404
+
+    def test_deleted_file_evicted(self, files):
+        client, index, tmp_path = files
+        client.get(f"/static/avatars/{KEY}")
+        os.remove(tmp_path / KEY)
+
+        assert client.get(f"/static/avatars/{KEY}").status_code == 404
+        assert index.get(KEY) is None
@@ -0,0 +1,64 @@
+# tests/test_user_cache.py
+"""
+Tests for the authenticated-user cache (app/core/user_cache.py).
+"""
+
+from app.core.user_cache import CachedUser, UserCache, user_cache
+
+# Rejected by upload validation, so nothing is written to static/avatars
+NOT_AN_IMAGE = {"file": ("notes.txt", b"hello", "text/plain")}
+
+
+class TestUserCache:
+    """Unit tests for UserCache."""
+
+    def test_lru_eviction(self):
+        """Least recently used entry should be evicted when full."""
+        cache = UserCache(max_size=2, ttl_seconds=60)
+        for user_id in (1, 2):
+            cache.put(CachedUser(user_id, f"user{user_id}"), cache.epoch)
+        cache.get(1)
+        cache.put(CachedUser(3, "user3"), cache.epoch)
+
+        assert cache.get(2) is None
+        assert cache.get(1).identifier == "user1"
+        assert cache.stats()["evictions"] == 1
+
+    def test_stale_load_not_stored(self):
+        """A load that raced with an invalidation should not be cached."""
+        cache = UserCache(max_size=10, ttl_seconds=60)
+        epoch = cache.epoch
+        cache.invalidate(1)
+        cache.put(CachedUser(1, "old"), epoch)
+
+        assert cache.get(1) is None
+
+    def test_expired_entry_is_miss(self):
+        cache = UserCache(max_size=10, ttl_seconds=0.0001)
+        cache._entries[1] = (0.0, CachedUser(1, "user1"))
+
+        assert cache.get(1) is None
+        assert cache.misses == 1
+
+
+class TestCurrentUserCache:
+    """Cache behaviour through the API."""
+
+    def test_repeated_requests_hit_cache(self, client, registered_user):
+        headers = {"Authorization": f"Bearer {registered_user['token']}"}
+        before = user_cache.stats()
+        for _ in range(2):
+            response = client.post("/auth/avatar", headers=headers, files=NOT_AN_IMAGE)
+            assert response.status_code == 400
+
+        stats = client.get("/health/caches").json()["data"]["user_cache"]
+        assert stats["misses"] - before["misses"] == 1
+        assert stats["hits"] - before["hits"] == 1
+
+    def test_deleted_user_token_fails_immediately(self, client, registered_user):
+        headers = {"Authorization": f"Bearer {registered_user['token']}"}
+        client.post("/auth/avatar", headers=headers, files=NOT_AN_IMAGE)  # warm cache
+
+        assert client.delete("/auth/me", headers=headers).status_code == 200
+        assert client.delete("/auth/me", headers=headers).status_code == 401
+        assert user_cache.get(registered_user["user"]["id"]) is None
@@ -0,0 +1,111 @@
+# tests/test_user_tools.py
+"""
+Tests for the bulk import/export CLI (app/tools/users.py).
+"""
+
+import io
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.security import hash_password, verify_password
+from app.db.base import Base
+from app.db.models import AvatarBlob, User
+from app.services.users import iter_users
+from app.tools import users as tools
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    """Point the CLI at a fresh SQLite file."""
+    engine = create_engine(f"sqlite:///{tmp_path}/tools.db")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(tools, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+def _ndjson(*records):
+    return io.StringIO("".join(json.dumps(r) + "\n" for r in records))
+
+
+class TestParseRecord:
+    """Import records are validated like /auth/register."""
+
+    def test_plain_password(self):
+        row = tools.parse_record({"identifier": "alice", "password": "secret123"})
+        assert row["password"] == "secret123" and row["password_hash"] is None
+
+    def test_prehashed_password(self):
+        password_hash = hash_password("secret123")
+        row = tools.parse_record({"identifier": "alice", "password_hash": password_hash})
+        assert row["password_hash"] == password_hash and row["password"] is None
+
+    @pytest.mark.parametrize("record", [
+        None,
+        {"identifier": "alice"},
+        {"identifier": "al", "password": "secret123"},
+        {"identifier": "alice", "password": "short"},
+        {"identifier": "alice", "password_hash": "not-a-hash"},
+        {"identifier": "alice", "password": "secret123", "avatar_url": "/static/avatars/../../app/main.py"},
+        {"identifier": "alice", "password": "secret123", "avatar_url": "/static/avatars/ab/.upload-x.part"},
+        {"identifier": "alice", "password": "secret123", "avatar_url": ".."},
+        {"identifier": "alice", "password": "secret123", "avatar_url": 42},
+    ])
+    def test_invalid(self, record):
+        with pytest.raises(tools.InvalidRecordError):
+            tools.parse_record(record)
+
+
+class TestImportExport:
+    """Batched import and streaming export."""
+
+    def test_import_ndjson(self, sessions):
+        errors = io.StringIO()
+        records = tools.read_records(_ndjson(
+            {"identifier": "alice", "password": "secret123"},
+            {"identifier": "bob", "password_hash": hash_password("hunter22")},
+            {"identifier": "alice", "password": "other-password"},
+            {"identifier": "x"},
+            {"identifier": "carol", "password": "secret123", "avatar_url": "/static/avatars/ab/abc.png"},
+        ), "ndjson")
+
+        stats = tools.import_users(records, batch_size=2, workers=1, errors=errors)
+
+        assert (stats.read, stats.inserted, stats.skipped, stats.invalid) == (5, 3, 1, 1)
+        assert "record 4" in errors.getvalue()
+        with sessions() as db:
+            alice = db.query(User).filter(User.identifier == "alice").one()
+            assert verify_password("secret123", alice.password_hash)
+            bob = db.query(User).filter(User.identifier == "bob").one()
+            assert verify_password("hunter22", bob.password_hash)
+            assert db.get(AvatarBlob, "ab/abc.png").refcount == 1
+
+    def test_export_roundtrip_csv(self, sessions, tmp_path, monkeypatch):
+        tools.import_users(
+            tools.read_records(_ndjson(
+                {"identifier": "alice", "password": "secret123"},
+                {"identifier": "bob", "password": "secret456"},
+            ), "ndjson"),
+            workers=1,
+        )
+        out = io.StringIO()
+        with sessions() as db:
+            assert tools.write_records(out, "csv", iter_users(db, batch_size=1)) == 2
+        out.seek(0)
+
+        # import the export into another database: hashes are kept as is
+        engine = create_engine(f"sqlite:///{tmp_path}/other.db")
+        Base.metadata.create_all(bind=engine)
+        monkeypatch.setattr(tools, "SessionLocal", sessionmaker(bind=engine))
+        stats = tools.import_users(tools.read_records(out, "csv"), workers=1)
+
+        assert stats.inserted == 2 and stats.invalid == 0
+        with sessionmaker(bind=engine)() as db:
+            alice = db.query(User).filter(User.identifier == "alice").one()
+            assert verify_password("secret123", alice.password_hash)
+            assert alice.avatar_url is None
+        engine.dispose()
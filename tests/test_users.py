@@ -16,9 +16,10 @@ from app.services.users import (
 class TestCreateUser:
     """Tests for create_user service function."""
 
-    def test_create_user_success(self, db_session):
+    @pytest.mark.anyio
+    async def test_create_user_success(self, db_session):
         """create_user should create a user row in the database."""
-        user = create_user(
+        user = await create_user(
             db=db_session,
             identifier="newuser@example.com",
             password="password123",
@@ -30,10 +31,11 @@ class TestCreateUser:
         assert user.password_hash is not None
         assert user.password_hash != "password123"  # Should be hashed
 
-    def test_create_user_duplicate_raises_error(self, db_session):
+    @pytest.mark.anyio
+    async def test_create_user_duplicate_raises_error(self, db_session):
         """create_user should raise IdentifierAlreadyUsedError for duplicate identifier."""
         # Create first user
-        create_user(
+        await create_user(
             db=db_session,
             identifier="duplicate@example.com",
             password="password123",
@@ -41,7 +43,7 @@ class TestCreateUser:
 
         # Attempt to create duplicate
         with pytest.raises(IdentifierAlreadyUsedError):
-            create_user(
+            await create_user(
                 db=db_session,
                 identifier="duplicate@example.com",
                 password="different_password",
@@ -51,17 +53,18 @@ class TestCreateUser:
 class TestAuthenticateUser:
     """Tests for authenticate_user service function."""
 
-    def test_authenticate_user_success(self, db_session):
+    @pytest.mark.anyio
+    async def test_authenticate_user_success(self, db_session):
         """authenticate_user should return user when password is correct."""
         # Create user first
-        create_user(
+        await create_user(
             db=db_session,
             identifier="auth_test@example.com",
             password="correctpassword",
         )
 
         # Authenticate with correct password
-        user = authenticate_user(
+        user = await authenticate_user(
             db=db_session,
             identifier="auth_test@example.com",
             password="correctpassword",
@@ -70,17 +73,18 @@ class TestAuthenticateUser:
         assert user is not None
         assert user.identifier == "auth_test@example.com"
 
-    def test_authenticate_user_wrong_password(self, db_session):
+    @pytest.mark.anyio
+    async def test_authenticate_user_wrong_password(self, db_session):
         """authenticate_user should return None when password is wrong."""
         # Create user first
-        create_user(
+        await create_user(
             db=db_session,
             identifier="auth_fail@example.com",
             password="correctpassword",
         )
 
         # Authenticate with wrong password
-        user = authenticate_user(
+        user = await authenticate_user(
             db=db_session,
             identifier="auth_fail@example.com",
             password="wrongpassword",
@@ -88,9 +92,10 @@ class TestAuthenticateUser:
 
         assert user is None
 
-    def test_authenticate_user_nonexistent(self, db_session):
+    @pytest.mark.anyio
+    async def test_authenticate_user_nonexistent(self, db_session):
         """authenticate_user should return None for non-existent user."""
-        user = authenticate_user(
+        user = await authenticate_user(
             db=db_session,
             identifier="nonexistent@example.com",
             password="anypassword",
@@ -0,0 +1,92 @@
+# tests/test_users_api.py
+"""
+API tests for user lookup (app/api/v1/users.py).
+"""
+
+import pytest
+from sqlalchemy import event
+
+from app.api.v1 import users as users_api
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 100
+
+
+@pytest.fixture
+def people(client):
+    """Registered users: name -> (id, auth headers)."""
+    found = {}
+    for name in ("ann", "ben", "cyd"):
+        response = client.post("/auth/register", json={"identifier": name, "password": "secret123"})
+        data = response.json()["data"]
+        found[name] = (data["user"]["id"], {"Authorization": f"Bearer {data['token']['access_token']}"})
+    return found
+
+
+class TestUserBatch:
+    """GET /users?ids="""
+
+    def test_users_in_requested_order_with_missing(self, client, people):
+        ann, ben, cy = (people[name][0] for name in ("ann", "ben", "cyd"))
+        response = client.get(
+            "/users", params={"ids": f"{cy},999999,{ann},{cy}"}, headers=people["ann"][1]
+        )
+        assert response.status_code == 200
+        data = response.json()["data"]
+        assert [user["identifier"] for user in data["users"]] == ["cyd", "ann"]
+        assert data["missing"] == [999999]
+        assert set(data["users"][0]) == {"id", "identifier", "avatar_url", "avatars"}
+        assert ben not in [user["id"] for user in data["users"]]
+
+    def test_one_in_query(self, client, people, db_session):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            if "FROM users" in statement:
+                statements.append(statement)
+
+        ids = ",".join(str(user_id) for user_id, _ in people.values())
+        headers = people["ann"][1]
+        # caches the caller: later requests only run the lookup itself
+        client.get("/users", params={"ids": ids}, headers=headers)
+        engine = db_session.get_bind().engine
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            assert client.get("/users", params={"ids": ids}, headers=headers).status_code == 200
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+        assert len(statements) == 1 and " IN " in statements[0]
+
+    def test_etag_304_until_a_user_changes(self, client, people, avatar_dir):
+        headers = people["ann"][1]
+        params = {"ids": f"{people['ann'][0]},{people['ben'][0]}"}
+        etag = client.get("/users", params=params, headers=headers).headers["ETag"]
+
+        response = client.get("/users", params=params, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b"" and response.headers["ETag"] == etag
+
+        client.post("/auth/avatar", files={"file": ("a.png", PNG_BYTES, "image/png")}, headers=headers)
+        response = client.get("/users", params=params, headers={**headers, "If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_bad_ids(self, client, people, monkeypatch):
+        headers = people["ann"][1]
+        monkeypatch.setattr(users_api, "USERS_BATCH_MAX_IDS", 2)
+        for ids in ("1,x", "1,,2", "1,2,3", "1_0", " 1", "+1", "-1", "99999999999999999999999", "9223372036854775808"):
+            response = client.get("/users", params={"ids": ids}, headers=headers)
+            assert response.status_code == 400
+            assert "ids" in response.json()["data"]
+
+    def test_largest_id(self, client, people):
+        response = client.get("/users", params={"ids": "9223372036854775807"}, headers=people["ann"][1])
+        assert response.status_code == 200
+        assert response.json()["data"]["missing"] == [9223372036854775807]
+
+    def test_long_ids_not_parsed_past_limit(self):
+        # only the first limit + 1 pieces are looked at: the garbage after them isn't reported
+        with pytest.raises(ValueError, match="At most 2"):
+            users_api.parse_ids("1,2,3," + "x," * 100_000, 2)
+
+    def test_requires_auth(self, client):
+        assert client.get("/users", params={"ids": "1"}).status_code in (401, 403)
@@ -0,0 +1,459 @@
+# tests/test_ws_manager.py
+"""
+Unit tests for WebSocket fan-out (app/core/ws_manager.py).
+Uses in-memory fake sockets instead of real connections.
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from app.core.event_bus import UnixSocketBus
+from app.core import event_log as event_log_module
+from app.core import ws_encoding
+from app.core.event_log import EventLog, SqliteEventStore
+from app.core.ws_encoding import ENCODERS, msgpack_from_json
+from app.core.timer_wheel import TimerWheel
+from app.core.user_cache import CachedUser, UserCache
+from app.core.ws_manager import (
+    ConnectionManager,
+    CLOSE_IDLE,
+    CLOSE_SLOW_CONSUMER,
+    PING_TEXT,
+)
+
+
+class FakeWebSocket:
+    """Records sent text; `block` makes send_text hang like a stalled client."""
+
+    def __init__(self, block: bool = False) -> None:
+        self.block = block
+        self.sent = []
+        self.close_code = None
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        if self.block:
+            await asyncio.Event().wait()
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        await self.send_text(data)
+
+    async def close(self, code=1000, reason=""):
+        self.close_code = code
+
+
+async def settle():
+    """Let writer tasks run."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+class TestBroadcast:
+    """Fan-out through per-connection queues."""
+
+    @pytest.mark.anyio
+    async def test_all_sockets_receive_same_payload(self):
+        manager = ConnectionManager()
+        sockets = [FakeWebSocket(), FakeWebSocket()]
+        for ws in sockets:
+            await manager.connect(1, ws)
+
+        await manager.broadcast_avatar_changed(1, "/static/avatars/a.png")
+        await settle()
+
+        assert sockets[0].sent == sockets[1].sent
+        assert sockets[0].sent == [
+            '{"event":"avatar_changed","avatar_url":"/static/avatars/a.png","avatars":{}}'
+        ]
+
+    @pytest.mark.anyio
+    async def test_stalled_socket_does_not_block_others(self):
+        manager = ConnectionManager(send_timeout=0.05)
+        slow, fast = FakeWebSocket(block=True), FakeWebSocket()
+        await manager.connect(1, slow)
+        await manager.connect(1, fast)
+
+        await manager.broadcast_avatar_changed(1, "/a.png")
+        await settle()
+        assert len(fast.sent) == 1
+
+        # send timeout drops the stalled socket
+        await asyncio.sleep(0.1)
+        assert slow not in manager.active_connections[1]
+        assert slow.close_code == CLOSE_SLOW_CONSUMER
+
+    @pytest.mark.anyio
+    async def test_drop_oldest_policy(self):
+        manager = ConnectionManager(queue_size=2, slow_consumer_policy="drop_oldest")
+        slow = FakeWebSocket(block=True)
+        await manager.connect(1, slow)
+
+        for i in range(5):
+            await manager.send_to_user(1, {"n": i})
+            await settle()
+
+        conn = manager.active_connections[1][slow]
+        assert list(conn.queue) == ['{"n":3}', '{"n":4}']
+        assert conn.dropped == 2
+
+    @pytest.mark.anyio
+    async def test_disconnect_policy(self):
+        manager = ConnectionManager(queue_size=1, slow_consumer_policy="disconnect")
+        slow = FakeWebSocket(block=True)
+        await manager.connect(1, slow)
+
+        for i in range(3):
+            await manager.send_to_user(1, {"n": i})
+            await settle()
+
+        assert 1 not in manager.active_connections
+        assert slow.close_code == CLOSE_SLOW_CONSUMER
+
+    @pytest.mark.anyio
+    async def test_disconnect_user_closes_sockets(self):
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        await manager.connect(1, ws)
+
+        await manager.disconnect_user(1)
+        await settle()
+
+        assert manager.active_connections == {}
+        assert ws.close_code == 1000
+
+
+class Timer:
+    __slots__ = ("name", "timer_slot")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.timer_slot = None
+
+
+class TestTimerWheel:
+    """Slots, cancelling and the ticking task."""
+
+    def test_fires_after_delay(self):
+        fired = []
+        wheel = TimerWheel(tick=1, span=10, on_expire=lambda item: fired.append(item.name))
+        a, b, c = Timer("a"), Timer("b"), Timer("c")
+        wheel.schedule(a, 2)
+        wheel.schedule(b, 2.5)  # rounded up to whole ticks
+        wheel.schedule(c, 1)
+        wheel.cancel(c)
+        assert len(wheel) == 2
+
+        wheel.advance()
+        wheel.advance()
+        assert fired == ["a"]
+        wheel.advance()
+        assert fired == ["a", "b"]
+        assert len(wheel) == 0 and a.timer_slot is None
+
+    @pytest.mark.anyio
+    async def test_task_ticks(self):
+        fired = asyncio.Event()
+        wheel = TimerWheel(tick=0.01, span=1, on_expire=lambda item: fired.set())
+        wheel.schedule(Timer("a"), 0.02)
+        wheel.start()
+        try:
+            await asyncio.wait_for(fired.wait(), 1)
+        finally:
+            await wheel.stop()
+
+
+class TestHeartbeat:
+    """Pings and reaping, driven tick by tick."""
+
+    @pytest.mark.anyio
+    async def test_ping_then_reap_silent_socket(self):
+        manager = ConnectionManager(ping_interval=10, idle_timeout=30, timer_tick=1)
+        ws = FakeWebSocket()
+        conn = await manager.connect(1, ws)
+
+        conn.last_seen -= 10
+        for _ in range(10):
+            manager.wheel.advance()
+        await settle()
+        assert ws.sent == [PING_TEXT]
+
+        # a pong keeps it: no second ping one interval later
+        conn.touch()
+        for _ in range(10):
+            manager.wheel.advance()
+        await settle()
+        assert ws.sent == [PING_TEXT]
+
+        conn.last_seen -= 30
+        for _ in range(10):
+            manager.wheel.advance()
+        await settle()
+        assert manager.active_connections == {}
+        assert ws.close_code == CLOSE_IDLE
+        assert manager.reaped == 1 and len(manager.wheel) == 0
+
+    @pytest.mark.anyio
+    async def test_failed_ping_reaps_without_idle_timeout(self):
+        manager = ConnectionManager(ping_interval=10, timer_tick=1)
+        ws = FakeWebSocket()
+        conn = await manager.connect(1, ws)
+
+        async def dead_peer(payload):
+            raise OSError("connection reset")
+
+        ws.send_text = dead_peer
+        conn.last_seen -= 10
+        for _ in range(10):
+            manager.wheel.advance()
+        await settle()
+        assert manager.active_connections == {}
+        assert ws.close_code == CLOSE_IDLE
+        assert manager.reaped == 1 and len(manager.wheel) == 0
+
+    @pytest.mark.anyio
+    async def test_disconnect_leaves_the_wheel(self):
+        manager = ConnectionManager(ping_interval=10, idle_timeout=30)
+        ws = FakeWebSocket()
+        await manager.connect(1, ws)
+        assert len(manager.wheel) == 1
+        await manager.disconnect(1, ws)
+        assert len(manager.wheel) == 0
+
+    @pytest.mark.anyio
+    async def test_idle_connection_holds_no_task_or_queue(self):
+        manager = ConnectionManager()
+        ws = FakeWebSocket()
+        conn = await manager.connect(1, ws)
+        assert conn.writer is None and conn.queue is None
+
+        await manager.send_to_user(1, {"n": 1})
+        assert conn.queue_depth == 1
+        await settle()
+        assert ws.sent == ['{"n":1}']
+        assert conn.writer is None and conn.queue is None
+
+
+class TestEventLog:
+    """Sequence numbers, replay on reconnect and the SQLite store."""
+
+    @pytest.mark.anyio
+    async def test_reconnect_replays_missed_events_before_live_ones(self):
+        manager = ConnectionManager(events=EventLog(capacity=8))
+        first = FakeWebSocket()
+        await manager.connect(1, first)
+        await manager.send_to_user(1, {"n": 1})
+        await settle()
+        seen = json.loads(first.sent[-1])["seq"]
+        await manager.disconnect(1, first)
+
+        for n in (2, 3):
+            await manager.send_to_user(1, {"n": n})
+        again = FakeWebSocket()
+        await manager.connect(1, again, since=seen)
+        await manager.send_to_user(1, {"n": 4})
+        await asyncio.sleep(0.01)
+
+        events = [json.loads(text) for text in again.sent]
+        assert [event["n"] for event in events] == [2, 3, 4]
+        seqs = [seen] + [event["seq"] for event in events]
+        assert seqs == sorted(set(seqs))
+
+    @pytest.mark.anyio
+    async def test_resync_when_missed_events_are_gone(self):
+        log = EventLog(capacity=2)
+        manager = ConnectionManager(events=log)
+        # from before this process started
+        stale = FakeWebSocket()
+        await manager.connect(1, stale, since=1)
+        await settle()
+        assert json.loads(stale.sent[0]) == {"event": "resync", "seq": log.head(1)}
+
+        await manager.send_to_user(1, {"n": 1})
+        seen = log.head(1)
+        for n in (2, 3, 4):
+            await manager.send_to_user(1, {"n": n})
+        # "n": 2 was pushed out of the ring
+        ws = FakeWebSocket()
+        await manager.connect(1, ws, since=seen)
+        await settle()
+        assert json.loads(ws.sent[0]) == {"event": "resync", "seq": log.head(1)}
+
+    @pytest.mark.anyio
+    async def test_sqlite_store_survives_restart(self, tmp_path):
+        path = str(tmp_path / "events.db")
+        seqs = []
+
+        def publish(log, text):
+            seqs.append(log.next_seq(1))
+            log.append(1, seqs[-1], text)
+            log.persist(1, seqs[-1], text)
+
+        log = EventLog(capacity=2, store=SqliteEventStore(path, 2))
+        publish(log, "a")
+        publish(log, "b")
+        await log.stop()
+
+        # a new process: nothing in memory, the replay comes from the file
+        log = EventLog(capacity=2, store=SqliteEventStore(path, 2))
+        try:
+            assert await log.replay(1, seqs[0]) == [(seqs[1], "b")]
+            publish(log, "c")
+            await log.flush()
+            assert await log.replay(1, seqs[0]) == [(seqs[1], "b"), (seqs[2], "c")]
+            # "a" was trimmed: a client that never saw it must re-fetch
+            assert await log.replay(1, 0) is None
+        finally:
+            await log.stop()
+
+
+class TestEncodings:
+    """Per-socket message encodings and their negotiation."""
+
+    @pytest.mark.anyio
+    async def test_event_converted_once_per_encoding(self, monkeypatch):
+        msgpack = pytest.importorskip("msgpack")
+        calls = []
+
+        def counting(text):
+            calls.append(text)
+            return msgpack_from_json(text)
+
+        monkeypatch.setitem(ENCODERS, "msgpack", counting)
+        manager = ConnectionManager()
+        text_ws, binary = FakeWebSocket(), [FakeWebSocket(), FakeWebSocket()]
+        await manager.connect(1, text_ws)
+        for ws in binary:
+            await manager.connect(1, ws, encoding="msgpack")
+
+        await manager.send_to_user(1, {"event": "x", "n": 1})
+        await settle()
+
+        assert text_ws.sent == ['{"event":"x","n":1}']
+        assert binary[0].sent == binary[1].sent == [msgpack.packb({"event": "x", "n": 1})]
+        assert len(calls) == 1
+
+    def test_negotiate(self, monkeypatch):
+        monkeypatch.setitem(ENCODERS, "msgpack", msgpack_from_json)
+        monkeypatch.setattr(ws_encoding, "ENCODINGS", ("json", "msgpack"))
+        assert ws_encoding.negotiate(None, []) == ("json", None)
+        assert ws_encoding.negotiate(None, ["chat", "msgpack"]) == ("msgpack", "msgpack")
+        assert ws_encoding.negotiate("msgpack", []) == ("msgpack", None)
+        assert ws_encoding.negotiate("xml", ["msgpack"]) is None
+
+
+class TestUnixSocketBus:
+    """Two managers stand in for two uvicorn workers sharing one broker."""
+
+    @pytest.mark.anyio
+    async def test_event_reaches_socket_on_other_worker(self, tmp_path):
+        path = str(tmp_path / "bus.sock")
+        worker_a = ConnectionManager(bus=UnixSocketBus(path))
+        worker_b = ConnectionManager(bus=UnixSocketBus(path))
+        await worker_a.start()
+        await worker_b.start()
+        try:
+            assert worker_a.bus.is_broker
+            assert not worker_b.bus.is_broker
+
+            ws_on_b = FakeWebSocket()
+            await worker_b.connect(1, ws_on_b)
+
+            # upload handled by worker A, socket held by worker B
+            await worker_a.broadcast_avatar_changed(1, "/a.png")
+            for _ in range(50):
+                if ws_on_b.sent:
+                    break
+                await asyncio.sleep(0.01)
+            assert len(ws_on_b.sent) == 1
+
+            await worker_a.disconnect_user(1)
+            for _ in range(50):
+                if ws_on_b.close_code is not None:
+                    break
+                await asyncio.sleep(0.01)
+            assert ws_on_b.close_code == 1000
+            assert worker_b.active_connections == {}
+        finally:
+            await worker_b.stop()
+            await worker_a.stop()
+
+    @pytest.mark.anyio
+    async def test_user_invalidated_on_every_worker(self, tmp_path):
+        path = str(tmp_path / "bus.sock")
+        caches = [UserCache(), UserCache()]
+        worker_a = ConnectionManager(bus=UnixSocketBus(path), users=caches[0])
+        worker_b = ConnectionManager(bus=UnixSocketBus(path), users=caches[1])
+        await worker_a.start()
+        await worker_b.start()
+        try:
+            for cache in caches:
+                cache.put(CachedUser(1, "someone"), cache.epoch)
+
+            # account deleted through worker A: its token must fail on B too
+            await worker_a.invalidate_user(1)
+            assert caches[0].get(1) is None
+            for _ in range(50):
+                if caches[1].get(1) is None:
+                    break
+                await asyncio.sleep(0.01)
+            assert caches[1].get(1) is None
+        finally:
+            await worker_b.stop()
+            await worker_a.stop()
+
+    @pytest.mark.anyio
+    async def test_seqs_follow_delivery_order_on_every_worker(self, tmp_path, monkeypatch):
+        """Events published on two workers at once get one numbering, in bus order."""
+        # a clock that doesn't move: numbering by the publishers would collide
+        monkeypatch.setattr(event_log_module, "_now_seq", lambda: 1)
+        path = str(tmp_path / "bus.sock")
+        workers = [
+            ConnectionManager(bus=UnixSocketBus(path), events=EventLog(capacity=16))
+            for _ in range(2)
+        ]
+        for worker in workers:
+            await worker.start()
+        try:
+            sockets = [FakeWebSocket(), FakeWebSocket()]
+            for worker, ws in zip(workers, sockets):
+                await worker.connect(1, ws)
+            for n in range(6):
+                await workers[n % 2].send_to_user(1, {"n": n})
+            for _ in range(50):
+                if all(len(ws.sent) == 6 for ws in sockets):
+                    break
+                await asyncio.sleep(0.01)
+
+            received = [[json.loads(text) for text in ws.sent] for ws in sockets]
+            assert received[0] == received[1]
+            seqs = [event["seq"] for event in received[0]]
+            assert seqs == sorted(set(seqs))
+            assert workers[0].events.after(1, 0) == workers[1].events.after(1, 0)
+        finally:
+            for worker in reversed(workers):
+                await worker.stop()
+
+    @pytest.mark.anyio
+    async def test_broker_failover(self, tmp_path):
+        """When the broker's worker stops, another worker takes over."""
+        path = str(tmp_path / "bus.sock")
+        worker_a = ConnectionManager(bus=UnixSocketBus(path, reconnect_delay=0.01))
+        worker_b = ConnectionManager(bus=UnixSocketBus(path, reconnect_delay=0.01))
+        await worker_a.start()
+        await worker_b.start()
+        try:
+            await worker_a.stop()
+            for _ in range(100):
+                if worker_b.bus.is_broker:
+                    break
+                await asyncio.sleep(0.01)
+
+            assert worker_b.bus.is_broker
+            await worker_b.bus.start()  # reconnected to itself
+        finally:
+            await worker_b.stop()